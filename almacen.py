@@ -0,0 +1,313 @@
+# almacen.py — Archivo de auditoría: entradas CFE y TXT generados, comprimidos y deduplicados
+#
+# Estructura de la carpeta del almacén:
+#   objetos/<ab>/<sha256>.gz|.xz  contenido comprimido, nombrado por el SHA-256
+#                                 del original: un mismo archivo se guarda una vez
+#   indice.db                     SQLite: (cliente, período, nombre) -> objetos
+# Cada conversión archivada agrupa su entrada y sus TXT bajo un identificador
+# (hash de sus nombres y contenidos), así se restaura completa con una
+# búsqueda en el índice.
+#
+# Uso:
+#   python almacen.py listar <almacén> [--cliente C] [--periodo AAAA-MM]
+#   python almacen.py restaurar <almacén> --cliente C --periodo P --nombre N -o <carpeta>
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import lzma
+import os
+import sqlite3
+import sys
+import tempfile
+from datetime import datetime
+
+from config import ALMACEN_COMPRESION
+
+logger = logging.getLogger(__name__)
+
+INDICE = "indice.db"
+OBJETOS = "objetos"
+
+# Compresión -> extensión del objeto
+COMPRESIONES = {"gzip": ".gz", "xz": ".xz"}
+
+ENTRADA = "entrada"
+SALIDA = "salida"
+
+BLOQUE = 1024 * 1024
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS objetos (
+    sha256 TEXT PRIMARY KEY,
+    tamano INTEGER NOT NULL,
+    comprimido INTEGER NOT NULL,
+    compresion TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS archivos (
+    cliente TEXT NOT NULL,
+    periodo TEXT NOT NULL,
+    nombre TEXT NOT NULL,
+    rol TEXT NOT NULL,
+    sha256 TEXT NOT NULL REFERENCES objetos (sha256),
+    conversion TEXT NOT NULL,
+    archivado TEXT NOT NULL,
+    PRIMARY KEY (cliente, periodo, nombre, sha256, conversion)
+);
+CREATE INDEX IF NOT EXISTS archivos_conversion ON archivos (conversion);
+"""
+
+
+def _sha256(f):
+    h = hashlib.sha256()
+    for bloque in iter(lambda: f.read(BLOQUE), b""):
+        h.update(bloque)
+    return h.hexdigest()
+
+
+def _compresor(crudo, compresion):
+    if compresion == "gzip":
+        # mtime fijo: el mismo contenido produce siempre el mismo objeto
+        return gzip.GzipFile(fileobj=crudo, mode="wb", mtime=0)
+    return lzma.LZMAFile(crudo, "wb")
+
+
+def _descompresor(ruta, compresion):
+    return gzip.open(ruta, "rb") if compresion == "gzip" else lzma.open(ruta, "rb")
+
+
+def periodo_de(periodos):
+    """'AAAA-MM' si la conversión abarca un mes, 'AAAA-MM_AAAA-MM' si varios, 'sin-fecha' si ninguno."""
+    if not periodos:
+        return "sin-fecha"
+    if len(periodos) == 1:
+        return periodos[0]
+    return f"{periodos[0]}_{periodos[-1]}"
+
+
+class Almacen:
+    """Almacén direccionado por contenido con índice SQLite."""
+
+    def __init__(self, carpeta, compresion=ALMACEN_COMPRESION):
+        if compresion not in COMPRESIONES:
+            raise ValueError(f"Compresión desconocida: {compresion} (use {', '.join(COMPRESIONES)})")
+        self.carpeta = os.path.abspath(carpeta)
+        self.compresion = compresion
+        os.makedirs(os.path.join(self.carpeta, OBJETOS), exist_ok=True)
+        self._con = sqlite3.connect(os.path.join(self.carpeta, INDICE))
+        self._con.executescript(_ESQUEMA)
+
+    def cerrar(self):
+        self._con.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def _ruta_objeto(self, sha, compresion):
+        return os.path.join(self.carpeta, OBJETOS, sha[:2], f"{sha}{COMPRESIONES[compresion]}")
+
+    def _objeto(self, sha):
+        """(tamaño, comprimido, compresión) del objeto, o None si no está guardado."""
+        fila = self._con.execute(
+            "SELECT tamano, comprimido, compresion FROM objetos WHERE sha256 = ?", (sha,),
+        ).fetchone()
+        if fila is None or not os.path.exists(self._ruta_objeto(sha, fila[2])):
+            return None
+        return fila
+
+    def guardar_objeto(self, origen):
+        """
+        Guarda el contenido de `origen` (ruta o archivo binario abierto) y retorna
+        su SHA-256. Si ya estaba guardado no se escribe nada: con una ruta se
+        calcula el hash antes de comprimir, así un reenvío idéntico solo cuesta
+        una lectura; un stream se comprime y se hashea en la misma pasada.
+        """
+        if isinstance(origen, (str, os.PathLike)):
+            with open(origen, "rb") as f:
+                sha = _sha256(f)
+            if self._objeto(sha) is not None:
+                return sha
+            with open(origen, "rb") as f:
+                return self._comprimir(f)
+        return self._comprimir(origen)
+
+    def _comprimir(self, f):
+        h = hashlib.sha256()
+        tamano = 0
+        carpeta_objetos = os.path.join(self.carpeta, OBJETOS)
+        fd, tmp = tempfile.mkstemp(dir=carpeta_objetos, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as crudo:
+                with _compresor(crudo, self.compresion) as z:
+                    for bloque in iter(lambda: f.read(BLOQUE), b""):
+                        h.update(bloque)
+                        tamano += len(bloque)
+                        z.write(bloque)
+            sha = h.hexdigest()
+            if self._objeto(sha) is not None:
+                os.remove(tmp)
+                return sha
+            comprimido = os.path.getsize(tmp)
+            destino = self._ruta_objeto(sha, self.compresion)
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            os.replace(tmp, destino)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        with self._con:
+            self._con.execute(
+                "INSERT OR REPLACE INTO objetos VALUES (?, ?, ?, ?)", (sha, tamano, comprimido, self.compresion),
+            )
+        return sha
+
+    def archivar_conversion(self, ruta_input, rutas_salida, cliente, periodo, nombre_input=None):
+        """
+        Guarda la entrada y sus salidas y las indexa bajo (cliente, período, nombre).
+        Archivar de nuevo la misma conversión no agrega objetos ni filas; un
+        reenvío idéntico con otro nombre solo agrega filas al índice.
+        Retorna el identificador de la conversión.
+        """
+        if nombre_input is None:
+            nombre_input = os.path.basename(ruta_input) if isinstance(ruta_input, (str, os.PathLike)) else "stdin"
+        if hasattr(ruta_input, "seek"):
+            # Stream ya consumido por la conversión
+            ruta_input.seek(0)
+        filas = [(nombre_input, ENTRADA, self.guardar_objeto(ruta_input))]
+        for ruta in rutas_salida:
+            filas.append((os.path.basename(ruta), SALIDA, self.guardar_objeto(ruta)))
+        conversion = hashlib.sha256("\n".join(f"{nombre}:{sha}" for nombre, _, sha in filas).encode("utf-8")).hexdigest()
+
+        archivado = datetime.now().isoformat(timespec="seconds")
+        with self._con:
+            nuevas = sum(
+                self._con.execute(
+                    "INSERT OR IGNORE INTO archivos VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (cliente, periodo, nombre, rol, sha, conversion, archivado),
+                ).rowcount
+                for nombre, rol, sha in filas
+            )
+        logger.info(
+            f"Almacén: {nombre_input} ({cliente}, {periodo}) con {len(rutas_salida)} salidas; "
+            f"{nuevas} entradas nuevas en el índice."
+        )
+        return conversion
+
+    def buscar(self, cliente=None, periodo=None, nombre=None):
+        """Filas del índice {cliente, periodo, nombre, rol, sha256, conversion, archivado}, más recientes primero."""
+        condiciones = []
+        valores = []
+        for campo, valor in (("cliente", cliente), ("periodo", periodo), ("nombre", nombre)):
+            if valor is not None:
+                condiciones.append(f"{campo} = ?")
+                valores.append(valor)
+        sql = "SELECT cliente, periodo, nombre, rol, sha256, conversion, archivado FROM archivos"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        sql += " ORDER BY archivado DESC, cliente, periodo, rol, nombre"
+        columnas = ("cliente", "periodo", "nombre", "rol", "sha256", "conversion", "archivado")
+        return [dict(zip(columnas, fila)) for fila in self._con.execute(sql, valores)]
+
+    def restaurar_objeto(self, sha, ruta_destino):
+        """Descomprime el objeto en `ruta_destino` verificando su SHA-256."""
+        objeto = self._objeto(sha)
+        if objeto is None:
+            raise ValueError(f"Objeto no encontrado en el almacén: {sha}")
+        carpeta = os.path.dirname(os.path.abspath(ruta_destino))
+        os.makedirs(carpeta, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=carpeta, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out, _descompresor(self._ruta_objeto(sha, objeto[2]), objeto[2]) as z:
+                h = hashlib.sha256()
+                for bloque in iter(lambda: z.read(BLOQUE), b""):
+                    h.update(bloque)
+                    out.write(bloque)
+            if h.hexdigest() != sha:
+                raise ValueError(f"Objeto dañado en el almacén: {sha}")
+            os.replace(tmp, ruta_destino)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def restaurar_conversion(self, cliente, periodo, nombre, carpeta):
+        """
+        Restaura en `carpeta` la conversión más reciente en la que participó
+        (cliente, período, nombre), sea `nombre` la entrada o uno de sus TXT.
+        Retorna las rutas restauradas.
+        """
+        fila = self._con.execute(
+            "SELECT conversion FROM archivos WHERE cliente = ? AND periodo = ? AND nombre = ? "
+            "ORDER BY archivado DESC, rowid DESC LIMIT 1",
+            (cliente, periodo, nombre),
+        ).fetchone()
+        if fila is None:
+            raise ValueError(f"No hay nada archivado como {nombre} ({cliente}, {periodo}).")
+        archivos = self._con.execute(
+            "SELECT nombre, sha256 FROM archivos WHERE conversion = ? AND cliente = ? AND periodo = ? "
+            "ORDER BY archivado, rowid",
+            (fila[0], cliente, periodo),
+        ).fetchall()
+        # Si la misma conversión se archivó más de una vez, la última versión de cada nombre
+        ultimos = dict(archivos)
+        rutas = []
+        for nombre_archivo, sha in ultimos.items():
+            ruta = os.path.join(carpeta, nombre_archivo)
+            self.restaurar_objeto(sha, ruta)
+            rutas.append(ruta)
+        logger.info(f"Almacén: restaurados {len(rutas)} archivos en {carpeta}")
+        return rutas
+
+
+def salidas_de(resumen):
+    """Archivos TXT de una conversión: el TXT, o las particiones y su manifiesto."""
+    ruta_txt = resumen["ruta_txt"]
+    if not ruta_txt.endswith("_manifest.json"):
+        return [ruta_txt]
+    with open(ruta_txt, "r", encoding="utf-8") as f:
+        manifiesto = json.load(f)
+    carpeta = os.path.dirname(ruta_txt)
+    return [os.path.join(carpeta, p["archivo"]) for p in manifiesto["particiones"]] + [ruta_txt]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consulta y restaura el archivo de auditoría de conversiones.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    listar = sub.add_parser("listar", help="Lista lo archivado")
+    listar.add_argument("almacen", help="Carpeta del almacén")
+    listar.add_argument("--cliente", default=None)
+    listar.add_argument("--periodo", default=None, help="AAAA-MM (o AAAA-MM_AAAA-MM si abarca varios meses)")
+
+    restaurar = sub.add_parser("restaurar", help="Restaura una conversión (entrada y TXT)")
+    restaurar.add_argument("almacen", help="Carpeta del almacén")
+    restaurar.add_argument("--cliente", required=True)
+    restaurar.add_argument("--periodo", required=True)
+    restaurar.add_argument("--nombre", required=True, help="Nombre del archivo de entrada o de un TXT generado")
+    restaurar.add_argument("--output", "-o", required=True, help="Carpeta donde restaurar")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    if not os.path.exists(os.path.join(args.almacen, INDICE)):
+        logger.error(f"No hay un almacén en {os.path.abspath(args.almacen)}. Proceso terminado.")
+        sys.exit(1)
+    try:
+        with Almacen(args.almacen) as almacen:
+            if args.comando == "listar":
+                for f in almacen.buscar(args.cliente, args.periodo):
+                    print(f"{f['archivado']}  {f['cliente']}  {f['periodo']}  {f['rol']:<7}  {f['nombre']}  {f['sha256'][:12]}")
+            else:
+                almacen.restaurar_conversion(args.cliente, args.periodo, args.nombre, os.path.abspath(args.output))
+    except (OSError, ValueError, sqlite3.Error) as e:
+        logger.error(f"{e} Proceso terminado.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
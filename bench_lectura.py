@@ -0,0 +1,123 @@
+# bench_lectura.py — Benchmark de lectura por formato de entrada
+#
+# Uso: python bench_lectura.py [--filas N] [--repeticiones N]
+# Genera el mismo listado de CFEs como .xlsx, .csv (estilo portal DGI: ';',
+# coma decimal, cp1252), .tsv (UTF-8) y .cfecol, mide reader.leer_excel sobre
+# cada uno y verifica que todos produzcan los mismos registros.
+# (.xls no se incluye: generarlo requiere xlwt, que no es dependencia.)
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, AQUI)
+
+ENCABEZADO = [
+    "Fecha Comprobante", "Tipo CFE", "Serie", "Número", "RUT Emisor", "Moneda",
+    "Monto Neto", "IVA Ventas", "Monto Total", "Monto Ret/Per", "Monto Cred. Fiscal",
+]
+TIPOS = ["e-Factura", "Nota de Crédito de e-Factura", "e-Resguardo"]
+RUTS = ["080128330013", "213596650013", "214844360018", "999999999999"]
+MONEDAS = ["UYU", "USD"]
+
+
+def _generar_filas(cantidad, semilla=1):
+    rnd = random.Random(semilla)
+    base = datetime(2026, 1, 1)
+    filas = []
+    for i in range(cantidad):
+        neto = round(rnd.uniform(100, 50000), 2)
+        iva = round(neto * rnd.choice((0.22, 0.10, 0)), 2)
+        filas.append([
+            base + timedelta(days=rnd.randrange(59)), rnd.choice(TIPOS), "A", 1000 + i,
+            rnd.choice(RUTS), rnd.choice(MONEDAS), neto, iva, round(neto + iva, 2), 0.0, 0.0,
+        ])
+    return filas
+
+
+def _escribir_xlsx(filas, ruta):
+    import openpyxl
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append(ENCABEZADO)
+    for fila in filas:
+        ws.append(fila)
+    wb.save(ruta)
+
+
+def _escribir_texto(filas, ruta, separador, encoding, coma_decimal):
+    def celda(v):
+        if isinstance(v, datetime):
+            return f"{v:%d/%m/%Y}"
+        if isinstance(v, float):
+            texto = f"{v:.2f}"
+            return texto.replace(".", ",") if coma_decimal else texto
+        return str(v)
+
+    with open(ruta, "w", encoding=encoding, newline="") as f:
+        f.write(separador.join(ENCABEZADO) + "\r\n")
+        for fila in filas:
+            f.write(separador.join(celda(v) for v in fila) + "\r\n")
+
+
+def _medir(ruta, repeticiones):
+    from reader import leer_excel
+
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        registros = leer_excel(ruta)
+        transcurrido = time.perf_counter() - inicio
+        mejor = transcurrido if mejor is None else min(mejor, transcurrido)
+    return mejor, registros
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de lectura: Excel vs CSV/TSV vs .cfecol.")
+    parser.add_argument("--filas", type=int, default=20000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    # Los logs de lectura distorsionan la medición
+    logging.basicConfig(level=logging.ERROR)
+    from columnar import escribir_columnar
+
+    filas = _generar_filas(args.filas)
+    with tempfile.TemporaryDirectory() as carpeta:
+        rutas = {
+            ".xlsx": os.path.join(carpeta, "cfe.xlsx"),
+            ".csv": os.path.join(carpeta, "cfe.csv"),
+            ".tsv": os.path.join(carpeta, "cfe.tsv"),
+        }
+        _escribir_xlsx(filas, rutas[".xlsx"])
+        _escribir_texto(filas, rutas[".csv"], ";", "cp1252", coma_decimal=True)
+        _escribir_texto(filas, rutas[".tsv"], "\t", "utf-8", coma_decimal=False)
+
+        resultados = {}
+        for formato, ruta in rutas.items():
+            resultados[formato] = _medir(ruta, args.repeticiones)
+        rutas[".cfecol"] = os.path.join(carpeta, "cfe.cfecol")
+        escribir_columnar(resultados[".xlsx"][1], rutas[".cfecol"])
+        resultados[".cfecol"] = _medir(rutas[".cfecol"], args.repeticiones)
+
+        referencia = resultados[".xlsx"][1]
+        base = resultados[".xlsx"][0]
+        print(f"=== Lectura de {args.filas} CFEs (mejor de {args.repeticiones}) ===")
+        for formato, (segundos, registros) in resultados.items():
+            iguales = "OK" if registros == referencia else "DIFIERE"
+            tamano = os.path.getsize(rutas[formato]) / 1024
+            print(
+                f"  {formato:<8} {segundos * 1000:9.1f} ms  {base / segundos:6.1f}x  "
+                f"{tamano:9.0f} KB  registros {iguales}"
+            )
+
+
+if __name__ == "__main__":
+    main()
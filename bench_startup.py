@@ -0,0 +1,100 @@
+# bench_startup.py — Benchmark de arranque del CLI con -X importtime
+#
+# Uso: python bench_startup.py [--repeticiones N] [--top N]
+# Mide `main.py --help` y una conversión de un archivo mínimo, reportando
+# tiempo total de pared y los módulos con mayor costo de import acumulado.
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+AQUI = os.path.dirname(os.path.abspath(__file__))
+MAIN = os.path.join(AQUI, "main.py")
+
+
+def _crear_input_minimo(carpeta):
+    """Genera un .xlsx con un único CFE."""
+    import openpyxl
+    from datetime import datetime
+
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.append([
+        "Fecha Comprobante", "Tipo CFE", "Serie", "Número", "RUT Emisor", "Moneda",
+        "Monto Neto", "IVA Ventas", "Monto Total", "Monto Ret/Per", "Monto Cred. Fiscal",
+    ])
+    ws.append([datetime(2026, 1, 14), "e-Factura", "A", 10779, "080128330013", "UYU",
+               57373.61, 4616.39, 61990.0, 0, 0])
+    ruta = os.path.join(carpeta, "minimo.xlsx")
+    wb.save(ruta)
+    return ruta
+
+
+def _parse_importtime(stderr):
+    """
+    Retorna {modulo: microsegundos_acumulados} de los imports de primer nivel
+    (los anidados ya están incluidos en el acumulado de su padre).
+    """
+    costos = {}
+    for linea in stderr.splitlines():
+        if not linea.startswith("import time:") or "cumulative" in linea:
+            continue
+        partes = linea[len("import time:"):].split("|")
+        if len(partes) != 3:
+            continue
+        nombre = partes[2]
+        # -X importtime indenta dos espacios por nivel de anidamiento
+        if len(nombre) - len(nombre.lstrip()) > 1:
+            continue
+        modulo = nombre.strip()
+        costos[modulo] = max(costos.get(modulo, 0), int(partes[1]))
+    return costos
+
+
+def _medir(argumentos, repeticiones):
+    """Ejecuta el CLI y retorna (mejor_tiempo_pared, costos_import_de_la_mejor_corrida)."""
+    mejor = None
+    mejores_costos = {}
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", MAIN] + argumentos,
+            capture_output=True, text=True, cwd=AQUI,
+        )
+        transcurrido = time.perf_counter() - inicio
+        if mejor is None or transcurrido < mejor:
+            mejor = transcurrido
+            mejores_costos = _parse_importtime(proc.stderr)
+    return mejor, mejores_costos
+
+
+def _reportar(titulo, segundos, costos, top):
+    total_us = sum(costos.values())
+    print(f"=== {titulo} ===")
+    print(f"  Tiempo de pared:     {segundos * 1000:8.1f} ms")
+    print(f"  Import acumulado:    {total_us / 1000:8.1f} ms")
+    for modulo, us in sorted(costos.items(), key=lambda kv: kv[1], reverse=True)[:top]:
+        print(f"    {us / 1000:8.1f} ms  {modulo}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque del CLI (main.py).")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    segundos, costos = _medir(["--help"], args.repeticiones)
+    _reportar("main.py --help", segundos, costos, args.top)
+    print()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = _crear_input_minimo(carpeta)
+        segundos, costos = _medir(["-i", ruta, "-o", carpeta], args.repeticiones)
+        _reportar("main.py con 1 CFE", segundos, costos, args.top)
+
+
+if __name__ == "__main__":
+    main()
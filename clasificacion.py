@@ -0,0 +1,50 @@
+# clasificacion.py — Clasificación cacheada de tipo_cfe y moneda a códigos enteros
+#
+# Un archivo CFE tiene muy pocos valores distintos en estas columnas. Cada valor
+# crudo se normaliza (mayúsculas, tildes, espacios) una sola vez; las filas
+# siguientes resuelven su código con una búsqueda en un dict.
+
+import sys
+import unicodedata
+
+from config import TIPO_CFE_PREFIJOS, MONEDA_CODIGOS
+
+# Máximo de valores crudos distintos que se recuerdan por columna
+MAX_CACHE = 4096
+
+
+def plegar(texto):
+    """Minúsculas, sin tildes y con espacios colapsados: 'Nota de Crédito' -> 'nota de credito'."""
+    texto = unicodedata.normalize("NFKD", str(texto).casefold())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.split())
+
+
+# Código de tipo = índice en PREFIJOS
+PREFIJOS = tuple(dict.fromkeys(TIPO_CFE_PREFIJOS.values()))
+_TIPOS = {plegar(k): PREFIJOS.index(v) for k, v in TIPO_CFE_PREFIJOS.items()}
+_MONEDAS = {plegar(k): v for k, v in MONEDA_CODIGOS.items()}
+
+# valor crudo -> (texto limpio internado, código o None)
+_cache_tipo = {}
+_cache_moneda = {}
+
+
+def _clasificar(valor, cache, tabla):
+    resultado = cache.get(valor)
+    if resultado is None:
+        texto = sys.intern(str(valor).strip()) if valor is not None else ""
+        resultado = (texto, tabla.get(plegar(texto)))
+        if len(cache) < MAX_CACHE:
+            cache[valor] = resultado
+    return resultado
+
+
+def clasificar_tipo(valor):
+    """Retorna (tipo_cfe limpio, código de tipo o None). El prefijo es PREFIJOS[código]."""
+    return _clasificar(valor, _cache_tipo, _TIPOS)
+
+
+def clasificar_moneda(valor):
+    """Retorna (moneda limpia, código Memory o None)."""
+    return _clasificar(valor, _cache_moneda, _MONEDAS)
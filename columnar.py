@@ -0,0 +1,268 @@
+# columnar.py — Formato binario columnar para registros CFE ya normalizados
+#
+# Para análisis que releen los mismos datos muchas veces: se lee el Excel una
+# vez, se exporta a .cfecol y las lecturas siguientes evitan openpyxl/xlrd.
+#
+# Formato (little-endian):
+#   cabecera de 32 bytes: b"CFECOL2\n" + <QI (cantidad, cantidad_textos)
+#   columnas de ancho fijo, en este orden, una tras otra:
+#     monto_neto, iva_ventas, monto_total, monto_ret_per, monto_cred_fiscal   float64
+#     fecha (ordinal)                                                         int32
+#     tipo_cfe, serie, numero, rut_emisor, moneda (índice en el diccionario)  uint32
+#   diccionario de textos: offsets uint32 (cantidad_textos + 1) + bytes UTF-8
+# Las columnas de 8 bytes van primero para que todas queden alineadas.
+# cod_tipo y cod_moneda no se guardan: son posiciones en tablas de config.py
+# que pueden cambiar, así que al leer se recalculan desde los textos. Los
+# archivos CFECOL1 traían además esas dos columnas (int8); se leen salteándolas.
+#
+# Exportar desde un Excel:
+#   python columnar.py entrada.xlsx salida.cfecol [--perfil P]
+
+import argparse
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime
+from itertools import islice
+
+logger = logging.getLogger(__name__)
+
+EXTENSION = ".cfecol"
+MAGIC = b"CFECOL2\n"
+MAGIC_V1 = b"CFECOL1\n"
+_CABECERA = struct.Struct("<QI")
+TAM_CABECERA = 32
+
+COLUMNAS_MONTO = ("monto_neto", "iva_ventas", "monto_total", "monto_ret_per", "monto_cred_fiscal")
+COLUMNAS_TEXTO = ("tipo_cfe", "serie", "numero", "rut_emisor", "moneda")
+
+# (nombre, typecode de array) en el orden del archivo
+_COLUMNAS = (
+    tuple((c, "d") for c in COLUMNAS_MONTO)
+    + (("fecha", "i"),)
+    + tuple((c, "I") for c in COLUMNAS_TEXTO)
+)
+# CFECOL1: cod_tipo y cod_moneda al final, que ya no se usan
+_COLUMNAS_V1 = _COLUMNAS + (("cod_tipo", "b"), ("cod_moneda", "b"))
+_LITTLE = sys.byteorder == "little"
+
+
+def _volcar(out, arr):
+    if not _LITTLE:
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    arr.tofile(out)
+
+
+def escribir_columnar(registros, ruta_salida):
+    """
+    Escribe los registros (dicts de reader.leer_excel) en formato columnar.
+    Los textos se guardan una sola vez en el diccionario. Retorna la cantidad escrita.
+    """
+    columnas = {nombre: array(tc) for nombre, tc in _COLUMNAS}
+    indices = {}
+    textos = []
+
+    for r in registros:
+        for c in COLUMNAS_MONTO:
+            columnas[c].append(r[c])
+        columnas["fecha"].append(r["fecha"].toordinal())
+        for c in COLUMNAS_TEXTO:
+            texto = r[c]
+            i = indices.get(texto)
+            if i is None:
+                i = indices[texto] = len(textos)
+                textos.append(texto)
+            columnas[c].append(i)
+
+    cantidad = len(columnas["fecha"])
+    datos = [t.encode("utf-8") for t in textos]
+    offsets = array("I", [0])
+    for d in datos:
+        offsets.append(offsets[-1] + len(d))
+
+    tmp = f"{ruta_salida}.tmp"
+    with open(tmp, "wb") as out:
+        out.write((MAGIC + _CABECERA.pack(cantidad, len(textos))).ljust(TAM_CABECERA, b"\0"))
+        for nombre, _ in _COLUMNAS:
+            _volcar(out, columnas[nombre])
+        _volcar(out, offsets)
+        out.write(b"".join(datos))
+    os.replace(tmp, ruta_salida)
+    logger.info(f"Archivo columnar: {cantidad} registros, {len(textos)} textos distintos en {ruta_salida}")
+    return cantidad
+
+
+class ArchivoColumnar:
+    """
+    Lectura de un .cfecol. Cada columna se expone como memoryview tipado sobre
+    el mmap (o sobre los bytes de un stream), sin copiar los datos.
+    """
+
+    def __init__(self, origen):
+        self._f = None
+        self._mm = None
+        if hasattr(origen, "read"):
+            # Stream (p. ej. stdin volcado): no hay descriptor para mapear
+            self.ruta = getattr(origen, "name", None) or "<stream>"
+            buffer = origen.read()
+        else:
+            self.ruta = origen
+            self._f = open(origen, "rb")
+            try:
+                self._mm = buffer = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                self._f.close()
+                raise ValueError(f"Archivo columnar vacío: {origen}")
+        self._vista = memoryview(buffer)
+        self._vistas = []
+
+        try:
+            magic = bytes(self._vista[:len(MAGIC)]) if len(buffer) >= TAM_CABECERA else b""
+            if magic not in (MAGIC, MAGIC_V1):
+                raise ValueError(f"Archivo columnar con formato desconocido: {self.ruta}")
+            self.cantidad, self.cantidad_textos = _CABECERA.unpack_from(buffer, len(MAGIC))
+
+            self._columnas = {}
+            off = TAM_CABECERA
+            for nombre, tc in (_COLUMNAS if magic == MAGIC else _COLUMNAS_V1):
+                self._columnas[nombre] = (off, tc)
+                off += self.cantidad * array(tc).itemsize
+            self._off_offsets = off
+            self._off_textos = off + (self.cantidad_textos + 1) * 4
+            if self._off_textos > len(buffer):
+                raise ValueError(f"Archivo columnar truncado: {self.ruta}")
+        except ValueError:
+            self.cerrar()
+            raise
+
+    def _cast(self, off, tc, n):
+        itemsize = array(tc).itemsize
+        if _LITTLE:
+            vista = self._vista[off:off + n * itemsize].cast(tc)
+            self._vistas.append(vista)
+            return vista
+        # En hosts big-endian no hay vista directa: se copia y se invierte
+        arr = array(tc, self._vista[off:off + n * itemsize].tobytes())
+        arr.byteswap()
+        return memoryview(arr)
+
+    def columna(self, nombre):
+        """memoryview tipado de la columna `nombre` (montos, fecha, índices o códigos)."""
+        off, tc = self._columnas[nombre]
+        return self._cast(off, tc, self.cantidad)
+
+    def textos(self):
+        """Diccionario de textos decodificado (cada texto distinto una sola vez)."""
+        offsets = self._cast(self._off_offsets, "I", self.cantidad_textos + 1)
+        base = self._off_textos
+        vista = self._vista
+        return [
+            sys.intern(str(vista[base + offsets[i]:base + offsets[i + 1]], "utf-8"))
+            for i in range(self.cantidad_textos)
+        ]
+
+    def registros(self):
+        """
+        Genera los registros con la misma forma que reader.leer_excel. Los
+        códigos de tipo y moneda se clasifican con las tablas vigentes, una vez
+        por texto distinto.
+        """
+        from clasificacion import clasificar_moneda, clasificar_tipo
+
+        textos = self.textos()
+        montos = [self.columna(c) for c in COLUMNAS_MONTO]
+        indices = [self.columna(c) for c in COLUMNAS_TEXTO]
+        fechas_col = self.columna("fecha")
+        fechas = {}
+        codigos_tipo = {}
+        codigos_moneda = {}
+
+        for i in range(self.cantidad):
+            ordinal = fechas_col[i]
+            fecha = fechas.get(ordinal)
+            if fecha is None:
+                fecha = fechas[ordinal] = datetime.fromordinal(ordinal)
+            i_tipo = indices[0][i]
+            ct = codigos_tipo.get(i_tipo, -1)
+            if ct == -1:
+                ct = codigos_tipo[i_tipo] = clasificar_tipo(textos[i_tipo])[1]
+            i_moneda = indices[4][i]
+            cm = codigos_moneda.get(i_moneda, -1)
+            if cm == -1:
+                cm = codigos_moneda[i_moneda] = clasificar_moneda(textos[i_moneda])[1]
+            yield {
+                "fecha": fecha,
+                "tipo_cfe": textos[i_tipo],
+                "cod_tipo": ct,
+                "serie": textos[indices[1][i]],
+                "numero": textos[indices[2][i]],
+                "rut_emisor": textos[indices[3][i]],
+                "moneda": textos[i_moneda],
+                "cod_moneda": cm,
+                "monto_neto": montos[0][i],
+                "iva_ventas": montos[1][i],
+                "monto_total": montos[2][i],
+                "monto_ret_per": montos[3][i],
+                "monto_cred_fiscal": montos[4][i],
+            }
+
+    def cerrar(self):
+        # Las vistas exportadas deben liberarse antes de cerrar el mmap
+        for vista in self._vistas:
+            vista.release()
+        self._vistas = []
+        self._vista.release()
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+def leer_columnar(origen, limite=None):
+    """
+    Lee un .cfecol (ruta o archivo binario abierto) y retorna la lista de
+    registros, o solo los primeros `limite`.
+    """
+    with ArchivoColumnar(origen) as archivo:
+        registros = list(islice(archivo.registros(), limite))
+    logger.info(f"Archivo columnar: {len(registros)} registros leídos.")
+    return registros
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Exporta un archivo CFE (Excel) al formato columnar .cfecol.",
+    )
+    parser.add_argument("entrada", help="Archivo CFE de origen (.xls, .xlsx o .csv)")
+    parser.add_argument("salida", help=f"Archivo {EXTENSION} a generar")
+    parser.add_argument("--perfil", default=None, help="Perfil de cliente con aliases de columnas")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    from reader import leer_excel
+
+    try:
+        registros = leer_excel(os.path.abspath(args.entrada), args.perfil)
+        if not registros:
+            raise ValueError(f"No se encontraron registros CFE en el archivo: {args.entrada}")
+        escribir_columnar(registros, os.path.abspath(args.salida))
+    except (OSError, ValueError) as e:
+        logger.error(f"{e} Proceso terminado.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
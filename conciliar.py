@@ -0,0 +1,158 @@
+# conciliar.py — Conciliación entre el TXT Memory generado y el archivo CFE de origen
+#
+# Uso: python conciliar.py -i <archivo CFE> -t <TXT> [-t <TXT> ...] [-r reporte.csv] [--perfil P]
+#
+# Cada CFE se identifica por (prefijo, serie, número, RUT). Del TXT se toma el
+# concepto " <prefijo> <serie> <número>", el RUC y la suma de Total de las
+# líneas con Haber (la contrapartida); del Excel, Monto Total para facturas y
+# notas de crédito, y Ret/Per + Cred. Fiscal para e-Resguardos.
+
+import argparse
+import logging
+import os
+import sys
+
+logger = logging.getLogger(__name__)
+
+FALTANTE = "faltante_en_txt"
+SOBRANTE = "sobrante_en_txt"
+DIFERENCIA = "diferencia_importe"
+
+REPORTE_HEADER = "Problema,Prefijo,Serie,Numero,RUT,ImporteCFE,ImporteTXT"
+
+# Campos del TXT (ver writer.HEADER)
+_I_HABER, _I_CONCEPTO, _I_RUC, _I_TOTAL = 2, 3, 4, 6
+_CAMPOS_TXT = 14
+
+
+def _centesimos(valor):
+    return round(float(valor) * 100)
+
+
+def _clave_concepto(concepto, ruc):
+    """' e-F A 10779' + RUC -> ('e-F', 'A', '10779', RUC)."""
+    prefijo, _, resto = concepto.strip().partition(" ")
+    serie, _, numero = resto.rpartition(" ")
+    return (prefijo, serie, numero, ruc)
+
+
+def importes_txt(rutas_txt, importes=None):
+    """
+    Recorre los TXT línea a línea y acumula {clave CFE: centésimos de contrapartida}.
+    La memoria depende de la cantidad de CFEs, no de líneas.
+    """
+    if importes is None:
+        importes = {}
+    for ruta in rutas_txt:
+        with open(ruta, "r", encoding="utf-8", newline="") as f:
+            next(f, None)  # encabezado
+            for num, linea in enumerate(f, start=2):
+                campos = linea.rstrip("\r\n").split(",")
+                if len(campos) != _CAMPOS_TXT:
+                    logger.warning(f"{os.path.basename(ruta)} línea {num}: {len(campos)} campos, se omite.")
+                    continue
+                concepto = campos[_I_CONCEPTO]
+                if concepto.startswith(" CONS "):
+                    raise ValueError(
+                        f"{ruta} es un TXT consolidado; concilie usando su _detalle_consolidado.csv."
+                    )
+                clave = _clave_concepto(concepto, campos[_I_RUC])
+                importe = _centesimos(campos[_I_TOTAL]) if campos[_I_HABER] else 0
+                importes[clave] = importes.get(clave, 0) + importe
+    return importes
+
+
+def importes_cfe(registros):
+    """{clave CFE: centésimos esperados} desde los registros de leer_excel."""
+    from clasificacion import PREFIJOS, clasificar_tipo
+
+    importes = {}
+    for r in registros:
+        cod_tipo = r["cod_tipo"] if "cod_tipo" in r else clasificar_tipo(r["tipo_cfe"])[1]
+        if cod_tipo is None:
+            continue
+        prefijo = PREFIJOS[cod_tipo]
+        if prefijo == "e-R":
+            importe = max(r["monto_ret_per"], 0.0) + max(r["monto_cred_fiscal"], 0.0)
+            # Un e-Resguardo sin montos no genera asientos a propósito
+            if importe == 0:
+                continue
+        else:
+            importe = r["monto_total"]
+        clave = (prefijo, r["serie"], r["numero"], r["rut_emisor"])
+        importes[clave] = importes.get(clave, 0) + _centesimos(importe)
+    return importes
+
+
+def conciliar(registros, rutas_txt):
+    """
+    Hash-join entre los CFEs de origen y los TXT.
+    Retorna una lista de diferencias {problema, clave, importe_cfe, importe_txt}.
+    """
+    esperados = importes_cfe(registros)
+    encontrados = importes_txt(rutas_txt)
+
+    diferencias = []
+    for clave, esperado in esperados.items():
+        real = encontrados.pop(clave, None)
+        if real is None:
+            diferencias.append({"problema": FALTANTE, "clave": clave, "importe_cfe": esperado, "importe_txt": None})
+        elif real != esperado:
+            diferencias.append({"problema": DIFERENCIA, "clave": clave, "importe_cfe": esperado, "importe_txt": real})
+    # Lo que queda en el TXT no tiene CFE de origen
+    for clave, real in encontrados.items():
+        diferencias.append({"problema": SOBRANTE, "clave": clave, "importe_cfe": None, "importe_txt": real})
+
+    logger.info(
+        f"Conciliación: {len(esperados)} CFEs de origen; "
+        f"{sum(1 for d in diferencias if d['problema'] == FALTANTE)} faltantes, "
+        f"{sum(1 for d in diferencias if d['problema'] == SOBRANTE)} sobrantes, "
+        f"{sum(1 for d in diferencias if d['problema'] == DIFERENCIA)} con diferencia de importe."
+    )
+    return diferencias
+
+
+def _formato(centesimos):
+    return "" if centesimos is None else f"{centesimos / 100:.2f}"
+
+
+def escribir_reporte(diferencias, ruta_salida):
+    lineas = [REPORTE_HEADER]
+    for d in diferencias:
+        prefijo, serie, numero, rut = d["clave"]
+        lineas.append(
+            f"{d['problema']},{prefijo},{serie},{numero},{rut},{_formato(d['importe_cfe'])},{_formato(d['importe_txt'])}"
+        )
+    with open(ruta_salida, "w", encoding="utf-8", newline="") as f:
+        f.write("\n".join(lineas))
+    logger.info(f"Reporte de conciliación: {ruta_salida}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Concilia los TXT Memory generados contra el archivo CFE de origen.",
+    )
+    parser.add_argument("--input", "-i", required=True, help="Archivo CFE de origen (.xls, .xlsx, .csv o .cfecol)")
+    parser.add_argument("--txt", "-t", required=True, action="append", help="TXT generado (repetible para salidas particionadas)")
+    parser.add_argument("--reporte", "-r", default=None, help="CSV de diferencias. Por defecto <primer TXT>_conciliacion.csv")
+    parser.add_argument("--perfil", default=None, help="Perfil de cliente usado en la conversión")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+    from reader import leer_excel
+
+    try:
+        registros = leer_excel(os.path.abspath(args.input), args.perfil)
+        diferencias = conciliar(registros, [os.path.abspath(t) for t in args.txt])
+    except (OSError, ValueError) as e:
+        logger.error(f"{e} Proceso terminado.")
+        sys.exit(1)
+
+    ruta_reporte = args.reporte or f"{os.path.splitext(os.path.abspath(args.txt[0]))[0]}_conciliacion.csv"
+    escribir_reporte(diferencias, ruta_reporte)
+    sys.exit(1 if diferencias else 0)
+
+
+if __name__ == "__main__":
+    main()
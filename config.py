@@ -98,6 +98,13 @@ TIPO_CFE_PREFIJOS = {
     "e-resguardo": "e-R",
 }
 
+# Mapeo de texto de moneda a código Memory (0 = pesos, 1 = dólares).
+# Se compara sin distinguir mayúsculas ni tildes (ver clasificacion.py).
+MONEDA_CODIGOS = {
+    "UYU": 0, "$U": 0, "PESOS": 0, "PESO URUGUAYO": 0,
+    "USD": 1, "US$": 1, "DÓLAR": 1, "DOLAR": 1,
+}
+
 # Cuentas IVA según porcentaje
 IVA_22_CUENTA = 11331
 IVA_10_CUENTA = 11332
@@ -105,3 +112,101 @@ IVA_OTRO_CUENTA = 11338
 
 # Tolerancia para comparación de porcentaje IVA
 IVA_TOLERANCIA = 0.015
+
+# Carpeta con perfiles de cliente (<nombre>.json). Se puede cambiar con CFE_PERFILES.
+PERFILES_DIR = "perfiles"
+
+# Cantidad máxima de perfiles cargados que se mantienen en memoria (LRU)
+PERFILES_CACHE_MAX = 64
+
+# Cuenta sugerida para RUTs desconocidos según prefijo del código de actividad
+# del registro nacional de RUT (ver registro_rut.py). Ej: {"4520": 5107}
+ACTIVIDAD_CUENTAS = {}
+
+# Reglas contables declarativas (ver motor_reglas.py). Para cada familia de CFE:
+#   prefijos: prefijos de concepto (TIPO_CFE_PREFIJOS) a los que aplica
+#   casos: se evalúan en orden; el primero cuyo "cuando" se cumple genera sus asientos
+#     cuando: {campo_monto: "cero" | "no_cero" | "positivo"}
+#     asientos: plantillas con
+#       debe / haber: cuenta fija, [cuenta_UYU, cuenta_USD], "proveedor" o "iva"
+#       total / iva: campo del registro con el monto (omitido = 0)
+#       libro: "C", "E" o "proveedor" (según la cuenta del proveedor)
+#       si: campo que debe ser > 0 para generar este asiento
+#   aviso_sin_asientos: mensaje si ningún asiento resultó generado
+REGLAS_ASIENTOS = [
+    {
+        "familia": "factura",
+        "prefijos": ["e-F", "NC"],
+        "casos": [
+            {
+                # CASO 1C: Monto Neto = 0 → contrapartida banco
+                "caso": "neto_cero",
+                "cuando": {"monto_neto": "cero"},
+                "asientos": [
+                    {"debe": [21111, 21112], "total": "monto_total", "libro": "C"},
+                    {"haber": [11121, 11122], "total": "monto_total", "libro": "C"},
+                ],
+            },
+            {
+                # CASO 1A: con IVA → proveedor, IVA y cierre
+                "caso": "con_iva",
+                "cuando": {"iva_ventas": "no_cero"},
+                "asientos": [
+                    {"debe": "proveedor", "total": "monto_neto", "libro": "proveedor"},
+                    {"debe": "iva", "iva": "iva_ventas", "libro": "proveedor"},
+                    {"haber": [21111, 21112], "total": "monto_total", "libro": "proveedor"},
+                ],
+            },
+            {
+                # CASO 1B: sin IVA → proveedor y cierre
+                "caso": "sin_iva",
+                "cuando": {},
+                "asientos": [
+                    {"debe": "proveedor", "total": "monto_neto", "libro": "proveedor"},
+                    {"haber": [21111, 21112], "total": "monto_total", "libro": "proveedor"},
+                ],
+            },
+        ],
+    },
+    {
+        "familia": "resguardo",
+        "prefijos": ["e-R"],
+        "casos": [
+            {
+                "caso": "resguardo",
+                "cuando": {},
+                "asientos": [
+                    {"debe": 11337, "haber": [11111, 11112], "total": "monto_ret_per", "libro": "C", "si": "monto_ret_per"},
+                    {"debe": 11336, "haber": [11111, 11112], "total": "monto_cred_fiscal", "libro": "C", "si": "monto_cred_fiscal"},
+                ],
+            },
+        ],
+        "aviso_sin_asientos": "e-Resguardo sin montos Ret/Per ni Cred. Fiscal",
+    },
+]
+
+# Diferencia máxima admitida entre Monto Total y la suma de sus componentes
+VALIDACION_TOLERANCIA_TOTAL = 0.02
+
+# Días hacia atrás que se buscan en el historial de cotizaciones si la fecha
+# del CFE no tiene cotización (fines de semana, feriados)
+COTIZACION_MAX_DIAS_ATRAS = 7
+
+# Bytes de stdin que se mantienen en memoria antes de volcar a un temporal en disco
+STDIN_SPOOL_MAX = 64 * 1024 * 1024
+
+# Filas que se leen de cada hoja para ubicar el encabezado CFE antes de
+# parsear completa solo la hoja elegida
+SONDEO_FILAS = 30
+
+# Hilos para sondear las hojas de un .xlsx (1 = secuencial)
+SONDEO_HILOS = 1
+
+# Modo de memoria acotada (--max-memoria): bytes estimados por fila en vuelo
+# (registro + sus asientos) para calcular el tamaño de ventana, y ventana mínima
+MEMORIA_BYTES_POR_FILA = 4096
+MEMORIA_VENTANA_MINIMA = 1000
+
+# Compresión de los objetos del archivo de auditoría (--archivar): "gzip" o "xz"
+# (xz comprime más pero es varias veces más lento)
+ALMACEN_COMPRESION = "gzip"
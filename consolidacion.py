@@ -0,0 +1,196 @@
+# consolidacion.py — Agregación de asientos por día, cuenta, RUC, moneda y libro
+#
+# Modo opcional para clientes con cientos de CFEs chicos del mismo proveedor:
+# en lugar de 2–3 líneas por CFE se escribe una línea por grupo, y un archivo
+# de detalle permite volver de cada grupo a los comprobantes que lo forman.
+
+import heapq
+import logging
+import os
+import pickle
+import tempfile
+from itertools import islice
+
+logger = logging.getLogger(__name__)
+
+DETALLE_HEADER = "Grupo,Concepto,Debe,Haber,RUC,Total,IVA"
+
+
+def _centesimos(monto):
+    """'123.45' -> 12345. Se suma en enteros para no acumular error de float."""
+    return round(float(monto) * 100)
+
+
+class Consolidador:
+    """
+    Agregación en streaming: cada asiento actualiza su grupo en O(1) y su
+    línea de detalle se escribe de inmediato, así que la memoria depende solo
+    de la cantidad de grupos.
+    """
+
+    def __init__(self, ruta_detalle=None):
+        # clave -> [numero_grupo, asiento_base, total_cent, iva_cent, cantidad]
+        self._grupos = {}
+        self.asientos_origen = 0
+        self.ruta_detalle = ruta_detalle
+        self._detalle = None
+        if ruta_detalle:
+            directorio = os.path.dirname(ruta_detalle)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            self._detalle = open(ruta_detalle, "w", encoding="utf-8", newline="")
+            self._detalle.write(DETALLE_HEADER)
+
+    def agregar(self, asiento):
+        a = asiento
+        # El período evita sumar el mismo día de meses distintos y la
+        # cotización, mezclar tipos de cambio
+        clave = (
+            a.get("periodo", ""), a["dia"], a["debe"], a["haber"], a["ruc"],
+            a["moneda"], a["libro"], a["cotizacion"],
+        )
+        grupo = self._grupos.get(clave)
+        if grupo is None:
+            grupo = [len(self._grupos) + 1, a, 0, 0, 0]
+            self._grupos[clave] = grupo
+        grupo[2] += _centesimos(a["total"])
+        grupo[3] += _centesimos(a["iva"])
+        grupo[4] += 1
+        self.asientos_origen += 1
+
+        if self._detalle is not None:
+            self._detalle.write(
+                f"\n{grupo[0]},{a['concepto'].strip()},{a['debe']},{a['haber']},{a['ruc']},{a['total']},{a['iva']}"
+            )
+
+    def agregar_todos(self, asientos):
+        for a in asientos:
+            self.agregar(a)
+
+    def cerrar(self):
+        if self._detalle is not None:
+            self._detalle.close()
+            self._detalle = None
+            logger.info(f"Detalle de consolidación: {self.ruta_detalle}")
+
+    def asientos(self):
+        """Retorna un asiento por grupo, con totales sumados y concepto sintético."""
+        return [_asiento_grupo(*grupo) for grupo in self._grupos.values()]
+
+    def __len__(self):
+        return len(self._grupos)
+
+
+def consolidar_asientos(asientos, ruta_detalle=None):
+    """Atajo: consolida una secuencia de asientos y retorna los asientos agregados."""
+    consolidador = Consolidador(ruta_detalle)
+    try:
+        consolidador.agregar_todos(asientos)
+    finally:
+        consolidador.cerrar()
+    resultado = consolidador.asientos()
+    logger.info(f"Consolidación: {consolidador.asientos_origen} asientos -> {len(resultado)} líneas.")
+    return resultado
+
+
+def _clave_orden(a):
+    """Clave de grupo comparable entre sí (debe/haber pueden ser int o "")."""
+    return (
+        a.get("periodo", ""), a["dia"], str(a["debe"]), str(a["haber"]), a["ruc"],
+        a["moneda"], a["libro"], str(a["cotizacion"]),
+    )
+
+
+def _volcar_tanda(tanda, carpeta, numero):
+    ruta = os.path.join(carpeta, f"tanda_{numero:05d}.pkl")
+    with open(ruta, "wb") as f:
+        for a in tanda:
+            pickle.dump(a, f, pickle.HIGHEST_PROTOCOL)
+    return ruta
+
+
+def _leer_tanda(ruta):
+    with open(ruta, "rb") as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+
+
+def consolidar_asientos_externo(asientos, ventana, ruta_detalle=None):
+    """
+    Consolidación con memoria acotada a `ventana` asientos: se ordenan por
+    clave de grupo en tandas que se vuelcan a temporales y luego se mezclan
+    (heapq.merge), así cada grupo llega contiguo. Genera los asientos
+    consolidados en orden de clave (período, día, cuentas, RUC...), no en
+    orden de aparición como consolidar_asientos; los montos son los mismos.
+    """
+    asientos = iter(asientos)
+    with tempfile.TemporaryDirectory(prefix="cfe_consolidar_") as carpeta:
+        tandas = []
+        while True:
+            tanda = sorted(islice(asientos, ventana), key=_clave_orden)
+            ultima = len(tanda) < ventana
+            if ultima and not tandas:
+                # Todo entró en una ventana: no hace falta volcar a disco
+                ordenados = iter(tanda)
+                break
+            if tanda:
+                tandas.append(_volcar_tanda(tanda, carpeta, len(tandas)))
+            del tanda
+            if ultima:
+                logger.info(f"Consolidación: {len(tandas)} tandas ordenadas volcadas a disco.")
+                ordenados = heapq.merge(*(_leer_tanda(r) for r in tandas), key=_clave_orden)
+                break
+
+        yield from _agrupar_ordenados(ordenados, ruta_detalle)
+
+
+def _agrupar_ordenados(ordenados, ruta_detalle=None):
+    """Agrupa asientos ya ordenados por clave: un grupo vivo a la vez."""
+    detalle = None
+    if ruta_detalle:
+        directorio = os.path.dirname(ruta_detalle)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        detalle = open(ruta_detalle, "w", encoding="utf-8", newline="")
+        detalle.write(DETALLE_HEADER)
+
+    try:
+        numero = 0
+        origen = 0
+        clave_actual = None
+        base = None
+        total_cent = iva_cent = cantidad = 0
+        for a in ordenados:
+            clave = _clave_orden(a)
+            if clave != clave_actual:
+                if base is not None:
+                    yield _asiento_grupo(numero, base, total_cent, iva_cent, cantidad)
+                numero += 1
+                clave_actual, base = clave, a
+                total_cent = iva_cent = cantidad = 0
+            total_cent += _centesimos(a["total"])
+            iva_cent += _centesimos(a["iva"])
+            cantidad += 1
+            origen += 1
+            if detalle is not None:
+                detalle.write(
+                    f"\n{numero},{a['concepto'].strip()},{a['debe']},{a['haber']},{a['ruc']},{a['total']},{a['iva']}"
+                )
+        if base is not None:
+            yield _asiento_grupo(numero, base, total_cent, iva_cent, cantidad)
+    finally:
+        if detalle is not None:
+            detalle.close()
+            logger.info(f"Detalle de consolidación: {ruta_detalle}")
+    logger.info(f"Consolidación: {origen} asientos -> {numero} líneas.")
+
+
+def _asiento_grupo(numero, base, total_cent, iva_cent, cantidad):
+    asiento = dict(base)
+    asiento["concepto"] = f" CONS {numero} x{cantidad}"
+    asiento["total"] = f"{total_cent / 100:.2f}"
+    asiento["iva"] = f"{iva_cent / 100:.2f}"
+    return asiento
@@ -0,0 +1,345 @@
+# conversor.py — Conversión completa de un archivo CFE a TXT Memory
+
+import logging
+import os
+import time
+from itertools import chain, islice
+
+from config import MEMORIA_BYTES_POR_FILA, MEMORIA_VENTANA_MINIMA
+from consolidacion import consolidar_asientos, consolidar_asientos_externo
+from estadisticas import Estadisticas
+from perfiles import obtener_perfil
+from reader import iterar_registros, leer_excel
+from rules import generar_asientos
+from validacion import validar_registros
+from writer import (
+    HEADER, _asiento_a_linea,
+    ReporteValidacion,
+    escribir_txt, escribir_txt_stream, escribir_txt_particionado, escribir_reporte_desconocidos, escribir_reporte_validacion,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def resolver_desconocidos(desconocidos, perfil, registro_rut=None):
+    """
+    Completa los RUTs desconocidos {rut: cantidad} con nombre, actividad y
+    cuenta sugerida consultando en un solo lote el registro nacional compilado
+    (registro_rut o variable CFE_REGISTRO_RUT). Retorna una lista de dicts.
+    """
+    resultado = [{"rut": rut, "cantidad": cantidad} for rut, cantidad in sorted(desconocidos.items())]
+    registro_rut = registro_rut or os.environ.get("CFE_REGISTRO_RUT")
+    if not resultado or not registro_rut:
+        return resultado
+
+    from registro_rut import RegistroRUT, sugerir_cuenta
+
+    with RegistroRUT(registro_rut) as registro:
+        encontrados = registro.buscar_lote(desconocidos)
+    for d in resultado:
+        info = encontrados.get(d["rut"])
+        if info is None:
+            continue
+        d.update(info)
+        d["cuenta_sugerida"] = sugerir_cuenta(info["actividad"], perfil.actividad_cuentas)
+    logger.info(f"Registro RUT: {len(encontrados)} de {len(resultado)} RUTs desconocidos resueltos.")
+    return resultado
+
+
+def convertir_archivo(
+    ruta_input, ruta_txt, perfil=None, registro_rut=None, consolidar=False, particionar=False, max_memoria=None,
+):
+    """
+    Lee el archivo CFE, genera los asientos y escribe el TXT.
+    `perfil` es el nombre del perfil de cliente (None = config.py).
+    Si hay RUTs sin cuenta, escribe <nombre>_ruts_desconocidos.csv junto al TXT,
+    resueltos contra el registro nacional `registro_rut` si está disponible.
+    Si la validación de montos encuentra problemas, escribe <nombre>_validacion.csv.
+    Con `consolidar`, agrupa los asientos (ver consolidacion.py) y escribe el
+    detalle grupo -> CFE en <nombre>_detalle_consolidado.csv.
+    Con `particionar`, en lugar de un único TXT escribe uno por mes y libro
+    más <nombre>_manifest.json (ver writer.escribir_txt_particionado).
+    Junto al TXT escribe además <nombre>_estadisticas.json/.csv con totales por
+    proveedor, cuenta, día, moneda e IVA, calculados al vuelo (ver estadisticas.py).
+    `ruta_input` puede ser un archivo binario abierto y `ruta_txt` un stream de
+    texto (modo pipeline): el TXT se escribe a medida que se generan los
+    asientos y los reportes laterales se omiten.
+    Con `max_memoria` (bytes) se procesa por ventanas acotadas, ver _convertir_acotado.
+    Retorna un dict resumen {cfes, asientos, lineas, errores, ruts_desconocidos, problemas, ruta_txt,
+    periodos, segundos}; `periodos` son los AAAA-MM de los asientos (vacío con salida a stream).
+    Lanza ValueError si el archivo no tiene registros o no genera asientos.
+    """
+    inicio = time.perf_counter()
+    perfil = obtener_perfil(perfil)
+    a_stream = not isinstance(ruta_txt, (str, os.PathLike))
+    if a_stream and particionar:
+        raise ValueError("La salida particionada necesita una carpeta; no se puede usar con salida a stream.")
+    nombre_input = ruta_input if isinstance(ruta_input, (str, os.PathLike)) else (getattr(ruta_input, "name", None) or "<stream>")
+
+    logger.info(f"Leyendo archivo CFE: {nombre_input}")
+    if max_memoria:
+        return _convertir_acotado(
+            ruta_input, ruta_txt, nombre_input, perfil, registro_rut, consolidar, particionar, max_memoria, inicio,
+        )
+    registros = leer_excel(ruta_input, perfil)
+
+    if not registros:
+        raise ValueError(f"No se encontraron registros CFE en el archivo: {nombre_input}")
+
+    logger.info(f"Se encontraron {len(registros)} comprobantes en {os.path.basename(str(nombre_input))}.")
+
+    problemas = validar_registros(registros, perfil)
+
+    conteo = {"asientos": 0, "errores": 0}
+    desconocidos = {}
+    asientos_generados = _generar(registros, perfil, desconocidos, conteo)
+    base_salida = None if a_stream else os.path.splitext(ruta_txt)[0]
+    estadisticas = None
+    if not a_stream:
+        # Totales en la misma pasada en que los asientos van al TXT
+        estadisticas = Estadisticas(perfil)
+        asientos_generados = estadisticas.contabilizar(asientos_generados)
+
+    if a_stream and not consolidar:
+        # Sin agregación no hace falta retener los asientos: van directo al stream
+        lineas = escribir_txt_stream(_con_primero(asientos_generados, nombre_input), ruta_txt)
+    else:
+        todos_asientos = list(asientos_generados)
+        if not todos_asientos:
+            raise ValueError(f"No se generaron asientos para {nombre_input}. Revise los datos de entrada.")
+
+        asientos_salida = todos_asientos
+        if consolidar:
+            ruta_detalle = f"{base_salida}_detalle_consolidado.csv" if base_salida else None
+            asientos_salida = consolidar_asientos(todos_asientos, ruta_detalle)
+        lineas = len(asientos_salida)
+
+        if a_stream:
+            escribir_txt_stream(asientos_salida, ruta_txt)
+        elif particionar:
+            ruta_txt = escribir_txt_particionado(
+                asientos_salida, os.path.dirname(ruta_txt), os.path.basename(base_salida),
+            )
+        else:
+            escribir_txt(asientos_salida, ruta_txt)
+
+    if a_stream:
+        if problemas or desconocidos:
+            logger.info("Salida a stream: se omiten los reportes de validación y RUTs desconocidos.")
+    else:
+        estadisticas.escribir(base_salida)
+        _escribir_reportes(registros, problemas, desconocidos, perfil, registro_rut, base_salida)
+
+    return {
+        "cfes": len(registros),
+        "asientos": conteo["asientos"],
+        "lineas": lineas,
+        "errores": conteo["errores"],
+        "ruts_desconocidos": len(desconocidos),
+        "problemas": len(problemas),
+        "ruta_txt": ruta_txt if not a_stream else (getattr(ruta_txt, "name", None) or "<stream>"),
+        "periodos": estadisticas.periodos() if estadisticas is not None else [],
+        "segundos": time.perf_counter() - inicio,
+    }
+
+
+def previsualizar(ruta_input, filas=20, perfil=None):
+    """
+    Vista previa: lee solo las primeras `filas` filas de datos y genera sus
+    asientos sin escribir nada. Retorna {encabezado, items, ruts_desconocidos,
+    segundos}, con un item {registro, lineas} por CFE (lineas tal como irían al TXT).
+    """
+    inicio = time.perf_counter()
+    perfil = obtener_perfil(perfil)
+    encabezado = {}
+    registros = leer_excel(ruta_input, perfil, limite=filas, encabezado=encabezado)
+
+    desconocidos = {}
+    items = []
+    for idx, registro in enumerate(registros, start=1):
+        asientos = generar_asientos(registro, fila_num=idx, perfil=perfil, desconocidos=desconocidos)
+        items.append({"registro": registro, "lineas": [_asiento_a_linea(a) for a in asientos]})
+
+    return {
+        "encabezado": encabezado,
+        "items": items,
+        "ruts_desconocidos": desconocidos,
+        "segundos": time.perf_counter() - inicio,
+    }
+
+
+def _letra_columna(indice):
+    """0 -> 'A', 26 -> 'AA'."""
+    letras = ""
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(ord("A") + resto) + letras
+    return letras
+
+
+def formatear_vista_previa(vista):
+    """Texto legible de una vista previa, para consola o GUI."""
+    encabezado = vista["encabezado"]
+    lineas = []
+    if encabezado.get("columnas"):
+        if encabezado.get("hoja"):
+            lineas.append(f"Hoja '{encabezado['hoja']}', encabezado en fila {encabezado['fila']}:")
+        else:
+            # CSV/TSV: no hay hojas
+            lineas.append(f"Encabezado en fila {encabezado['fila']}:")
+        for clave, indice in encabezado["columnas"].items():
+            lineas.append(f"  {clave:<20} columna {_letra_columna(indice)}")
+    else:
+        lineas.append("Archivo ya normalizado (.cfecol): sin encabezado.")
+
+    lineas.append("")
+    lineas.append(HEADER)
+    for n, item in enumerate(vista["items"], start=1):
+        r = item["registro"]
+        lineas.append(
+            f"# {n}: {r['fecha']:%d/%m/%Y} {r['tipo_cfe']} {r['serie']} {r['numero']} "
+            f"RUT {r['rut_emisor']} {r['moneda']} total {r['monto_total']:.2f}"
+        )
+        lineas.extend(item["lineas"] or ["  (sin asientos)"])
+
+    desconocidos = vista["ruts_desconocidos"]
+    lineas.append("")
+    if desconocidos:
+        lineas.append(f"RUTs desconocidos ({len(desconocidos)}):")
+        lineas.extend(f"  {rut} x{cantidad}" for rut, cantidad in sorted(desconocidos.items()))
+    else:
+        lineas.append("Sin RUTs desconocidos.")
+    lineas.append(f"{len(vista['items'])} CFEs en {vista['segundos']:.2f} s")
+    return "\n".join(lineas)
+
+
+def _convertir_acotado(ruta_input, ruta_txt, nombre_input, perfil, registro_rut, consolidar, particionar, max_memoria, inicio):
+    """
+    Conversión con memoria acotada: los registros se leen en streaming y se
+    validan y convierten por ventanas de tamaño fijo, sin listas completas.
+    La consolidación, que agrupa más allá de la ventana, ordena por tandas
+    volcadas a disco (ver consolidacion.consolidar_asientos_externo). Lo único
+    que crece con el archivo son los índices chicos: la clave de cada CFE para
+    detectar duplicados (ver validar_registros), RUTs desconocidos y grupos de
+    estadísticas.
+    """
+    ventana = max(MEMORIA_VENTANA_MINIMA, max_memoria // MEMORIA_BYTES_POR_FILA)
+    a_stream = not isinstance(ruta_txt, (str, os.PathLike))
+    base_salida = None if a_stream else os.path.splitext(ruta_txt)[0]
+    logger.info(f"Memoria acotada a {max_memoria // (1024 * 1024)} MB: ventanas de {ventana} filas.")
+
+    fuente = iterar_registros(ruta_input, perfil)
+    primero = next(fuente, None)
+    if primero is None:
+        raise ValueError(f"No se encontraron registros CFE en el archivo: {nombre_input}")
+    registros = chain((primero,), fuente)
+
+    conteo = {"cfes": 0, "asientos": 0, "errores": 0, "problemas": 0, "lineas": 0}
+    desconocidos = {}
+    vistos = {}
+    reporte = None if a_stream else ReporteValidacion(f"{base_salida}_validacion.csv")
+
+    def por_ventanas():
+        while True:
+            tanda = list(islice(registros, ventana))
+            if not tanda:
+                return
+            fila_inicial = conteo["cfes"] + 1
+            problemas = validar_registros(tanda, perfil, fila_inicial, vistos)
+            conteo["problemas"] += len(problemas)
+            if reporte is not None:
+                reporte.agregar(problemas, tanda, fila_inicial)
+            conteo["cfes"] += len(tanda)
+            yield from _generar(tanda, perfil, desconocidos, conteo, fila_inicial)
+
+    asientos = por_ventanas()
+    estadisticas = None
+    if not a_stream:
+        estadisticas = Estadisticas(perfil)
+        asientos = estadisticas.contabilizar(asientos)
+    if consolidar:
+        ruta_detalle = f"{base_salida}_detalle_consolidado.csv" if base_salida else None
+        asientos = consolidar_asientos_externo(asientos, ventana, ruta_detalle)
+    asientos = _contar_lineas(asientos, conteo)
+
+    if not a_stream and os.path.dirname(ruta_txt):
+        # Los reportes por ventana se escriben ahí desde la primera tanda
+        os.makedirs(os.path.dirname(ruta_txt), exist_ok=True)
+    try:
+        # Antes de abrir o escribir la salida: sin asientos no queda un TXT con solo el encabezado
+        asientos = _con_primero(asientos, nombre_input)
+        if a_stream:
+            escribir_txt_stream(asientos, ruta_txt)
+        elif particionar:
+            ruta_txt = escribir_txt_particionado(asientos, os.path.dirname(ruta_txt), os.path.basename(base_salida))
+        else:
+            with open(ruta_txt, "w", encoding="utf-8", newline="") as f:
+                escribir_txt_stream(asientos, f)
+            logger.info(f"Archivo generado: {ruta_txt}")
+            logger.info(f"  {conteo['lineas']} asientos escritos.")
+    finally:
+        fuente.close()
+        if reporte is not None:
+            reporte.cerrar()
+
+    if a_stream:
+        if conteo["problemas"] or desconocidos:
+            logger.info("Salida a stream: se omiten los reportes de validación y RUTs desconocidos.")
+    else:
+        estadisticas.escribir(base_salida)
+        _escribir_reporte_desconocidos(desconocidos, perfil, registro_rut, base_salida)
+
+    return {
+        "cfes": conteo["cfes"],
+        "asientos": conteo["asientos"],
+        "lineas": conteo["lineas"],
+        "errores": conteo["errores"],
+        "ruts_desconocidos": len(desconocidos),
+        "problemas": conteo["problemas"],
+        "ruta_txt": ruta_txt if not a_stream else (getattr(ruta_txt, "name", None) or "<stream>"),
+        "periodos": estadisticas.periodos() if estadisticas is not None else [],
+        "segundos": time.perf_counter() - inicio,
+    }
+
+
+def _con_primero(asientos, nombre_input):
+    """
+    Toma el primer asiento antes de escribir nada: si no hay ninguno lanza
+    ValueError sin que llegue un byte a la salida. Retorna los asientos completos.
+    """
+    asientos = iter(asientos)
+    primero = next(asientos, None)
+    if primero is None:
+        raise ValueError(f"No se generaron asientos para {nombre_input}. Revise los datos de entrada.")
+    return chain((primero,), asientos)
+
+
+def _contar_lineas(asientos, conteo):
+    for a in asientos:
+        conteo["lineas"] += 1
+        yield a
+
+
+def _generar(registros, perfil, desconocidos, conteo, fila_inicial=1):
+    """Genera los asientos de todos los registros, contando asientos y CFEs con error."""
+    for idx, registro in enumerate(registros, start=fila_inicial):
+        asientos = generar_asientos(registro, fila_num=idx, perfil=perfil, desconocidos=desconocidos)
+        if asientos:
+            conteo["asientos"] += len(asientos)
+            yield from asientos
+        else:
+            conteo["errores"] += 1
+
+
+def _escribir_reportes(registros, problemas, desconocidos, perfil, registro_rut, base_salida):
+    if problemas:
+        escribir_reporte_validacion(problemas, registros, f"{base_salida}_validacion.csv")
+
+    _escribir_reporte_desconocidos(desconocidos, perfil, registro_rut, base_salida)
+
+
+def _escribir_reporte_desconocidos(desconocidos, perfil, registro_rut, base_salida):
+    if desconocidos:
+        reporte = resolver_desconocidos(desconocidos, perfil, registro_rut)
+        escribir_reporte_desconocidos(reporte, f"{base_salida}_ruts_desconocidos.csv")
@@ -0,0 +1,95 @@
+# cotizaciones.py — Cotización del dólar por fecha desde un historial diario
+#
+# El historial (CSV fecha, cotizacion) se carga una vez en dos arrays ordenados
+# por fecha; cada fecha se resuelve por bisección y queda cacheada, de modo que
+# el costo por fila es una búsqueda en un dict.
+
+import csv
+import logging
+import os
+from array import array
+from bisect import bisect_right
+
+from config import COTIZACION_MAX_DIAS_ATRAS
+from reader import _parse_fecha, _parse_monto
+
+logger = logging.getLogger(__name__)
+
+
+class HistorialCotizaciones:
+    """Historial diario de cotizaciones con búsqueda por fecha."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._fechas = array("l")
+        self._valores = array("d")
+        self._cache = {}
+        self._cargar()
+
+    def _cargar(self):
+        filas = {}
+        with open(self.ruta, "r", encoding="utf-8-sig", newline="") as f:
+            muestra = f.read(4096)
+            f.seek(0)
+            try:
+                dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+            except csv.Error:
+                dialecto = csv.excel
+            for fila in csv.reader(f, dialect=dialecto):
+                if len(fila) < 2:
+                    continue
+                fecha = _parse_fecha(fila[0])
+                try:
+                    valor = _parse_monto(fila[1])
+                except ValueError:
+                    valor = 0.0
+                # La fila de encabezado y las inválidas no tienen fecha o valor
+                if fecha is None or valor <= 0:
+                    continue
+                filas[fecha.toordinal()] = valor
+
+        for ordinal in sorted(filas):
+            self._fechas.append(ordinal)
+            self._valores.append(filas[ordinal])
+        logger.info(f"Historial de cotizaciones: {len(self._fechas)} días desde {self.ruta}")
+
+    def __len__(self):
+        return len(self._fechas)
+
+    def cotizacion(self, fecha):
+        """
+        Cotización vigente para la fecha: la del mismo día o, si no hay, la del
+        último día hábil anterior (hasta COTIZACION_MAX_DIAS_ATRAS). None si no hay.
+        """
+        ordinal = fecha.toordinal()
+        if ordinal in self._cache:
+            return self._cache[ordinal]
+
+        valor = None
+        i = bisect_right(self._fechas, ordinal) - 1
+        if i >= 0 and ordinal - self._fechas[i] <= COTIZACION_MAX_DIAS_ATRAS:
+            valor = self._valores[i]
+        else:
+            logger.warning(f"Sin cotización para {fecha:%d/%m/%Y} en {os.path.basename(self.ruta)}.")
+        self._cache[ordinal] = valor
+        return valor
+
+
+_historial = None
+
+
+def configurar(ruta):
+    """Define el historial de cotizaciones. None desactiva la búsqueda (cotización 0)."""
+    global _historial
+    _historial = HistorialCotizaciones(ruta) if ruta else None
+
+
+def cotizacion_para(fecha):
+    """Cotización para la fecha según el historial configurado, o None."""
+    if _historial is None:
+        return None
+    return _historial.cotizacion(fecha)
+
+
+if os.environ.get("CFE_COTIZACIONES"):
+    configurar(os.environ["CFE_COTIZACIONES"])
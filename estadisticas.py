@@ -0,0 +1,122 @@
+# estadisticas.py — Totales por proveedor, cuenta, día y moneda en una sola pasada
+#
+# Cada asiento que sale hacia el TXT suma en O(1) a sus grupos; la memoria
+# depende solo de la cantidad de claves distintas. Los importes se acumulan en
+# centésimos y siempre separados por moneda (no se suman pesos con dólares).
+# Importe de una línea = Total + IVA (las líneas de IVA llevan Total 0).
+
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+CSV_HEADER = "Dimension,Clave,Moneda,Debe,Haber,IVA,Asientos"
+
+# Nombre de cada sección del reporte, en el orden en que se escriben
+DIMENSIONES = ("por_moneda", "por_proveedor", "por_cuenta", "por_dia", "iva")
+
+_NOMBRE_MONEDA = {0: "UYU", 1: "USD"}
+
+
+def _centesimos(monto):
+    return round(float(monto) * 100)
+
+
+def _pesos(centesimos):
+    return round(centesimos / 100, 2)
+
+
+class Estadisticas:
+    """
+    Acumulador de totales. Cada grupo es [debe, haber, iva, asientos]
+    (importes en centésimos) bajo la clave (dimensión, clave, moneda).
+    """
+
+    def __init__(self, perfil):
+        # Las cuentas IVA dependen del perfil del cliente
+        self._categorias_iva = {
+            perfil.iva_22_cuenta: "iva_22",
+            perfil.iva_10_cuenta: "iva_10",
+            perfil.iva_otro_cuenta: "iva_otro",
+        }
+        self._grupos = {d: {} for d in DIMENSIONES}
+        self.asientos = 0
+
+    def _sumar(self, dimension, clave, debe, haber, iva):
+        grupo = self._grupos[dimension].get(clave)
+        if grupo is None:
+            grupo = self._grupos[dimension][clave] = [0, 0, 0, 0]
+        grupo[0] += debe
+        grupo[1] += haber
+        grupo[2] += iva
+        grupo[3] += 1
+
+    def agregar(self, asiento):
+        a = asiento
+        moneda = a["moneda"]
+        iva = _centesimos(a["iva"])
+        importe = _centesimos(a["total"]) + iva
+        debe = importe if a["debe"] != "" else 0
+        haber = importe if a["haber"] != "" else 0
+
+        self._sumar("por_moneda", ("", moneda), debe, haber, iva)
+        self._sumar("por_proveedor", (a["ruc"], moneda), debe, haber, iva)
+        self._sumar("por_dia", (f"{a.get('periodo', '')}-{a['dia']:02d}", moneda), debe, haber, iva)
+        if a["debe"] != "":
+            self._sumar("por_cuenta", (a["debe"], moneda), debe, 0, iva)
+            categoria = self._categorias_iva.get(a["debe"])
+            if categoria is not None:
+                self._sumar("iva", (categoria, moneda), debe, 0, iva)
+        if a["haber"] != "":
+            self._sumar("por_cuenta", (a["haber"], moneda), 0, haber, 0)
+        self.asientos += 1
+
+    def contabilizar(self, asientos):
+        """Deja pasar los asientos contabilizándolos al vuelo (para usar en el pipeline)."""
+        for a in asientos:
+            self.agregar(a)
+            yield a
+
+    def periodos(self):
+        """Períodos AAAA-MM de los asientos contabilizados, ordenados."""
+        return sorted({clave[:7] for clave, _ in self._grupos["por_dia"] if len(clave) == 10})
+
+    def resumen(self):
+        """Dict serializable: {asientos, <dimensión>: [{clave, moneda, debe, haber, iva, asientos}]}."""
+        resultado = {"asientos": self.asientos}
+        for dimension in DIMENSIONES:
+            resultado[dimension] = [
+                {
+                    "clave": clave,
+                    "moneda": _NOMBRE_MONEDA.get(moneda, moneda),
+                    "debe": _pesos(debe),
+                    "haber": _pesos(haber),
+                    "iva": _pesos(iva),
+                    "asientos": cantidad,
+                }
+                for (clave, moneda), (debe, haber, iva, cantidad) in sorted(
+                    self._grupos[dimension].items(), key=lambda kv: (str(kv[0][0]), kv[0][1]),
+                )
+            ]
+        return resultado
+
+    def escribir(self, base_salida):
+        """Escribe <base>_estadisticas.json y <base>_estadisticas.csv. Retorna ambas rutas."""
+        resumen = self.resumen()
+        ruta_json = f"{base_salida}_estadisticas.json"
+        ruta_csv = f"{base_salida}_estadisticas.csv"
+
+        with open(ruta_json, "w", encoding="utf-8") as f:
+            json.dump(resumen, f, ensure_ascii=False, indent=2)
+
+        lineas = [CSV_HEADER]
+        for dimension in DIMENSIONES:
+            for g in resumen[dimension]:
+                lineas.append(
+                    f"{dimension},{g['clave']},{g['moneda']},{g['debe']:.2f},{g['haber']:.2f},{g['iva']:.2f},{g['asientos']}"
+                )
+        with open(ruta_csv, "w", encoding="utf-8", newline="") as f:
+            f.write("\n".join(lineas))
+
+        logger.info(f"Estadísticas: {ruta_json} y {ruta_csv}")
+        return ruta_json, ruta_csv
@@ -3,7 +3,9 @@
 import os
 import sys
 import threading
+import time
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import logging
 import ctypes
@@ -18,9 +20,21 @@ def resource_path(relative_path):
         return os.path.join(sys._MEIPASS, relative_path)
     return os.path.join(os.path.dirname(os.path.abspath(__file__)), relative_path)
 
-from reader import leer_excel
-from rules import generar_asientos
-from writer import escribir_txt
+from conversor import convertir_archivo, formatear_vista_previa, previsualizar
+from perfiles import listar_perfiles
+from precarga import iniciar_precarga, marcar
+
+# Cantidad máxima de conversiones simultáneas en la cola
+MAX_TRABAJOS_CONCURRENTES = min(4, os.cpu_count() or 1)
+
+# CFEs que se muestran en la vista previa
+VISTA_PREVIA_FILAS = 20
+
+# Estados posibles de un trabajo de la cola
+ESTADO_PENDIENTE = "En cola"
+ESTADO_PROCESANDO = "Procesando"
+ESTADO_OK = "Completado"
+ESTADO_ERROR = "Error"
 
 
 class TextHandler(logging.Handler):
@@ -51,14 +65,23 @@ class CFEConverterApp:
     def __init__(self, root):
         self.root = root
         self.root.title("CFE Converter - Conversor CFE a Memory")
-        self.root.geometry("780x680")
-        self.root.minsize(650, 550)
+        self.root.geometry("780x860")
+        self.root.minsize(650, 650)
         self.root.configure(bg="#f0f0f0")
 
         self._load_logo()
-        self._processing = False
+        # Cola de trabajos: id -> dict {ruta_input, ruta_txt, estado, segundos, asientos, ...}
+        self._trabajos = {}
+        self._siguiente_id = 1
+        self._activos = 0
+        # Al cerrar, los hilos dejan de programar callbacks en la ventana
+        self._cerrando = False
+        self._executor = ThreadPoolExecutor(
+            max_workers=MAX_TRABAJOS_CONCURRENTES, thread_name_prefix="cfe",
+        )
         self._build_ui()
         self._setup_logging()
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
 
     def _load_logo(self):
         """Carga el logo .ico para la barra de título y barra de tareas de Windows."""
@@ -88,7 +111,7 @@ class CFEConverterApp:
         ttk.Separator(main, orient="horizontal").pack(fill=tk.X, pady=(5, 12))
 
         # --- Archivo de entrada ---
-        frame_input = ttk.LabelFrame(main, text="Archivo CFE de entrada (.xls / .xlsx)", padding=8)
+        frame_input = ttk.LabelFrame(main, text="Archivo(s) CFE de entrada (.xls / .xlsx)", padding=8)
         frame_input.pack(fill=tk.X, pady=(0, 8))
 
         row_input = ttk.Frame(frame_input)
@@ -98,6 +121,9 @@ class CFEConverterApp:
         entry_input = ttk.Entry(row_input, textvariable=self.var_input, font=("Segoe UI", 10))
         entry_input.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0, 6))
 
+        btn_varios = ttk.Button(row_input, text="Agregar varios...", command=self._browse_varios)
+        btn_varios.pack(side=tk.RIGHT, padx=(6, 0))
+
         btn_input = ttk.Button(row_input, text="Examinar...", command=self._browse_input)
         btn_input.pack(side=tk.RIGHT)
 
@@ -124,22 +150,72 @@ class CFEConverterApp:
         entry_name = ttk.Entry(frame_name, textvariable=self.var_nombre, width=30, font=("Segoe UI", 10))
         entry_name.pack(side=tk.LEFT, padx=(6, 0))
 
-        # --- Botón convertir ---
+        # --- Perfil de cliente ---
+        frame_perfil = ttk.Frame(main)
+        frame_perfil.pack(fill=tk.X, pady=(0, 10))
+
+        ttk.Label(frame_perfil, text="Perfil de cliente:").pack(side=tk.LEFT)
+        self.var_perfil = tk.StringVar()
+        self.combo_perfil = ttk.Combobox(
+            frame_perfil, textvariable=self.var_perfil, values=[""] + listar_perfiles(),
+            width=28, state="readonly", font=("Segoe UI", 10),
+        )
+        self.combo_perfil.pack(side=tk.LEFT, padx=(6, 0))
+
+        self.var_consolidar = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            frame_perfil, text="Consolidar asientos", variable=self.var_consolidar,
+        ).pack(side=tk.LEFT, padx=(12, 0))
+
+        self.var_particionar = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            frame_perfil, text="Separar por mes y libro", variable=self.var_particionar,
+        ).pack(side=tk.LEFT, padx=(12, 0))
+
+        # --- Botones convertir / vista previa ---
+        row_botones = ttk.Frame(main)
+        row_botones.pack(pady=(0, 10))
         self.btn_convert = ttk.Button(
-            main, text="Convertir", style="Accent.TButton", command=self._start_conversion
+            row_botones, text="Convertir", style="Accent.TButton", command=self._start_conversion
         )
-        self.btn_convert.pack(pady=(0, 10))
+        self.btn_convert.pack(side=tk.LEFT)
+        ttk.Button(
+            row_botones, text="Vista previa", command=self._vista_previa
+        ).pack(side=tk.LEFT, padx=(8, 0))
 
         # --- Barra de progreso ---
         self.progress = ttk.Progressbar(main, mode="indeterminate", length=300)
         self.progress.pack(fill=tk.X, pady=(0, 8))
 
+        # --- Cola de trabajos ---
+        frame_cola = ttk.LabelFrame(main, text="Cola de conversiones", padding=5)
+        frame_cola.pack(fill=tk.BOTH, expand=True, pady=(0, 8))
+
+        columnas = ("archivo", "estado", "tiempo", "cfes", "asientos")
+        self.tree_cola = ttk.Treeview(frame_cola, columns=columnas, show="headings", height=6)
+        self.tree_cola.heading("archivo", text="Archivo")
+        self.tree_cola.heading("estado", text="Estado")
+        self.tree_cola.heading("tiempo", text="Tiempo (s)")
+        self.tree_cola.heading("cfes", text="CFEs")
+        self.tree_cola.heading("asientos", text="Asientos")
+        self.tree_cola.column("archivo", width=300, anchor="w")
+        self.tree_cola.column("estado", width=100, anchor="w")
+        self.tree_cola.column("tiempo", width=80, anchor="e")
+        self.tree_cola.column("cfes", width=60, anchor="e")
+        self.tree_cola.column("asientos", width=70, anchor="e")
+        self.tree_cola.pack(fill=tk.BOTH, expand=True)
+
+        row_cola = ttk.Frame(frame_cola)
+        row_cola.pack(fill=tk.X, pady=(5, 0))
+        ttk.Button(row_cola, text="Reintentar seleccionados", command=self._reintentar).pack(side=tk.LEFT)
+        ttk.Button(row_cola, text="Quitar terminados", command=self._quitar_terminados).pack(side=tk.LEFT, padx=(6, 0))
+
         # --- Log de salida ---
         frame_log = ttk.LabelFrame(main, text="Registro de actividad", padding=5)
         frame_log.pack(fill=tk.BOTH, expand=True)
 
         self.log_text = scrolledtext.ScrolledText(
-            frame_log, height=12, state="disabled",
+            frame_log, height=8, state="disabled",
             font=("Consolas", 9), wrap=tk.WORD, bg="#1e1e1e", fg="#d4d4d4",
             insertbackground="white",
         )
@@ -169,7 +245,7 @@ class CFEConverterApp:
         path = filedialog.askopenfilename(
             title="Seleccionar archivo CFE",
             filetypes=[
-                ("Archivos Excel", "*.xls *.xlsx"),
+                ("Archivos CFE", "*.xls *.xlsx *.csv *.tsv"),
                 ("Todos los archivos", "*.*"),
             ],
         )
@@ -188,15 +264,25 @@ class CFEConverterApp:
         if path:
             self.var_output.set(path)
 
-    def _clear_log(self):
-        self.log_text.configure(state="normal")
-        self.log_text.delete("1.0", tk.END)
-        self.log_text.configure(state="disabled")
-
-    def _start_conversion(self):
-        if self._processing:
+    def _browse_varios(self):
+        paths = filedialog.askopenfilenames(
+            title="Seleccionar archivos CFE",
+            filetypes=[
+                ("Archivos CFE", "*.xls *.xlsx *.csv *.tsv"),
+                ("Todos los archivos", "*.*"),
+            ],
+        )
+        if not paths:
             return
+        carpeta_output = self.var_output.get().strip()
+        if not carpeta_output:
+            carpeta_output = os.path.dirname(paths[0])
+            self.var_output.set(carpeta_output)
+        for path in paths:
+            nombre = os.path.splitext(os.path.basename(path))[0]
+            self._encolar(path, os.path.join(carpeta_output, f"{nombre}.txt"))
 
+    def _start_conversion(self):
         ruta_input = self.var_input.get().strip()
         carpeta_output = self.var_output.get().strip()
         nombre = self.var_nombre.get().strip()
@@ -214,85 +300,211 @@ class CFEConverterApp:
             nombre = os.path.splitext(os.path.basename(ruta_input))[0]
             self.var_nombre.set(nombre)
 
-        self._processing = True
-        self.btn_convert.configure(state="disabled")
-        self.progress.start(15)
-        self.var_status.set("Procesando...")
-        self._clear_log()
-
-        thread = threading.Thread(
-            target=self._run_conversion,
-            args=(ruta_input, carpeta_output, nombre),
-            daemon=True,
-        )
-        thread.start()
+        self._encolar(ruta_input, os.path.join(carpeta_output, f"{nombre}.txt"))
+        # Limpiar para que el siguiente archivo tome su propio nombre
+        self.var_input.set("")
+        self.var_nombre.set("")
 
-    def _run_conversion(self, ruta_input, carpeta_output, nombre):
+    def _vista_previa(self):
+        """Muestra encabezado, primeros CFEs con sus asientos y RUTs desconocidos sin convertir."""
+        ruta_input = self.var_input.get().strip()
+        if not ruta_input:
+            messagebox.showwarning("Falta dato", "Seleccione un archivo CFE de entrada.")
+            return
+        if not os.path.isfile(ruta_input):
+            messagebox.showerror("Error", f"El archivo no existe:\n{ruta_input}")
+            return
+        self.var_status.set(f"Vista previa de {os.path.basename(ruta_input)}...")
+        # Hilo propio: la vista previa no espera detrás de las conversiones en cola
+        threading.Thread(
+            target=self._run_vista_previa, args=(ruta_input, self.var_perfil.get() or None),
+            name="vista-previa", daemon=True,
+        ).start()
+
+    def _run_vista_previa(self, ruta_input, perfil):
+        """Se ejecuta en su propio hilo; el resultado se muestra desde el hilo de la UI."""
+        try:
+            texto = formatear_vista_previa(previsualizar(ruta_input, VISTA_PREVIA_FILAS, perfil=perfil))
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Vista previa de {os.path.basename(ruta_input)}: {e}")
+            self._avisar(self.var_status.set, "Vista previa con error")
+            return
+        self._avisar(self._mostrar_vista_previa, ruta_input, texto)
+
+    def _mostrar_vista_previa(self, ruta_input, texto):
+        ventana = tk.Toplevel(self.root)
+        ventana.title(f"Vista previa - {os.path.basename(ruta_input)}")
+        ventana.geometry("900x500")
+        area = scrolledtext.ScrolledText(ventana, font=("Consolas", 9), wrap=tk.NONE)
+        area.pack(fill=tk.BOTH, expand=True)
+        area.insert(tk.END, texto)
+        area.configure(state="disabled")
+        if not self._activos:
+            self.var_status.set("Listo")
+
+    def _encolar(self, ruta_input, ruta_txt):
+        """Agrega un trabajo a la cola y lo envía al pool de conversión."""
+        trabajo_id = str(self._siguiente_id)
+        self._siguiente_id += 1
+        self._trabajos[trabajo_id] = {
+            "ruta_input": ruta_input,
+            "ruta_txt": ruta_txt,
+            "perfil": self.var_perfil.get() or None,
+            "consolidar": self.var_consolidar.get(),
+            "particionar": self.var_particionar.get(),
+            "estado": ESTADO_PENDIENTE,
+            "segundos": None,
+            "cfes": None,
+            "asientos": None,
+        }
+        self.tree_cola.insert("", tk.END, iid=trabajo_id, values=(os.path.basename(ruta_input), ESTADO_PENDIENTE, "", "", ""))
+        self._lanzar(trabajo_id)
+
+    def _lanzar(self, trabajo_id):
+        trabajo = self._trabajos[trabajo_id]
+        trabajo["estado"] = ESTADO_PENDIENTE
+        self._refrescar_fila(trabajo_id)
+        if self._activos == 0:
+            self.progress.start(15)
+        self._activos += 1
+        self._actualizar_status()
+        self._executor.submit(self._run_conversion, trabajo_id, dict(trabajo))
+
+    def _run_conversion(self, trabajo_id, trabajo):
+        """Se ejecuta en un hilo del pool; nunca toca widgets directamente."""
         logger = logging.getLogger(__name__)
+        ruta_input = trabajo["ruta_input"]
+        ruta_txt = trabajo["ruta_txt"]
+        self._avisar(self._marcar_procesando, trabajo_id)
+        inicio = time.perf_counter()
         try:
-            ruta_txt = os.path.join(carpeta_output, f"{nombre}.txt")
-
-            logger.info(f"Leyendo archivo CFE: {ruta_input}")
-            registros = leer_excel(ruta_input)
-
-            if not registros:
-                logger.error("No se encontraron registros CFE en el archivo.")
-                self.root.after(0, self._conversion_done, False, "")
-                return
-
-            logger.info(f"Se encontraron {len(registros)} comprobantes.")
-
-            todos_asientos = []
-            errores = 0
-            ruts_desconocidos = set()
-
-            for idx, reg in enumerate(registros, start=1):
-                asientos = generar_asientos(reg, fila_num=idx)
-                if asientos:
-                    todos_asientos.extend(asientos)
-                else:
-                    errores += 1
-
-            if not todos_asientos:
-                logger.error("No se generaron asientos. Revise los datos de entrada.")
-                self.root.after(0, self._conversion_done, False, "")
-                return
-
-            escribir_txt(todos_asientos, ruta_txt)
+            resumen = convertir_archivo(
+                ruta_input, ruta_txt, perfil=trabajo["perfil"], consolidar=trabajo["consolidar"],
+                particionar=trabajo["particionar"],
+            )
 
             logger.info("=" * 50)
-            logger.info("RESUMEN")
-            logger.info(f"  CFEs leidos:        {len(registros)}")
-            logger.info(f"  Asientos generados: {len(todos_asientos)}")
-            if errores:
-                logger.info(f"  CFEs con error:     {errores}")
-            logger.info(f"  Archivo de salida:  {ruta_txt}")
+            logger.info(f"RESUMEN {os.path.basename(ruta_input)}")
+            logger.info(f"  CFEs leidos:        {resumen['cfes']}")
+            logger.info(f"  Asientos generados: {resumen['asientos']}")
+            if resumen["errores"]:
+                logger.info(f"  CFEs con error:     {resumen['errores']}")
+            logger.info(f"  Archivo de salida:  {resumen['ruta_txt']}")
             logger.info("=" * 50)
 
-            self.root.after(0, self._conversion_done, True, ruta_txt)
+            self._avisar(self._conversion_done, trabajo_id, resumen)
 
         except Exception as e:
-            logger.error(f"Error inesperado: {e}")
-            self.root.after(0, self._conversion_done, False, "")
-
-    def _conversion_done(self, success, ruta_txt):
-        self.progress.stop()
-        self._processing = False
-        self.btn_convert.configure(state="normal")
+            logger.error(f"Error en {os.path.basename(ruta_input)}: {e}")
+            resumen = {"segundos": time.perf_counter() - inicio, "error": str(e)}
+            self._avisar(self._conversion_done, trabajo_id, resumen)
 
-        if success:
-            self.var_status.set(f"Completado: {ruta_txt}")
+    def _avisar(self, funcion, *args):
+        """Programa `funcion` en el hilo de la UI desde un hilo de trabajo, salvo que la ventana se esté cerrando."""
+        if self._cerrando:
+            return
+        try:
+            self.root.after(0, funcion, *args)
+        except RuntimeError:
+            # La ventana se cerró entre la comprobación y la llamada
+            if not self._cerrando:
+                raise
+
+    def _marcar_procesando(self, trabajo_id):
+        trabajo = self._trabajos.get(trabajo_id)
+        if trabajo is not None:
+            trabajo["estado"] = ESTADO_PROCESANDO
+            self._refrescar_fila(trabajo_id)
+
+    def _conversion_done(self, trabajo_id, resumen):
+        self._activos -= 1
+        trabajo = self._trabajos.get(trabajo_id)
+        if trabajo is not None:
+            trabajo["segundos"] = resumen["segundos"]
+            if "error" in resumen:
+                trabajo["estado"] = ESTADO_ERROR
+                trabajo["cfes"] = None
+                trabajo["asientos"] = None
+            else:
+                trabajo["estado"] = ESTADO_OK
+                trabajo["cfes"] = resumen["cfes"]
+                trabajo["asientos"] = resumen["asientos"]
+                marcar("primera_conversion", resumen["segundos"])
+            self._refrescar_fila(trabajo_id)
+
+        self._actualizar_status()
+        if self._activos == 0:
+            self.progress.stop()
+            self._cola_terminada()
+
+    def _cola_terminada(self):
+        ok = sum(1 for t in self._trabajos.values() if t["estado"] == ESTADO_OK)
+        fallidos = sum(1 for t in self._trabajos.values() if t["estado"] == ESTADO_ERROR)
+        if fallidos:
+            self.var_status.set(f"Cola terminada: {ok} completados, {fallidos} con error")
+        else:
+            self.var_status.set(f"Cola terminada: {ok} completados")
             messagebox.showinfo(
                 "Conversion exitosa",
-                f"Archivo generado correctamente:\n{ruta_txt}",
+                f"Se generaron {ok} archivo(s) correctamente.",
             )
-        else:
-            self.var_status.set("Error en la conversion")
+
+    def _refrescar_fila(self, trabajo_id):
+        trabajo = self._trabajos[trabajo_id]
+        if not self.tree_cola.exists(trabajo_id):
+            return
+        self.tree_cola.item(trabajo_id, values=(
+            os.path.basename(trabajo["ruta_input"]),
+            trabajo["estado"],
+            f"{trabajo['segundos']:.2f}" if trabajo["segundos"] is not None else "",
+            trabajo["cfes"] if trabajo["cfes"] is not None else "",
+            trabajo["asientos"] if trabajo["asientos"] is not None else "",
+        ))
+
+    def _actualizar_status(self):
+        if self._activos:
+            self.var_status.set(f"Procesando {self._activos} trabajo(s)...")
+
+    def _reintentar(self):
+        """Vuelve a encolar los trabajos seleccionados que terminaron con error."""
+        for trabajo_id in self.tree_cola.selection():
+            trabajo = self._trabajos.get(trabajo_id)
+            if trabajo is not None and trabajo["estado"] == ESTADO_ERROR:
+                trabajo["segundos"] = None
+                self._lanzar(trabajo_id)
+
+    def _quitar_terminados(self):
+        for trabajo_id, trabajo in list(self._trabajos.items()):
+            if trabajo["estado"] in (ESTADO_OK, ESTADO_ERROR):
+                del self._trabajos[trabajo_id]
+                self.tree_cola.delete(trabajo_id)
+
+    def _on_close(self):
+        """
+        Con conversiones en curso pide confirmación y espera a que terminen las
+        que ya empezaron (las pendientes se cancelan): así no quedan TXT a medio
+        escribir ni callbacks sobre una ventana destruida.
+        """
+        if self._activos:
+            if not messagebox.askokcancel(
+                "Conversion en curso",
+                f"Hay {self._activos} trabajo(s) sin terminar. Los pendientes se cancelan y se espera "
+                "a que terminen los que ya empezaron.\n\n¿Cerrar de todos modos?",
+            ):
+                return
+            self.var_status.set("Cerrando: esperando las conversiones en curso...")
+            self.root.update_idletasks()
+        self._cerrando = True
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.root.destroy()
 
 
 def main():
     root = tk.Tk()
     app = CFEConverterApp(root)
+    # Con la ventana ya dibujada, precargar los backends mientras el usuario elige archivos
+    root.after_idle(marcar, "ventana_lista")
+    root.after_idle(iniciar_precarga)
     root.mainloop()
 
 
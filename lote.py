@@ -0,0 +1,269 @@
+# lote.py — Conversión de carpetas completas con manifiesto y journal reanudables
+#
+# En la carpeta de salida se mantienen dos archivos:
+#   lote_manifest.json  estado de cada entrada: huella, estado, TXT y su SHA-256
+#                       (y si quedó archivada, con --archivar).
+#                       Se reescribe de forma atómica (tmp + os.replace).
+#   lote_journal.jsonl  una línea por entrada terminada desde el último
+#                       manifiesto, con fsync. Al reanudar se aplica sobre el
+#                       manifiesto; al guardar el manifiesto se descarta.
+# Así un corte a mitad de corrida pierde como mucho la entrada en curso.
+
+import hashlib
+import json
+import logging
+import os
+
+from conversor import convertir_archivo
+
+logger = logging.getLogger(__name__)
+
+MANIFIESTO = "lote_manifest.json"
+JOURNAL = "lote_journal.jsonl"
+EXTENSIONES = (".xls", ".xlsx", ".csv", ".tsv", ".cfecol")
+
+# Reportes .csv que escribe la propia conversión junto al TXT: si la carpeta de
+# salida es la de entrada no deben tomarse como archivos CFE
+SUFIJOS_REPORTES = (
+    "_validacion.csv", "_ruts_desconocidos.csv", "_detalle_consolidado.csv",
+    "_estadisticas.csv", "_conciliacion.csv",
+)
+
+PENDIENTE = "pendiente"
+OK = "ok"
+ERROR = "error"
+
+# Cada cuántas entradas terminadas se compacta el journal en el manifiesto
+GUARDAR_CADA = 50
+
+
+def sha256_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def huella(ruta):
+    """Tamaño, mtime y SHA-256 del archivo de entrada."""
+    st = os.stat(ruta)
+    return {"tamano": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256_archivo(ruta)}
+
+
+def _huella_vigente(registrada, ruta):
+    """
+    True si `ruta` sigue siendo el archivo de `registrada`. Con tamaño y mtime
+    iguales no se relee; si solo cambió el mtime (copia, touch) decide el SHA-256.
+    """
+    try:
+        st = os.stat(ruta)
+    except OSError:
+        return False
+    if st.st_size != registrada["tamano"]:
+        return False
+    if st.st_mtime_ns == registrada["mtime_ns"]:
+        return True
+    return sha256_archivo(ruta) == registrada["sha256"]
+
+
+def listar_entradas(carpeta):
+    """Archivos CFE de la carpeta (no recursivo), ordenados por nombre, sin los reportes de la conversión."""
+    return sorted(
+        os.path.join(carpeta, f) for f in os.listdir(carpeta)
+        if f.lower().endswith(EXTENSIONES) and not f.lower().endswith(SUFIJOS_REPORTES)
+        and os.path.isfile(os.path.join(carpeta, f))
+    )
+
+
+def nombres_salida(rutas):
+    """
+    {ruta: nombre del TXT sin extensión}. Normalmente el nombre del archivo; si
+    dos entradas comparten nombre (a.xlsx y a.csv) se agrega la extensión
+    (a_xlsx, a_csv). Sin comparar mayúsculas, como en Windows. Las que aun así
+    chocan quedan con None.
+    """
+    def clave(nombre):
+        return nombre.casefold()
+
+    tallos = {}
+    for ruta in rutas:
+        tallo = os.path.splitext(os.path.basename(ruta))[0]
+        tallos[clave(tallo)] = tallos.get(clave(tallo), 0) + 1
+
+    nombres = {}
+    usados = set()
+    for ruta in rutas:
+        tallo, ext = os.path.splitext(os.path.basename(ruta))
+        nombre = tallo if tallos[clave(tallo)] == 1 else f"{tallo}_{ext[1:]}"
+        if clave(nombre) in usados:
+            nombre = None
+        else:
+            usados.add(clave(nombre))
+        nombres[ruta] = nombre
+    return nombres
+
+
+class Lote:
+    """Estado persistente de una corrida por lotes: {ruta_input: entrada}."""
+
+    def __init__(self, carpeta_salida, reanudar=False):
+        os.makedirs(carpeta_salida, exist_ok=True)
+        self.ruta_manifiesto = os.path.join(carpeta_salida, MANIFIESTO)
+        self.ruta_journal = os.path.join(carpeta_salida, JOURNAL)
+        self.entradas = {}
+        self._sin_guardar = 0
+        if reanudar:
+            self._cargar()
+        elif os.path.exists(self.ruta_journal):
+            os.remove(self.ruta_journal)
+
+    def _cargar(self):
+        if os.path.exists(self.ruta_manifiesto):
+            with open(self.ruta_manifiesto, "r", encoding="utf-8") as f:
+                self.entradas = json.load(f)["entradas"]
+        if not os.path.exists(self.ruta_journal):
+            return
+        aplicadas = 0
+        with open(self.ruta_journal, "r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    entrada = json.loads(linea)
+                except json.JSONDecodeError:
+                    # Última línea a medio escribir por el corte
+                    logger.warning("Journal de lote con una línea incompleta; se descarta.")
+                    break
+                self.entradas[entrada.pop("input")] = entrada
+                aplicadas += 1
+        logger.info(f"Lote: {aplicadas} entradas recuperadas del journal.")
+
+    def agregar_pendientes(self, rutas):
+        for ruta in rutas:
+            self.entradas.setdefault(ruta, {"estado": PENDIENTE})
+
+    def completa(self, ruta):
+        """True si la entrada terminó bien, su huella no cambió y el TXT sigue intacto."""
+        entrada = self.entradas.get(ruta)
+        if entrada is None or entrada["estado"] != OK:
+            return False
+        if not _huella_vigente(entrada["huella"], ruta):
+            logger.info(f"Lote: {os.path.basename(ruta)} cambió desde la última corrida.")
+            return False
+        try:
+            return sha256_archivo(entrada["ruta_txt"]) == entrada["sha256_txt"]
+        except OSError:
+            return False
+
+    def registrar(self, ruta, entrada):
+        """Anota la entrada terminada en memoria y en el journal (con fsync)."""
+        self.entradas[ruta] = entrada
+        with open(self.ruta_journal, "a", encoding="utf-8") as f:
+            f.write(json.dumps(dict(entrada, input=ruta), ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._sin_guardar += 1
+        if self._sin_guardar >= GUARDAR_CADA:
+            self.guardar()
+
+    def guardar(self):
+        """Reescribe el manifiesto de forma atómica y descarta el journal ya aplicado."""
+        tmp = f"{self.ruta_manifiesto}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"entradas": self.entradas}, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.ruta_manifiesto)
+        if os.path.exists(self.ruta_journal):
+            os.remove(self.ruta_journal)
+        self._sin_guardar = 0
+
+
+def _archivar(lote, ruta, nombre, almacen, cliente, resumen):
+    """Archiva una entrada OK ya registrada y anota el resultado en el lote."""
+    from almacen import periodo_de, salidas_de
+
+    entrada = lote.entradas[ruta]
+    try:
+        almacen.archivar_conversion(ruta, salidas_de(entrada), cliente, periodo_de(entrada["periodos"]))
+    except Exception as e:
+        # La conversión sigue siendo válida: queda pendiente de archivar para --reanudar
+        logger.error(f"Lote: {nombre} convertido pero no se pudo archivar: {e}")
+        resumen["errores"] += 1
+        return
+    lote.registrar(ruta, dict(entrada, archivado=True))
+
+
+def convertir_lote(rutas_input, carpeta_salida, reanudar=False, almacen=None, cliente=None, **opciones):
+    """
+    Convierte cada archivo de `rutas_input` a <carpeta_salida>/<nombre>.txt
+    (ver nombres_salida) registrando el avance en el manifiesto del lote. Con `reanudar`, omite las
+    entradas ya convertidas cuyo archivo no cambió. `opciones` se pasan a
+    convertir_archivo (perfil, registro_rut, consolidar, particionar,
+    max_memoria). Con `almacen` (almacen.Almacen), cada conversión se archiva
+    bajo `cliente`.
+    Retorna {convertidos, omitidos, errores, ruta_manifiesto}.
+
+    Con `almacen` la entrada registra además "archivado". Una conversión que
+    no se pudo archivar queda OK (no se reconvierte) pero cuenta en `errores`,
+    y al reanudar solo se reintenta archivarla.
+    """
+    rutas_input = [os.path.abspath(r) for r in rutas_input]
+    lote = Lote(carpeta_salida, reanudar)
+    lote.agregar_pendientes(rutas_input)
+    lote.guardar()
+
+    resumen = {"convertidos": 0, "omitidos": 0, "errores": 0, "ruta_manifiesto": lote.ruta_manifiesto}
+    nombres = nombres_salida(rutas_input)
+    try:
+        for ruta in rutas_input:
+            nombre = nombres[ruta]
+            if nombre is None:
+                logger.error(f"Lote: {os.path.basename(ruta)}: su TXT chocaría con el de otra entrada, se omite.")
+                lote.registrar(ruta, {"estado": ERROR, "error": "nombre de salida repetido"})
+                resumen["errores"] += 1
+                continue
+            if reanudar and lote.completa(ruta):
+                if almacen is not None and not lote.entradas[ruta].get("archivado", False):
+                    # Convertida en una corrida anterior pero sin archivar: solo se archiva
+                    if "periodos" in lote.entradas[ruta]:
+                        logger.info(f"Lote: {nombre} ya convertido, se reintenta archivarlo.")
+                        resumen["omitidos"] += 1
+                        _archivar(lote, ruta, nombre, almacen, cliente, resumen)
+                        continue
+                else:
+                    logger.info(f"Lote: {nombre} ya convertido, se omite.")
+                    resumen["omitidos"] += 1
+                    continue
+
+            try:
+                huella_input = huella(ruta)
+                r = convertir_archivo(ruta, os.path.join(carpeta_salida, f"{nombre}.txt"), **opciones)
+                entrada = {
+                    "estado": OK,
+                    "huella": huella_input,
+                    "ruta_txt": r["ruta_txt"],
+                    "sha256_txt": sha256_archivo(r["ruta_txt"]),
+                    "cfes": r["cfes"],
+                    "asientos": r["asientos"],
+                    "periodos": r["periodos"],
+                }
+                if almacen is not None:
+                    entrada["archivado"] = False
+                resumen["convertidos"] += 1
+            except Exception as e:
+                # Un archivo dañado no corta el lote: queda con error para la próxima corrida
+                logger.error(f"Lote: {nombre}: {e}")
+                entrada = {"estado": ERROR, "error": str(e)}
+                resumen["errores"] += 1
+            lote.registrar(ruta, entrada)
+
+            if almacen is not None and entrada["estado"] == OK:
+                _archivar(lote, ruta, nombre, almacen, cliente, resumen)
+    finally:
+        lote.guardar()
+
+    logger.info(
+        f"Lote: {resumen['convertidos']} convertidos, {resumen['omitidos']} omitidos, "
+        f"{resumen['errores']} con error. Manifiesto: {lote.ruta_manifiesto}"
+    )
+    return resumen
@@ -1,35 +1,27 @@
 # main.py — Entry point del conversor CFE → TXT Memory
+#
+# Solo se importan módulos livianos a nivel de módulo: argparse resuelve
+# --help y los errores de argumentos sin cargar reader, reglas ni logging.
 
 import argparse
-import logging
 import os
-import shutil
 import sys
 
-from reader import leer_excel
-from rules import generar_asientos
-from writer import escribir_txt
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(levelname)s: %(message)s",
-)
-logger = logging.getLogger(__name__)
-
-
-def main():
+def _crear_parser():
     parser = argparse.ArgumentParser(
         description="Convierte archivos CFE (Excel) a TXT formato Memory.",
     )
     parser.add_argument(
         "--input", "-i",
         required=True,
-        help="Ruta al archivo CFE de entrada (.xls o .xlsx)",
+        help="Ruta al archivo CFE de entrada (.xls, .xlsx, .csv/.tsv del portal DGI o .cfecol de columnar.py), una carpeta para convertir todos sus archivos, o '-' para leerlo de stdin",
     )
     parser.add_argument(
         "--output", "-o",
-        required=True,
-        help="Carpeta de destino para el archivo TXT generado",
+        required=False,
+        default=None,
+        help="Carpeta de destino para el archivo TXT generado, o '-' para escribirlo en stdout. Obligatorio salvo con --vista-previa.",
     )
     parser.add_argument(
         "--nombre", "-n",
@@ -37,52 +29,336 @@ def main():
         default=None,
         help="Nombre del archivo de salida (sin extensión). Si no se indica, usa el nombre del archivo de entrada.",
     )
+    parser.add_argument(
+        "--proveedores", "-p",
+        required=False,
+        default=None,
+        help="Tabla de proveedores externa (.csv o .db) con columnas rut, nombre, debe. Por defecto usa config.py.",
+    )
+    parser.add_argument(
+        "--perfil",
+        required=False,
+        default=None,
+        help="Perfil de cliente (perfiles/<perfil>.json) con su tabla de proveedores, cuentas y aliases.",
+    )
+    parser.add_argument(
+        "--registro-rut",
+        required=False,
+        default=None,
+        help="Registro nacional de RUT compilado (ver registro_rut.py) para resolver RUTs desconocidos.",
+    )
+    parser.add_argument(
+        "--consolidar",
+        action="store_true",
+        help="Agrupa asientos por día, cuenta, RUC, moneda y libro (una línea por grupo) y escribe un detalle para rastrear cada grupo.",
+    )
+    parser.add_argument(
+        "--particionar",
+        action="store_true",
+        help="Escribe un TXT por mes y libro (<nombre>_<AAAA-MM>_<C|E>.txt) y un manifiesto con conteos y checksums.",
+    )
+    parser.add_argument(
+        "--cotizaciones",
+        required=False,
+        default=None,
+        help="Historial diario de cotizaciones del dólar (CSV fecha, cotizacion) para completar la cotización de CFEs en USD.",
+    )
+    parser.add_argument(
+        "--reanudar", "--resume",
+        action="store_true",
+        help="Con una carpeta de entrada, retoma el lote según lote_manifest.json y solo convierte los archivos pendientes, con error o modificados.",
+    )
+    parser.add_argument(
+        "--vista-previa", "--preview",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Muestra el encabezado detectado, los primeros N CFEs con sus asientos y los RUTs desconocidos, sin escribir archivos.",
+    )
+    parser.add_argument(
+        "--max-memoria", "--max-memory",
+        type=int,
+        default=None,
+        metavar="MB",
+        help="Procesa por ventanas acotadas (consolidación con tandas en disco) y reporta el pico de memoria del proceso.",
+    )
+    parser.add_argument(
+        "--trazar-memoria",
+        action="store_true",
+        help="Con --max-memoria, mide también el pico de asignaciones de Python con tracemalloc (bastante más lento).",
+    )
+    parser.add_argument(
+        "--archivar", "--archive",
+        default=None,
+        metavar="CARPETA",
+        help="Guarda la entrada y los TXT generados en el archivo de auditoría de CARPETA (comprimidos, sin duplicados). Ver almacen.py.",
+    )
+    parser.add_argument(
+        "--cliente",
+        default=None,
+        help="Cliente bajo el que se archiva con --archivar. Por defecto, el nombre del perfil.",
+    )
+    return parser
+
+
+def _configurar_logging():
+    import logging
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(levelname)s: %(message)s",
+    )
+    return logging.getLogger(__name__)
+
+
+# Valor de --input / --output que indica stdin / stdout
+STREAM = "-"
+
+
+def _volcar_stdin():
+    """
+    Copia stdin a un SpooledTemporaryFile: en memoria hasta STDIN_SPOOL_MAX y en
+    disco por encima. Los lectores de Excel necesitan poder hacer seek.
+    """
+    import shutil
+    import tempfile
+
+    from config import STDIN_SPOOL_MAX
+
+    spool = tempfile.SpooledTemporaryFile(max_size=STDIN_SPOOL_MAX)
+    shutil.copyfileobj(sys.stdin.buffer, spool, 1024 * 1024)
+    spool.seek(0)
+    return spool
+
+
+def main():
+    parser = _crear_parser()
     args = parser.parse_args()
+    if args.vista_previa is None and args.output is None:
+        parser.error("se requiere --output/-o (salvo con --vista-previa)")
+    if args.vista_previa is not None and args.vista_previa < 1:
+        parser.error("--vista-previa necesita N >= 1")
+    if args.max_memoria is not None and args.max_memoria < 1:
+        parser.error("--max-memoria necesita MB >= 1")
+    # Los logs van siempre a stderr, así stdout queda libre para el TXT
+    logger = _configurar_logging()
 
-    ruta_input = os.path.abspath(args.input)
-    carpeta_output = os.path.abspath(args.output)
+    if args.vista_previa is not None:
+        _vista_previa(args, logger)
+        return
 
-    if not os.path.isfile(ruta_input):
-        logger.error(f"Archivo de entrada no encontrado: {ruta_input}")
+    lote = args.input != STREAM and os.path.isdir(args.input)
+    if args.reanudar and not lote:
+        logger.error("--reanudar solo se usa con una carpeta de entrada.")
+        sys.exit(1)
+    if args.archivar and args.output == STREAM:
+        logger.error("--archivar necesita una carpeta de salida; no se puede usar con salida a stdout.")
+        sys.exit(1)
+    if lote and (args.output == STREAM or args.nombre):
+        logger.error("Con una carpeta de entrada la salida debe ser una carpeta y no se admite --nombre.")
         sys.exit(1)
 
-    nombre_salida = args.nombre if args.nombre else os.path.splitext(os.path.basename(ruta_input))[0]
-    ruta_txt = os.path.join(carpeta_output, f"{nombre_salida}.txt")
+    if args.input == STREAM:
+        ruta_input = None
+        nombre_base = "stdin"
+    elif lote:
+        ruta_input = os.path.abspath(args.input)
+        nombre_base = None
+    else:
+        ruta_input = os.path.abspath(args.input)
+        if not os.path.isfile(ruta_input):
+            logger.error(f"Archivo de entrada no encontrado: {ruta_input}")
+            sys.exit(1)
+        nombre_base = os.path.splitext(os.path.basename(ruta_input))[0]
 
-    logger.info(f"Leyendo archivo CFE: {ruta_input}")
-    registros = leer_excel(ruta_input)
+    if args.output == STREAM:
+        ruta_txt = None
+    elif lote:
+        ruta_txt = os.path.abspath(args.output)
+    else:
+        nombre_salida = args.nombre if args.nombre else nombre_base
+        ruta_txt = os.path.join(os.path.abspath(args.output), f"{nombre_salida}.txt")
 
-    if not registros:
-        logger.error("No se encontraron registros CFE en el archivo. Proceso terminado.")
-        sys.exit(1)
+    if args.proveedores:
+        import proveedores
+
+        ruta_proveedores = os.path.abspath(args.proveedores)
+        if not os.path.isfile(ruta_proveedores):
+            logger.error(f"Tabla de proveedores no encontrada: {ruta_proveedores}")
+            sys.exit(1)
+        proveedores.configurar(ruta_proveedores)
+
+    if args.cotizaciones:
+        import cotizaciones
 
-    logger.info(f"Se encontraron {len(registros)} comprobantes en el archivo.")
+        ruta_cotizaciones = os.path.abspath(args.cotizaciones)
+        if not os.path.isfile(ruta_cotizaciones):
+            logger.error(f"Historial de cotizaciones no encontrado: {ruta_cotizaciones}")
+            sys.exit(1)
+        cotizaciones.configurar(ruta_cotizaciones)
 
-    todos_asientos = []
-    errores = 0
-    warnings = 0
+    max_memoria = None
+    if args.max_memoria is not None:
+        if args.trazar_memoria:
+            import memoria
 
-    for idx, registro in enumerate(registros, start=1):
-        asientos = generar_asientos(registro, fila_num=idx)
-        if asientos:
-            todos_asientos.extend(asientos)
+            memoria.iniciar()
+        max_memoria = args.max_memoria * 1024 * 1024
+
+    cliente = args.cliente or args.perfil or "general"
+    # El índice del almacén se cierra al terminar, también si se sale con error
+    with _abrir_almacen(args.archivar) as almacen:
+        if lote:
+            _convertir_lote(args, ruta_input, ruta_txt, logger, max_memoria, almacen, cliente)
         else:
-            errores += 1
+            _convertir_uno(args, ruta_input, ruta_txt, logger, max_memoria, almacen, cliente)
+
+
+def _abrir_almacen(carpeta):
+    """Almacén de --archivar, para usar con with; sin carpeta, un contexto vacío."""
+    if not carpeta:
+        from contextlib import nullcontext
+
+        return nullcontext()
+    from almacen import Almacen
+
+    return Almacen(carpeta)
 
-    if not todos_asientos:
-        logger.error("No se generaron asientos. Revise los datos de entrada.")
-        sys.exit(1)
 
-    escribir_txt(todos_asientos, ruta_txt)
+def _archivar(almacen, entrada, resumen, cliente, logger):
+    """Archiva una conversión ya terminada. Retorna el período, o None si falló (solo se informa)."""
+    from almacen import periodo_de, salidas_de
+
+    periodo = periodo_de(resumen["periodos"])
+    try:
+        almacen.archivar_conversion(entrada, salidas_de(resumen), cliente, periodo)
+    except Exception as e:
+        logger.error(f"La conversión terminó pero no se pudo archivar: {e}")
+        return None
+    return periodo
+
+
+def _convertir_uno(args, ruta_input, ruta_txt, logger, max_memoria, almacen, cliente):
+    # Import diferido: trae reader, rules y writer solo cuando hay algo que convertir
+    from conversor import convertir_archivo
+
+    entrada = _volcar_stdin() if ruta_input is None else ruta_input
+    if ruta_txt is None:
+        import io
+
+        salida = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", newline="")
+    else:
+        salida = ruta_txt
+
+    try:
+        resumen = convertir_archivo(
+            entrada, salida, perfil=args.perfil, registro_rut=args.registro_rut,
+            consolidar=args.consolidar, particionar=args.particionar, max_memoria=max_memoria,
+        )
+        # Antes del finally: una entrada por stdin todavía está abierta
+        periodo = _archivar(almacen, entrada, resumen, cliente, logger) if almacen is not None else None
+    except (OSError, ValueError) as e:
+        logger.error(f"{e} Proceso terminado.")
+        sys.exit(1)
+    finally:
+        if ruta_input is None:
+            entrada.close()
+        if ruta_txt is None:
+            salida.flush()
+            # Soltar el wrapper sin cerrar el stdout real
+            salida.detach()
 
     logger.info("=" * 50)
     logger.info("RESUMEN")
-    logger.info(f"  CFEs leídos:       {len(registros)}")
-    logger.info(f"  Asientos generados: {len(todos_asientos)}")
-    if errores:
-        logger.info(f"  CFEs con error:    {errores}")
-    logger.info(f"  Archivo de salida: {ruta_txt}")
+    logger.info(f"  CFEs leídos:       {resumen['cfes']}")
+    logger.info(f"  Asientos generados: {resumen['asientos']}")
+    if resumen["lineas"] != resumen["asientos"]:
+        logger.info(f"  Líneas consolidadas: {resumen['lineas']}")
+    if resumen["errores"]:
+        logger.info(f"  CFEs con error:    {resumen['errores']}")
+    if resumen["problemas"]:
+        logger.info(f"  Problemas validación: {resumen['problemas']}")
+    if resumen["ruts_desconocidos"]:
+        logger.info(f"  RUTs desconocidos: {resumen['ruts_desconocidos']}")
+    logger.info(f"  Archivo de salida: {resumen['ruta_txt']}")
+    if periodo is not None:
+        logger.info(f"  Archivado en:      {almacen.carpeta} ({cliente}, {periodo})")
+    if max_memoria:
+        _informar_memoria(logger)
     logger.info("=" * 50)
+    if almacen is not None and periodo is None:
+        sys.exit(1)
+
+
+def _informar_memoria(logger):
+    import memoria
+
+    pico = memoria.pico()
+    if pico["tracemalloc"] is not None:
+        logger.info(f"  Pico Python:       {pico['tracemalloc'] / (1024 * 1024):.1f} MB (tracemalloc)")
+    if pico["rss"] is not None:
+        logger.info(f"  Pico del proceso:  {pico['rss'] / (1024 * 1024):.1f} MB (RSS)")
+
+
+def _vista_previa(args, logger):
+    from conversor import formatear_vista_previa, previsualizar
+
+    if args.input != STREAM and not os.path.isfile(args.input):
+        logger.error(f"Archivo de entrada no encontrado: {os.path.abspath(args.input)}")
+        sys.exit(1)
+    if args.proveedores:
+        import proveedores
+
+        proveedores.configurar(os.path.abspath(args.proveedores))
+    if args.cotizaciones:
+        import cotizaciones
+
+        cotizaciones.configurar(os.path.abspath(args.cotizaciones))
+
+    entrada = _volcar_stdin() if args.input == STREAM else os.path.abspath(args.input)
+    try:
+        vista = previsualizar(entrada, args.vista_previa, perfil=args.perfil)
+    except ValueError as e:
+        logger.error(f"{e} Proceso terminado.")
+        sys.exit(1)
+    finally:
+        if args.input == STREAM:
+            entrada.close()
+    print(formatear_vista_previa(vista))
+
+
+def _convertir_lote(args, carpeta_input, carpeta_salida, logger, max_memoria=None, almacen=None, cliente=None):
+    from lote import convertir_lote, listar_entradas
+
+    rutas = listar_entradas(carpeta_input)
+    if not rutas:
+        logger.error(f"No hay archivos .xls, .xlsx, .csv, .tsv ni .cfecol en {carpeta_input}")
+        sys.exit(1)
+
+    try:
+        resumen = convertir_lote(
+            rutas, carpeta_salida, reanudar=args.reanudar, almacen=almacen, cliente=cliente, perfil=args.perfil,
+            registro_rut=args.registro_rut, consolidar=args.consolidar, particionar=args.particionar,
+            max_memoria=max_memoria,
+        )
+    except (OSError, ValueError) as e:
+        logger.error(f"{e} Proceso terminado.")
+        sys.exit(1)
+
+    logger.info("=" * 50)
+    logger.info("RESUMEN DEL LOTE")
+    logger.info(f"  Archivos:          {len(rutas)}")
+    logger.info(f"  Convertidos:       {resumen['convertidos']}")
+    if resumen["omitidos"]:
+        logger.info(f"  Ya convertidos:    {resumen['omitidos']}")
+    if resumen["errores"]:
+        logger.info(f"  Con error:         {resumen['errores']}")
+    logger.info(f"  Manifiesto:        {resumen['ruta_manifiesto']}")
+    if max_memoria:
+        _informar_memoria(logger)
+    logger.info("=" * 50)
+    if resumen["errores"]:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
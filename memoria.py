@@ -0,0 +1,54 @@
+# memoria.py — Pico de memoria de una conversión (tracemalloc y RSS del proceso)
+
+import sys
+import tracemalloc
+
+
+def iniciar():
+    """Empieza a medir las asignaciones de Python (hace todo varias veces más lento)."""
+    tracemalloc.start()
+
+
+def _rss_pico():
+    """Pico de memoria residente del proceso en bytes, o None si no se puede medir."""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class _Contadores(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        contadores = _Contadores()
+        contadores.cb = ctypes.sizeof(contadores)
+        kernel32 = ctypes.windll.kernel32
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        obtener = ctypes.windll.psapi.GetProcessMemoryInfo
+        obtener.argtypes = [wintypes.HANDLE, ctypes.POINTER(_Contadores), wintypes.DWORD]
+        if not obtener(kernel32.GetCurrentProcess(), ctypes.byref(contadores), contadores.cb):
+            return None
+        return contadores.PeakWorkingSetSize
+
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KB; macOS, bytes
+    return pico if sys.platform == "darwin" else pico * 1024
+
+
+def pico():
+    """{tracemalloc, rss}: picos en bytes (None si no se midieron)."""
+    python = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else None
+    return {"tracemalloc": python, "rss": _rss_pico()}
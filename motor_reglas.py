@@ -0,0 +1,135 @@
+# motor_reglas.py — Compilación de REGLAS_ASIENTOS a una tabla de despacho
+
+from config import REGLAS_ASIENTOS
+
+# Cuentas que se resuelven por fila en lugar de ser fijas
+PROVEEDOR = "proveedor"
+IVA = "iva"
+
+# Monedas soportadas (código Memory); las cuentas [UYU, USD] se indexan por código
+MONEDAS = (0, 1)
+
+_CONDICIONES = {"cero", "no_cero", "positivo"}
+_CLAVES_PLANTILLA = {"debe", "haber", "total", "iva", "libro", "si"}
+_CAMPOS_MONTO = {"monto_neto", "iva_ventas", "monto_total", "monto_ret_per", "monto_cred_fiscal"}
+
+
+class ReglaCompilada:
+    """Asientos de un (prefijo, moneda, caso) con las cuentas fijas ya resueltas."""
+
+    __slots__ = ("familia", "caso", "plantillas", "usa_proveedor", "aviso_sin_asientos")
+
+    def __init__(self, familia, caso, plantillas, aviso_sin_asientos):
+        self.familia = familia
+        self.caso = caso
+        # Tuplas (debe, haber, campo_total, campo_iva, libro, campo_si)
+        self.plantillas = plantillas
+        self.usa_proveedor = any(
+            PROVEEDOR in (p[0], p[1], p[4]) for p in plantillas
+        )
+        self.aviso_sin_asientos = aviso_sin_asientos
+
+
+class MotorReglas:
+    """
+    Tabla de despacho compilada:
+      casos[prefijo] -> [(caso, ((campo, condicion), ...)), ...] en orden de evaluación
+      despacho[(prefijo, cod_moneda, caso)] -> ReglaCompilada
+    """
+
+    def __init__(self, casos, despacho):
+        self.casos = casos
+        self.despacho = despacho
+
+    def regla(self, prefijo, cod_moneda, registro):
+        """Retorna la ReglaCompilada que aplica al registro, o None si no hay regla."""
+        casos = self.casos.get(prefijo)
+        if casos is None:
+            return None
+        for caso, condiciones in casos:
+            for campo, condicion in condiciones:
+                valor = registro[campo]
+                if condicion == "cero":
+                    if valor != 0:
+                        break
+                elif condicion == "no_cero":
+                    if valor == 0:
+                        break
+                elif valor <= 0:
+                    break
+            else:
+                return self.despacho.get((prefijo, cod_moneda, caso))
+        return None
+
+
+def _resolver_cuenta(spec, cod_moneda, donde):
+    """Cuenta fija o por moneda → int; "proveedor"/"iva" quedan para resolver por fila."""
+    if spec in ("", None):
+        return ""
+    if spec in (PROVEEDOR, IVA):
+        return spec
+    if isinstance(spec, (list, tuple)):
+        if len(spec) != len(MONEDAS):
+            raise ValueError(f"{donde}: se esperaban {len(MONEDAS)} cuentas [UYU, USD], hay {len(spec)}")
+        return int(spec[cod_moneda])
+    return int(spec)
+
+
+def _validar_campo(campo, donde):
+    if campo is not None and campo not in _CAMPOS_MONTO:
+        raise ValueError(f"{donde}: campo de monto desconocido '{campo}'")
+    return campo
+
+
+def compilar_reglas(reglas=REGLAS_ASIENTOS):
+    """
+    Valida las reglas declarativas y las compila a un MotorReglas.
+    Lanza ValueError ante reglas mal formadas.
+    """
+    casos = {}
+    despacho = {}
+
+    for familia in reglas:
+        nombre_familia = familia.get("familia", "?")
+        aviso = familia.get("aviso_sin_asientos")
+        casos_familia = []
+
+        for caso in familia["casos"]:
+            nombre_caso = caso["caso"]
+            donde = f"Regla {nombre_familia}/{nombre_caso}"
+
+            condiciones = []
+            for campo, condicion in caso.get("cuando", {}).items():
+                _validar_campo(campo, donde)
+                if condicion not in _CONDICIONES:
+                    raise ValueError(f"{donde}: condición desconocida '{condicion}'")
+                condiciones.append((campo, condicion))
+            casos_familia.append((nombre_caso, tuple(condiciones)))
+
+            for cod_moneda in MONEDAS:
+                plantillas = []
+                for plantilla in caso["asientos"]:
+                    extra = set(plantilla) - _CLAVES_PLANTILLA
+                    if extra:
+                        raise ValueError(f"{donde}: claves desconocidas {sorted(extra)}")
+                    libro = plantilla.get("libro", "C")
+                    if libro not in ("C", "E", PROVEEDOR):
+                        raise ValueError(f"{donde}: libro inválido '{libro}'")
+                    plantillas.append((
+                        _resolver_cuenta(plantilla.get("debe"), cod_moneda, donde),
+                        _resolver_cuenta(plantilla.get("haber"), cod_moneda, donde),
+                        _validar_campo(plantilla.get("total"), donde),
+                        _validar_campo(plantilla.get("iva"), donde),
+                        libro,
+                        _validar_campo(plantilla.get("si"), donde),
+                    ))
+                regla = ReglaCompilada(nombre_familia, nombre_caso, tuple(plantillas), aviso)
+                for prefijo in familia["prefijos"]:
+                    despacho[(prefijo, cod_moneda, nombre_caso)] = regla
+
+        for prefijo in familia["prefijos"]:
+            if prefijo in casos:
+                raise ValueError(f"Prefijo '{prefijo}' definido en más de una familia de reglas")
+            casos[prefijo] = tuple(casos_familia)
+
+    return MotorReglas(casos, despacho)
@@ -0,0 +1,168 @@
+# perfiles.py — Perfiles de configuración por cliente con caché LRU
+
+import json
+import logging
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from config import (
+    CUENTA_DEFAULT, COLUMN_ALIASES, PERFILES_DIR, PERFILES_CACHE_MAX, ACTIVIDAD_CUENTAS,
+    IVA_22_CUENTA, IVA_10_CUENTA, IVA_OTRO_CUENTA, IVA_TOLERANCIA, REGLAS_ASIENTOS,
+)
+from motor_reglas import compilar_reglas
+from proveedores import TablaProveedores, obtener_proveedores
+
+logger = logging.getLogger(__name__)
+
+
+class Perfil:
+    """
+    Configuración contable de un cliente. Los valores que el JSON del perfil
+    no define se toman de config.py.
+    """
+
+    def __init__(
+        self, nombre=None, proveedores=None, cuenta_default=CUENTA_DEFAULT,
+        iva_22_cuenta=IVA_22_CUENTA, iva_10_cuenta=IVA_10_CUENTA,
+        iva_otro_cuenta=IVA_OTRO_CUENTA, iva_tolerancia=IVA_TOLERANCIA,
+        column_aliases=COLUMN_ALIASES, actividad_cuentas=ACTIVIDAD_CUENTAS,
+        reglas=REGLAS_ASIENTOS,
+    ):
+        self.nombre = nombre
+        # dict o TablaProveedores; None = tabla global (config.py o --proveedores)
+        self._proveedores = proveedores
+        self.cuenta_default = cuenta_default
+        self.iva_22_cuenta = iva_22_cuenta
+        self.iva_10_cuenta = iva_10_cuenta
+        self.iva_otro_cuenta = iva_otro_cuenta
+        self.iva_tolerancia = iva_tolerancia
+        self.column_aliases = column_aliases
+        self.actividad_cuentas = actividad_cuentas
+        # Las reglas se compilan una sola vez, al construir el perfil
+        self.motor = compilar_reglas(reglas)
+
+    @property
+    def proveedores(self):
+        """Mapping RUT -> {nombre, debe} vigente para este perfil."""
+        if self._proveedores is None:
+            return obtener_proveedores()
+        if isinstance(self._proveedores, TablaProveedores):
+            return self._proveedores.tabla()
+        return self._proveedores
+
+    def __repr__(self):
+        return f"Perfil({self.nombre or 'base'!r})"
+
+
+_PERFIL_BASE = Perfil()
+
+
+def carpeta_perfiles():
+    """Carpeta donde se buscan los <nombre>.json de perfiles."""
+    carpeta = os.environ.get("CFE_PERFILES") or PERFILES_DIR
+    if os.path.isabs(carpeta):
+        return carpeta
+    # Empaquetado con PyInstaller los perfiles viven junto al ejecutable, no dentro del bundle
+    if getattr(sys, "frozen", False):
+        base = os.path.dirname(sys.executable)
+    else:
+        base = os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base, carpeta)
+
+
+def listar_perfiles():
+    """Nombres de los perfiles disponibles, ordenados."""
+    carpeta = carpeta_perfiles()
+    if not os.path.isdir(carpeta):
+        return []
+    return sorted(
+        os.path.splitext(f)[0] for f in os.listdir(carpeta) if f.lower().endswith(".json")
+    )
+
+
+def _leer_perfil(nombre, ruta):
+    """Construye un Perfil desde su archivo JSON."""
+    with open(ruta, "r", encoding="utf-8") as f:
+        datos = json.load(f)
+
+    proveedores = datos.get("proveedores")
+    if isinstance(proveedores, str):
+        ruta_tabla = proveedores
+        if not os.path.isabs(ruta_tabla):
+            ruta_tabla = os.path.join(os.path.dirname(ruta), ruta_tabla)
+        proveedores = TablaProveedores(ruta_tabla)
+    elif isinstance(proveedores, dict):
+        proveedores = {
+            str(rut).strip(): {"nombre": info.get("nombre", ""), "debe": int(info["debe"])}
+            for rut, info in proveedores.items()
+        }
+    elif proveedores is not None:
+        raise ValueError(f"Perfil '{nombre}': 'proveedores' debe ser una ruta o un objeto RUT -> {{nombre, debe}}")
+
+    aliases = COLUMN_ALIASES
+    if datos.get("column_aliases"):
+        # Los aliases del perfil se agregan delante de los generales
+        aliases = {k: list(v) for k, v in COLUMN_ALIASES.items()}
+        for clave, extra in datos["column_aliases"].items():
+            extra = [str(a).strip().lower() for a in extra]
+            aliases[clave] = extra + [a for a in aliases.get(clave, []) if a not in extra]
+
+    return Perfil(
+        nombre=nombre,
+        proveedores=proveedores,
+        cuenta_default=int(datos.get("cuenta_default", CUENTA_DEFAULT)),
+        iva_22_cuenta=int(datos.get("iva_22_cuenta", IVA_22_CUENTA)),
+        iva_10_cuenta=int(datos.get("iva_10_cuenta", IVA_10_CUENTA)),
+        iva_otro_cuenta=int(datos.get("iva_otro_cuenta", IVA_OTRO_CUENTA)),
+        iva_tolerancia=float(datos.get("iva_tolerancia", IVA_TOLERANCIA)),
+        column_aliases=aliases,
+        actividad_cuentas={
+            str(k): int(v) for k, v in datos.get("actividad_cuentas", ACTIVIDAD_CUENTAS).items()
+        },
+        reglas=datos.get("reglas", REGLAS_ASIENTOS),
+    )
+
+
+# Caché LRU: nombre -> (firma del JSON, Perfil)
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def cargar_perfil(nombre):
+    """
+    Retorna el Perfil <nombre>, reutilizando la instancia cacheada mientras su
+    JSON no cambie. Lanza ValueError si el perfil no existe.
+    """
+    ruta = os.path.join(carpeta_perfiles(), f"{nombre}.json")
+    try:
+        st = os.stat(ruta)
+    except OSError:
+        raise ValueError(f"Perfil no encontrado: '{nombre}' ({ruta})")
+    firma = (st.st_mtime_ns, st.st_size)
+
+    with _cache_lock:
+        entrada = _cache.get(nombre)
+        if entrada is not None and entrada[0] == firma:
+            _cache.move_to_end(nombre)
+            return entrada[1]
+
+    perfil = _leer_perfil(nombre, ruta)
+    logger.info(f"Perfil cargado: '{nombre}'")
+
+    with _cache_lock:
+        _cache[nombre] = (firma, perfil)
+        _cache.move_to_end(nombre)
+        while len(_cache) > PERFILES_CACHE_MAX:
+            _cache.popitem(last=False)
+    return perfil
+
+
+def obtener_perfil(perfil=None):
+    """Acepta None (perfil base), un nombre o un Perfil ya construido."""
+    if perfil is None or perfil == "":
+        return _PERFIL_BASE
+    if isinstance(perfil, Perfil):
+        return perfil
+    return cargar_perfil(perfil)
@@ -0,0 +1,102 @@
+# precarga.py — Precarga en segundo plano de dependencias pesadas
+
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Backends de lectura que reader importa de forma diferida
+BACKENDS = ("openpyxl", "xlrd")
+
+_inicio = time.perf_counter()
+_hilo = None
+_marcados = {}
+
+
+def iniciar_precarga(precompilar=True):
+    """
+    Importa los backends de lectura (y opcionalmente calienta reglas y formato)
+    en un hilo de fondo, para que el primer "Convertir" no pague ese costo.
+    """
+    global _hilo
+    if _hilo is not None:
+        return _hilo
+    _hilo = threading.Thread(target=_precargar, args=(precompilar,), name="precarga", daemon=True)
+    _hilo.start()
+    return _hilo
+
+
+def esperar_precarga(timeout=None):
+    """Bloquea hasta que termine la precarga. Retorna True si terminó."""
+    if _hilo is None:
+        return True
+    _hilo.join(timeout)
+    return not _hilo.is_alive()
+
+
+def marcar(evento, segundos=None):
+    """
+    Registra un hito de latencia (solo la primera vez que ocurre).
+    Si no se indica duración se mide desde el arranque del proceso.
+    """
+    if evento in _marcados:
+        return _marcados[evento]
+    if segundos is None:
+        segundos = time.perf_counter() - _inicio
+    _marcados[evento] = segundos
+    logger.info(f"Tiempo {evento}: {segundos:.3f} s")
+    return segundos
+
+
+def tiempos():
+    """Retorna una copia de los hitos registrados {evento: segundos}."""
+    return dict(_marcados)
+
+
+def _precargar(precompilar):
+    t0 = time.perf_counter()
+    for nombre in BACKENDS:
+        t_mod = time.perf_counter()
+        try:
+            importlib.import_module(nombre)
+        except ImportError:
+            logger.warning(f"Precarga: no se pudo importar '{nombre}'.")
+            continue
+        logger.debug(f"Precarga: {nombre} importado en {time.perf_counter() - t_mod:.3f} s")
+
+    if precompilar:
+        try:
+            _precompilar()
+        except Exception as e:
+            logger.warning(f"Precarga: error calentando reglas: {e}")
+
+    marcar("precarga", time.perf_counter() - t0)
+
+
+def _precompilar():
+    """Ejecuta una vez el camino de parseo, reglas y formato con datos sintéticos."""
+    from config import TIPO_CFE_PREFIJOS
+    from reader import _parse_fecha
+    from rules import generar_asientos
+    from writer import _asiento_a_linea
+
+    # La primera llamada a strptime importa _strptime y compila sus regex
+    fecha = _parse_fecha("01/01/2026")
+    for tipo in TIPO_CFE_PREFIJOS:
+        registro = {
+            "fecha": fecha,
+            "tipo_cfe": tipo,
+            "serie": "A",
+            "numero": "0",
+            "rut_emisor": "",
+            "moneda": "UYU",
+            "monto_neto": 0.0,
+            "iva_ventas": 0.0,
+            "monto_total": 1.0,
+            "monto_ret_per": 1.0,
+            "monto_cred_fiscal": 1.0,
+        }
+        for asiento in generar_asientos(registro):
+            _asiento_a_linea(asiento)
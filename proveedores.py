@@ -0,0 +1,172 @@
+# proveedores.py — Tabla de proveedores cargada desde SQLite o CSV externo
+
+import csv
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from config import PROVEEDORES
+
+logger = logging.getLogger(__name__)
+
+# Cada cuántos segundos como máximo se revisa el mtime del archivo fuente
+INTERVALO_REVISION = 2.0
+
+# Versión del formato de la caché compilada de CSV
+_VERSION_CACHE = 2
+
+
+class TablaProveedores:
+    """
+    Tabla RUT -> {nombre, debe} respaldada por un archivo .csv o .db/.sqlite.
+    Se carga en un dict en el primer uso (búsquedas O(1)) y se recarga sola
+    cuando cambia el mtime del archivo fuente.
+    """
+
+    def __init__(self, ruta):
+        self.ruta = os.path.abspath(ruta)
+        self._tabla = None
+        self._firma = None
+        self._proxima_revision = 0.0
+        self._lock = threading.Lock()
+
+    def tabla(self):
+        """Retorna el dict vigente, cargándolo o recargándolo si hace falta."""
+        ahora = time.monotonic()
+        if self._tabla is not None and ahora < self._proxima_revision:
+            return self._tabla
+        with self._lock:
+            self._proxima_revision = ahora + INTERVALO_REVISION
+            firma = _firma_archivo(self.ruta)
+            if self._tabla is None or firma != self._firma:
+                self._tabla = self._cargar(firma)
+                self._firma = firma
+        return self._tabla
+
+    def get(self, rut, default=None):
+        return self.tabla().get(rut, default)
+
+    def __len__(self):
+        return len(self.tabla())
+
+    def _cargar(self, firma):
+        ext = os.path.splitext(self.ruta)[1].lower()
+        inicio = time.perf_counter()
+        if ext == ".csv":
+            tabla = _cargar_csv_compilado(self.ruta, firma)
+        elif ext in (".db", ".sqlite", ".sqlite3"):
+            tabla = _cargar_sqlite(self.ruta)
+        else:
+            raise ValueError(f"Formato de tabla de proveedores no soportado: {ext}. Use .csv o .db")
+        logger.info(
+            f"Tabla de proveedores cargada: {len(tabla)} RUTs desde {self.ruta}"
+            f" ({time.perf_counter() - inicio:.3f} s)"
+        )
+        return tabla
+
+
+def _firma_archivo(ruta):
+    """(mtime_ns, tamaño) del archivo; identifica una versión concreta."""
+    st = os.stat(ruta)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _ruta_cache(ruta_csv):
+    return ruta_csv + ".cache"
+
+
+def _cargar_csv_compilado(ruta_csv, firma):
+    """
+    Usa la caché compilada del CSV si corresponde a la misma versión; si no, la
+    regenera. La caché es JSON (nunca pickle): vive junto a un CSV que puede
+    venir de una carpeta compartida y no debe poder ejecutar código al cargarse.
+    """
+    ruta_cache = _ruta_cache(ruta_csv)
+    try:
+        with open(ruta_cache, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        if cache.get("version") == _VERSION_CACHE and tuple(cache.get("firma", ())) == firma:
+            return {
+                str(rut): {"nombre": str(info["nombre"]), "debe": int(info["debe"])}
+                for rut, info in cache["tabla"].items()
+            }
+    except (OSError, ValueError, AttributeError, TypeError, KeyError):
+        pass
+
+    tabla = _leer_csv(ruta_csv)
+
+    # La caché es opcional: si la carpeta no admite escritura se sigue sin ella
+    tmp = f"{ruta_cache}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": _VERSION_CACHE, "firma": firma, "tabla": tabla}, f, ensure_ascii=False)
+        os.replace(tmp, ruta_cache)
+    except OSError as e:
+        logger.debug(f"No se pudo escribir la caché de proveedores {ruta_cache}: {e}")
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+    return tabla
+
+
+def _leer_csv(ruta_csv):
+    """Lee un CSV con columnas rut, nombre, debe (delimitador , o ;)."""
+    tabla = {}
+    with open(ruta_csv, "r", encoding="utf-8-sig", newline="") as f:
+        muestra = f.read(4096)
+        f.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.DictReader(f, dialect=dialecto)
+        if lector.fieldnames:
+            lector.fieldnames = [c.strip().lower() for c in lector.fieldnames]
+        for num, fila in enumerate(lector, start=2):
+            rut = (fila.get("rut") or "").strip()
+            if not rut:
+                continue
+            try:
+                debe = int(str(fila.get("debe") or "").strip())
+            except ValueError:
+                logger.warning(f"{os.path.basename(ruta_csv)} línea {num}: cuenta 'debe' inválida para RUT {rut}, se omite.")
+                continue
+            tabla[rut] = {"nombre": (fila.get("nombre") or "").strip(), "debe": debe}
+    return tabla
+
+
+def _cargar_sqlite(ruta_db):
+    """Lee la tabla proveedores(rut, nombre, debe) de una base SQLite."""
+    # as_uri escapa ?, # y % del nombre, que en una URI sqlite tienen significado
+    con = sqlite3.connect(Path(ruta_db).resolve().as_uri() + "?mode=ro", uri=True)
+    try:
+        filas = con.execute("SELECT rut, nombre, debe FROM proveedores").fetchall()
+    finally:
+        con.close()
+    return {str(rut).strip(): {"nombre": nombre or "", "debe": int(debe)} for rut, nombre, debe in filas}
+
+
+_tabla_externa = None
+
+
+def configurar(ruta):
+    """Define el archivo externo de proveedores. None vuelve a la tabla de config.py."""
+    global _tabla_externa
+    _tabla_externa = TablaProveedores(ruta) if ruta else None
+
+
+def obtener_proveedores():
+    """Retorna el mapping RUT -> {nombre, debe} vigente."""
+    if _tabla_externa is not None:
+        return _tabla_externa.tabla()
+    return PROVEEDORES
+
+
+# Permite apuntar a la tabla externa sin tocar el código (CLI y GUI)
+if os.environ.get("CFE_PROVEEDORES"):
+    configurar(os.environ["CFE_PROVEEDORES"])
@@ -1,10 +1,18 @@
 # reader.py — Lectura de archivos CFE en formato Excel (.xls / .xlsx)
 
+import codecs
+import csv
+import io
 import os
 import logging
+import re
+from contextlib import closing
 from datetime import datetime
+from itertools import chain, islice
 
-from config import COLUMN_ALIASES
+from clasificacion import clasificar_tipo, clasificar_moneda
+from config import COLUMN_ALIASES, SONDEO_FILAS, SONDEO_HILOS
+from perfiles import obtener_perfil
 
 logger = logging.getLogger(__name__)
 
@@ -16,15 +24,15 @@ def _normalize(text):
     return str(text).strip().lower()
 
 
-def _match_columns(header_row):
+def _match_columns(header_row, column_aliases=COLUMN_ALIASES):
     """
     Dado un header del Excel, devuelve un dict {clave_interna: índice_columna}.
-    Usa coincidencia flexible con COLUMN_ALIASES.
+    Usa coincidencia flexible con COLUMN_ALIASES (o los aliases del perfil).
     """
     mapping = {}
     normalized_headers = [_normalize(h) for h in header_row]
 
-    for key, aliases in COLUMN_ALIASES.items():
+    for key, aliases in column_aliases.items():
         for alias in aliases:
             for idx, header in enumerate(normalized_headers):
                 if alias == header:
@@ -53,19 +61,41 @@ def _parse_fecha(valor):
     return None
 
 
-def _parse_monto(valor):
-    """Convierte un valor a float. Retorna 0.0 si es None o no parseable."""
+# Punto solo seguido de exactamente tres dígitos: "1.234"
+_MILES_CON_PUNTO = re.compile(r"[-+]?\d{1,3}\.\d{3}")
+
+
+def _parse_monto(valor, decimal=None):
+    """
+    Convierte un valor a float; None, vacío o "-" es 0.0. En texto admite coma
+    o punto decimal y separador de miles: "1.234,56" (portal DGI), "1,234.56",
+    "1.234.567". Con `decimal` = "," (la marca decimal del archivo, ver
+    _detectar_decimal) un punto solo seguido de tres dígitos es de miles:
+    "1.234" es 1234. Lanza ValueError si el texto no es un monto.
+    """
     if valor is None:
         return 0.0
     if isinstance(valor, (int, float)):
         return float(valor)
-    texto = str(valor).strip().replace(",", ".")
+    texto = str(valor).strip().replace(" ", "").replace("\xa0", "")
     if not texto or texto == "-":
         return 0.0
+    coma = texto.rfind(",")
+    punto = texto.rfind(".")
+    if coma >= 0 and punto >= 0:
+        # El último separador es el decimal; el otro, de miles
+        if coma > punto:
+            texto = texto.replace(".", "").replace(",", ".")
+        else:
+            texto = texto.replace(",", "")
+    elif coma >= 0:
+        texto = texto.replace(",", ".") if texto.count(",") == 1 else texto.replace(",", "")
+    elif texto.count(".") > 1 or (decimal == "," and _MILES_CON_PUNTO.fullmatch(texto)):
+        texto = texto.replace(".", "")
     try:
         return float(texto)
     except ValueError:
-        return 0.0
+        raise ValueError(f"monto no reconocido {valor!r}") from None
 
 
 def _parse_numero(valor):
@@ -84,20 +114,41 @@ def _parse_rut(valor):
     return str(valor).strip()
 
 
-def leer_excel(ruta_archivo):
+# Firmas de archivo para reconocer el formato de un stream sin nombre
+_FIRMA_XLSX = b"PK\x03\x04"
+_FIRMA_XLS = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+_FIRMA_CFECOL = b"CFECOL"  # CFECOL1, CFECOL2...
+
+
+def _detectar_formato(f):
+    """Retorna '.xlsx', '.xls' o '.cfecol' según los primeros bytes de un archivo binario abierto."""
+    posicion = f.tell()
+    cabecera = f.read(8)
+    f.seek(posicion)
+    if cabecera.startswith(_FIRMA_XLSX):
+        return ".xlsx"
+    if cabecera.startswith(_FIRMA_XLS):
+        return ".xls"
+    if cabecera.startswith(_FIRMA_CFECOL):
+        return ".cfecol"
+    return ""
+
+
+def leer_excel(ruta_archivo, perfil=None, limite=None, encabezado=None):
     """
-    Lee un archivo CFE en formato .xls o .xlsx.
+    Lee un archivo CFE en formato .xls, .xlsx, .csv/.tsv (exportación del
+    portal DGI) o un .cfecol ya normalizado (ver columnar.py).
+    `ruta_archivo` puede ser una ruta o un archivo binario abierto y con seek
+    (p. ej. stdin volcado a un SpooledTemporaryFile); en ese caso el formato se
+    detecta por su contenido, y lo que no es Excel ni .cfecol se lee como CSV.
+    `perfil` (nombre o Perfil) define los aliases de columnas a reconocer.
+    Con `limite`, deja de leer después de esa cantidad de registros (vista previa).
+    Si se pasa un dict `encabezado`, se completa con la hoja, la fila y el
+    mapping de columnas detectados.
     Retorna una lista de dicts con los campos normalizados.
     """
-    ext = os.path.splitext(ruta_archivo)[1].lower()
-    filas = []
-
-    if ext == ".xlsx":
-        filas = _leer_xlsx(ruta_archivo)
-    elif ext == ".xls":
-        filas = _leer_xls(ruta_archivo)
-    else:
-        raise ValueError(f"Formato no soportado: {ext}. Use .xls o .xlsx")
+    with closing(iterar_registros(ruta_archivo, perfil, encabezado)) as registros:
+        filas = list(islice(registros, limite))
 
     if not filas:
         logger.warning("El archivo no contiene datos de CFE.")
@@ -105,56 +156,236 @@ def leer_excel(ruta_archivo):
     return filas
 
 
-def _leer_xlsx(ruta):
-    """Lee un archivo .xlsx con openpyxl. Busca en todas las hojas si la activa no tiene datos CFE."""
-    import openpyxl
+def iterar_registros(ruta_archivo, perfil=None, encabezado=None):
+    """
+    Como leer_excel, pero genera los registros de a uno sin retenerlos (modo
+    de memoria acotada). El archivo queda abierto hasta agotar o cerrar el generador.
+    """
+    if isinstance(ruta_archivo, (str, os.PathLike)):
+        ext = os.path.splitext(ruta_archivo)[1].lower()
+    else:
+        ext = _detectar_formato(ruta_archivo) or ".csv"
+    if ext == ".cfecol":
+        # Ya normalizado: no hay encabezados que reconocer
+        from columnar import ArchivoColumnar
 
-    wb = openpyxl.load_workbook(ruta, data_only=True)
+        with ArchivoColumnar(ruta_archivo) as archivo:
+            yield from archivo.registros()
+        return
+
+    aliases = obtener_perfil(perfil).column_aliases
+    if ext == ".xlsx":
+        yield from _iterar_xlsx(ruta_archivo, aliases, encabezado)
+    elif ext == ".xls":
+        yield from _iterar_xls(ruta_archivo, aliases, encabezado)
+    elif ext in (".csv", ".tsv"):
+        yield from _iterar_csv(ruta_archivo, aliases, encabezado)
+    else:
+        raise ValueError(f"Formato no soportado: {ext}. Use .xls, .xlsx, .csv, .tsv o .cfecol")
 
-    # Intentar primero la hoja activa, luego las demás
-    hojas = [wb.active] + [wb[name] for name in wb.sheetnames if wb[name] != wb.active]
 
-    for ws in hojas:
-        rows = list(ws.iter_rows(values_only=True))
-        if not rows:
-            continue
-        registros = _procesar_filas(rows)
-        if registros:
-            logger.info(f"Datos CFE encontrados en hoja: '{ws.title}'")
-            return registros
+def _iterar_xlsx(ruta, column_aliases=COLUMN_ALIASES, encabezado=None):
+    """Lee un archivo .xlsx con openpyxl. Sondea todas las hojas y parsea completa solo la elegida."""
+    import openpyxl
 
-    # Ninguna hoja tuvo datos
-    return _procesar_filas([])
+    # En modo read_only las filas se leen del XML a demanda: sondear una hoja
+    # cuesta SONDEO_FILAS filas, no la hoja entera
+    wb = openpyxl.load_workbook(ruta, read_only=True, data_only=True)
+    try:
+        hojas = [wb.active] + [ws for ws in wb.worksheets if ws is not wb.active]
+        yield from _iterar_hojas(
+            hojas, lambda ws: ws.iter_rows(values_only=True), lambda ws: ws.title,
+            column_aliases, SONDEO_HILOS, encabezado,
+        )
+    finally:
+        wb.close()
 
 
-def _leer_xls(ruta):
-    """Lee un archivo .xls con xlrd. Busca en todas las hojas si la primera no tiene datos CFE."""
+def _iterar_xls(ruta, column_aliases=COLUMN_ALIASES, encabezado=None):
+    """Lee un archivo .xls con xlrd. Sondea todas las hojas y parsea completa solo la elegida."""
     import xlrd
 
-    wb = xlrd.open_workbook(ruta)
+    # on_demand: las hojas se manejan por índice y cada una se decodifica recién
+    # cuando se la sondea. xlrd decodifica la hoja entera aunque se lean pocas
+    # filas, así que las que pierden el sondeo se descargan enseguida.
+    if hasattr(ruta, "read"):
+        wb = xlrd.open_workbook(file_contents=ruta.read(), on_demand=True)
+    else:
+        wb = xlrd.open_workbook(ruta, on_demand=True)
+    nombres = wb.sheet_names()
 
-    for sheet_idx in range(wb.nsheets):
-        ws = wb.sheet_by_index(sheet_idx)
-        rows = []
+    def filas(indice):
+        ws = wb.sheet_by_index(indice)
         for i in range(ws.nrows):
-            rows.append(tuple(ws.cell_value(i, j) for j in range(ws.ncols)))
-        if not rows:
+            yield tuple(ws.row_values(i))
+
+    def descartar(indices):
+        for indice in indices:
+            wb.unload_sheet(indice)
+
+    try:
+        # xlrd comparte el buffer del libro entre hojas: el sondeo es secuencial
+        yield from _iterar_hojas(
+            list(range(wb.nsheets)), filas, lambda indice: nombres[indice], column_aliases, 1, encabezado,
+            descartar=descartar,
+        )
+    finally:
+        wb.release_resources()
+
+
+# Bytes iniciales que se usan para detectar codificación y separador de un CSV
+_CSV_MUESTRA = 64 * 1024
+_CSV_SEPARADORES = (";", ",", "\t", "|")
+
+
+def _detectar_codificacion(muestra):
+    """UTF-8 (con o sin BOM) si la muestra es válida; si no, cp1252 (Excel en Windows)."""
+    if muestra.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        # final=False: un carácter cortado al final de la muestra no es un error
+        codecs.getincrementaldecoder("utf-8")().decode(muestra, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+
+def _detectar_separador(texto, column_aliases=COLUMN_ALIASES):
+    """
+    Elige el separador con el que las primeras SONDEO_FILAS líneas contienen un
+    encabezado CFE reconocible (el que más columnas reconoce). Así la coma
+    decimal no confunde la detección. Si ninguno lo logra, decide csv.Sniffer.
+    """
+    lineas = texto.splitlines()[:SONDEO_FILAS]
+    mejor, mejor_columnas = None, 0
+    for separador in _CSV_SEPARADORES:
+        mapping = _encontrar_header(csv.reader(lineas, delimiter=separador), column_aliases)[1]
+        if mapping is not None and len(mapping) > mejor_columnas:
+            mejor, mejor_columnas = separador, len(mapping)
+    if mejor is not None:
+        return mejor
+    try:
+        return csv.Sniffer().sniff(texto, delimiters="".join(_CSV_SEPARADORES)).delimiter
+    except csv.Error:
+        return ","
+
+
+# Montos cuya marca decimal no es ambigua: "271,60", "1.234,5" / "271.60", "1,234.5"
+_DECIMAL_COMA = re.compile(r"[-+]?(\d+,\d{1,2}|\d{1,3}(\.\d{3})+,\d+)")
+_DECIMAL_PUNTO = re.compile(r"[-+]?(\d+\.\d{1,2}|\d{1,3}(,\d{3})+\.\d+)")
+
+
+def _detectar_decimal(texto, separador):
+    """
+    Marca decimal de los montos de la muestra ("," o "."), por mayoría entre
+    las celdas que no son ambiguas; None si no hay ninguna.
+    """
+    coma = punto = 0
+    for fila in csv.reader(texto.splitlines()[:SONDEO_FILAS], delimiter=separador):
+        for celda in fila:
+            celda = celda.strip()
+            if _DECIMAL_COMA.fullmatch(celda):
+                coma += 1
+            elif _DECIMAL_PUNTO.fullmatch(celda):
+                punto += 1
+    if coma == punto:
+        return None
+    return "," if coma > punto else "."
+
+
+def _iterar_csv(ruta, column_aliases=COLUMN_ALIASES, encabezado=None):
+    """
+    Lee un CSV/TSV en streaming: detecta codificación y separador con una
+    muestra y pasa las filas de csv.reader directo a _iterar_filas.
+    """
+    binario = ruta if hasattr(ruta, "read") else open(ruta, "rb")
+    try:
+        posicion = binario.tell()
+        muestra = binario.read(_CSV_MUESTRA)
+        binario.seek(posicion)
+        codificacion = _detectar_codificacion(muestra)
+        texto_muestra = muestra.decode(codificacion, errors="replace")
+        separador = _detectar_separador(texto_muestra, column_aliases)
+        decimal = _detectar_decimal(texto_muestra, separador)
+        logger.info(f"CSV: codificación {codificacion}, separador {separador!r}, decimal {decimal!r}")
+
+        texto = io.TextIOWrapper(binario, encoding=codificacion, errors="replace", newline="")
+        try:
+            yield from _iterar_filas(csv.reader(texto, delimiter=separador), column_aliases, encabezado, decimal)
+        finally:
+            # Soltar el wrapper sin cerrar un stream que no abrimos nosotros
+            texto.detach()
+    finally:
+        if binario is not ruta:
+            binario.close()
+
+
+def _sondear_hojas(hojas, filas_de, column_aliases=COLUMN_ALIASES, hilos=1):
+    """
+    Busca el encabezado CFE en las primeras SONDEO_FILAS filas de cada hoja.
+    Retorna (candidatas, resto): las hojas con encabezado, ordenadas por
+    cantidad de columnas reconocidas y luego por orden original, y las demás.
+    """
+    def sondear(ws):
+        return _encontrar_header(list(islice(filas_de(ws), SONDEO_FILAS)), column_aliases)[1]
+
+    if hilos > 1 and len(hojas) > 1:
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=min(hilos, len(hojas))) as executor:
+            mappings = list(executor.map(sondear, hojas))
+    else:
+        mappings = [sondear(ws) for ws in hojas]
+
+    orden = sorted(
+        (-len(mapping), i) for i, mapping in enumerate(mappings) if mapping is not None
+    )
+    candidatas = [hojas[i] for _, i in orden]
+    resto = [ws for ws, mapping in zip(hojas, mappings) if mapping is None]
+    return candidatas, resto
+
+
+def _iterar_hojas(
+    hojas, filas_de, nombre_de, column_aliases=COLUMN_ALIASES, hilos=1, encabezado=None, descartar=None,
+):
+    """
+    Genera los registros de la mejor hoja candidata; si ninguna da datos,
+    recorre el resto. Las filas se consumen en streaming. `descartar(hojas)`,
+    si se pasa, libera las hojas que no tienen encabezado tras el sondeo.
+    """
+    candidatas, resto = _sondear_hojas(hojas, filas_de, column_aliases, hilos)
+    if resto:
+        logger.debug(f"Hojas sin encabezado CFE en las primeras {SONDEO_FILAS} filas: {[nombre_de(ws) for ws in resto]}")
+        if descartar is not None:
+            descartar(resto)
+
+    # El resto solo se parsea completo si el encabezado está más abajo del sondeo
+    for ws in candidatas + resto:
+        filas = filas_de(ws)
+        primera = next(filas, None)
+        if primera is None:
             continue
-        registros = _procesar_filas(rows)
-        if registros:
-            logger.info(f"Datos CFE encontrados en hoja: '{ws.name}'")
-            return registros
+        registros = _iterar_filas(chain((primera,), filas), column_aliases, encabezado)
+        registro = next(registros, None)
+        if registro is not None:
+            logger.info(f"Datos CFE encontrados en hoja: '{nombre_de(ws)}'")
+            if encabezado is not None:
+                encabezado["hoja"] = nombre_de(ws)
+            yield registro
+            yield from registros
+            return
 
-    return _procesar_filas([])
+    # Ninguna hoja tuvo datos
+    logger.error("No se encontró la fila de encabezados en el Excel.")
 
 
-def _encontrar_header(rows):
+def _encontrar_header(rows, column_aliases=COLUMN_ALIASES):
     """
     Busca la fila que contiene los headers de columnas CFE.
     Retorna (índice_fila, mapping) o (None, None) si no se encuentra.
     """
     for i, row in enumerate(rows):
-        mapping = _match_columns(row)
+        mapping = _match_columns(row, column_aliases)
         # Necesitamos al menos fecha, tipo, serie, numero, rut, moneda
         campos_requeridos = {"fecha_comprobante", "tipo_cfe", "serie", "numero", "rut_emisor", "moneda"}
         if campos_requeridos.issubset(mapping.keys()):
@@ -162,26 +393,44 @@ def _encontrar_header(rows):
     return None, None
 
 
-def _procesar_filas(rows):
-    """Procesa las filas del Excel para extraer los registros CFE."""
-    header_idx, mapping = _encontrar_header(rows)
+def _procesar_filas(rows, column_aliases=COLUMN_ALIASES, limite=None, encabezado=None):
+    """
+    Procesa las filas del Excel para extraer los registros CFE. `rows` puede
+    ser un iterador: se recorre una sola vez y se corta al llegar a `limite`.
+    """
+    return list(islice(_iterar_filas(rows, column_aliases, encabezado), limite))
+
+
+def _iterar_filas(rows, column_aliases=COLUMN_ALIASES, encabezado=None, decimal=None):
+    """
+    Genera los registros CFE de las filas a medida que se leen. `decimal` es la
+    marca decimal de los montos en texto, si se conoce (ver _parse_monto).
+    """
+    rows = iter(rows)
+    # Consume hasta el encabezado inclusive; el resto de `rows` son los datos
+    header_idx, mapping = _encontrar_header(rows, column_aliases)
 
     if header_idx is None:
         logger.error("No se encontró la fila de encabezados en el Excel.")
-        return []
+        return
 
     logger.info(f"Encabezados encontrados en fila {header_idx + 1}: {mapping}")
+    if encabezado is not None:
+        encabezado["fila"] = header_idx + 1
+        encabezado["columnas"] = dict(mapping)
 
-    registros = []
-    for i in range(header_idx + 1, len(rows)):
-        row = rows[i]
+    for i, row in enumerate(rows, start=header_idx + 1):
         if not row or all(v is None for v in row):
             continue
 
         # Extraer campo tipo_cfe para ver si es una fila de datos
         idx_tipo = mapping.get("tipo_cfe")
         tipo_val = row[idx_tipo] if idx_tipo is not None and idx_tipo < len(row) else None
-        if tipo_val is None or str(tipo_val).strip() == "":
+        if tipo_val is None:
+            continue
+        # Texto internado y código resueltos una vez por valor distinto
+        tipo_cfe, cod_tipo = clasificar_tipo(tipo_val)
+        if tipo_cfe == "":
             continue
 
         fecha = _parse_fecha(row[mapping["fecha_comprobante"]] if mapping["fecha_comprobante"] < len(row) else None)
@@ -189,20 +438,29 @@ def _procesar_filas(rows):
             logger.warning(f"Fila {i + 1}: fecha inválida, se omite.")
             continue
 
-        registro = {
-            "fecha": fecha,
-            "tipo_cfe": str(tipo_val).strip(),
-            "serie": str(row[mapping["serie"]]).strip() if mapping.get("serie") is not None and mapping["serie"] < len(row) else "",
-            "numero": _parse_numero(row[mapping["numero"]] if mapping.get("numero") is not None and mapping["numero"] < len(row) else None),
-            "rut_emisor": _parse_rut(row[mapping["rut_emisor"]] if mapping.get("rut_emisor") is not None and mapping["rut_emisor"] < len(row) else None),
-            "moneda": str(row[mapping["moneda"]]).strip() if mapping.get("moneda") is not None and mapping["moneda"] < len(row) else "",
-            "monto_neto": _parse_monto(row[mapping["monto_neto"]] if mapping.get("monto_neto") is not None and mapping["monto_neto"] < len(row) else None),
-            "iva_ventas": _parse_monto(row[mapping["iva_ventas"]] if mapping.get("iva_ventas") is not None and mapping["iva_ventas"] < len(row) else None),
-            "monto_total": _parse_monto(row[mapping["monto_total"]] if mapping.get("monto_total") is not None and mapping["monto_total"] < len(row) else None),
-            "monto_ret_per": _parse_monto(row[mapping.get("monto_ret_per", -1)] if mapping.get("monto_ret_per") is not None and mapping["monto_ret_per"] < len(row) else None),
-            "monto_cred_fiscal": _parse_monto(row[mapping.get("monto_cred_fiscal", -1)] if mapping.get("monto_cred_fiscal") is not None and mapping["monto_cred_fiscal"] < len(row) else None),
-        }
-
-        registros.append(registro)
-
-    return registros
+        moneda, cod_moneda = clasificar_moneda(
+            row[mapping["moneda"]] if mapping.get("moneda") is not None and mapping["moneda"] < len(row) else ""
+        )
+
+        try:
+            registro = {
+                "fecha": fecha,
+                "tipo_cfe": tipo_cfe,
+                "cod_tipo": cod_tipo,
+                "serie": str(row[mapping["serie"]]).strip() if mapping.get("serie") is not None and mapping["serie"] < len(row) else "",
+                "numero": _parse_numero(row[mapping["numero"]] if mapping.get("numero") is not None and mapping["numero"] < len(row) else None),
+                "rut_emisor": _parse_rut(row[mapping["rut_emisor"]] if mapping.get("rut_emisor") is not None and mapping["rut_emisor"] < len(row) else None),
+                "moneda": moneda,
+                "cod_moneda": cod_moneda,
+                "monto_neto": _parse_monto(row[mapping["monto_neto"]] if mapping.get("monto_neto") is not None and mapping["monto_neto"] < len(row) else None, decimal),
+                "iva_ventas": _parse_monto(row[mapping["iva_ventas"]] if mapping.get("iva_ventas") is not None and mapping["iva_ventas"] < len(row) else None, decimal),
+                "monto_total": _parse_monto(row[mapping["monto_total"]] if mapping.get("monto_total") is not None and mapping["monto_total"] < len(row) else None, decimal),
+                "monto_ret_per": _parse_monto(row[mapping.get("monto_ret_per", -1)] if mapping.get("monto_ret_per") is not None and mapping["monto_ret_per"] < len(row) else None, decimal),
+                "monto_cred_fiscal": _parse_monto(row[mapping.get("monto_cred_fiscal", -1)] if mapping.get("monto_cred_fiscal") is not None and mapping["monto_cred_fiscal"] < len(row) else None, decimal),
+            }
+        except ValueError as e:
+            # Tomarlo como 0 llevaría el CFE a otra regla (p. ej. neto_cero) con otras cuentas
+            logger.warning(f"Fila {i + 1}: {e}, se omite.")
+            continue
+
+        yield registro
@@ -0,0 +1,235 @@
+# registro_rut.py — Registro nacional de RUT compilado, consultado vía mmap
+#
+# Formato del archivo compilado:
+#   cabecera de 32 bytes: b"CFERUT1\n" + <IIIQ (ancho_rut, ancho_nombre, ancho_actividad, cantidad)
+#   registros de ancho fijo ordenados por RUT: rut | nombre | actividad | "\n"
+# Las búsquedas son binarias sobre el mmap; nunca se carga el archivo completo.
+#
+# Compilar desde un CSV (rut, nombre, actividad):
+#   python registro_rut.py entrada.csv registro.rut
+
+import csv
+import heapq
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from itertools import islice
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CFERUT1\n"
+_CABECERA = struct.Struct("<IIIQ")
+TAM_CABECERA = 32
+
+ANCHO_RUT = 12
+ANCHO_NOMBRE = 60
+ANCHO_ACTIVIDAD = 8
+
+# Registros ordenados en memoria por tanda al compilar (unos 25 MB)
+TANDA_COMPILACION = 200_000
+
+
+def _campo(texto, ancho):
+    """Codifica a UTF-8 recortando sin partir caracteres y rellena con espacios."""
+    datos = texto.encode("utf-8")
+    if len(datos) > ancho:
+        datos = datos[:ancho].decode("utf-8", errors="ignore").encode("utf-8")
+    return datos.ljust(ancho, b" ")
+
+
+def _registros_csv(ruta_csv):
+    """Registros de ancho fijo (clave RUT + nombre + actividad + "\\n") del CSV, en el orden del archivo."""
+    with open(ruta_csv, "r", encoding="utf-8-sig", newline="") as f:
+        muestra = f.read(4096)
+        f.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t|")
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.reader(f, dialect=dialecto)
+        encabezado = [c.strip().lower() for c in next(lector, [])]
+        try:
+            i_rut = encabezado.index("rut")
+            i_nombre = encabezado.index("nombre")
+        except ValueError:
+            raise ValueError(f"{ruta_csv}: se requieren las columnas 'rut' y 'nombre'")
+        i_act = encabezado.index("actividad") if "actividad" in encabezado else None
+
+        for fila in lector:
+            if len(fila) <= max(i_rut, i_nombre):
+                continue
+            rut = fila[i_rut].strip()
+            if not rut or len(rut) > ANCHO_RUT:
+                continue
+            actividad = fila[i_act].strip() if i_act is not None and i_act < len(fila) else ""
+            yield (
+                rut.encode("ascii", errors="ignore").ljust(ANCHO_RUT, b" ")
+                + _campo(fila[i_nombre].strip(), ANCHO_NOMBRE) + _campo(actividad, ANCHO_ACTIVIDAD) + b"\n"
+            )
+
+
+def _clave_registro(registro):
+    return registro[:ANCHO_RUT]
+
+
+def _volcar_tanda(tanda, carpeta, numero):
+    ruta = os.path.join(carpeta, f"tanda_{numero:05d}.rut")
+    with open(ruta, "wb") as f:
+        f.writelines(tanda)
+    return ruta
+
+
+def _leer_tanda(ruta):
+    ancho = ANCHO_RUT + ANCHO_NOMBRE + ANCHO_ACTIVIDAD + 1
+    with open(ruta, "rb", buffering=1024 * 1024) as f:
+        while True:
+            registro = f.read(ancho)
+            if not registro:
+                return
+            yield registro
+
+
+def _cabecera(cantidad):
+    return MAGIC + _CABECERA.pack(ANCHO_RUT, ANCHO_NOMBRE, ANCHO_ACTIVIDAD, cantidad).ljust(TAM_CABECERA - len(MAGIC), b"\0")
+
+
+def compilar_registro(ruta_csv, ruta_salida):
+    """
+    Compila un CSV (rut, nombre, actividad) al formato de ancho fijo ordenado.
+    Retorna la cantidad de RUTs escritos. Ante RUTs repetidos gana la última fila.
+    Memoria acotada a TANDA_COMPILACION registros: se ordenan por tandas que
+    se vuelcan a temporales y se mezclan (heapq.merge), como en
+    consolidacion.consolidar_asientos_externo.
+    """
+    registros = _registros_csv(ruta_csv)
+    with tempfile.TemporaryDirectory(prefix="cfe_registro_") as carpeta:
+        tandas = []
+        while True:
+            # sorted y heapq.merge son estables: entre RUTs iguales queda último el de la última fila
+            tanda = sorted(islice(registros, TANDA_COMPILACION), key=_clave_registro)
+            ultima = len(tanda) < TANDA_COMPILACION
+            if ultima and not tandas:
+                ordenados = iter(tanda)
+                break
+            if tanda:
+                tandas.append(_volcar_tanda(tanda, carpeta, len(tandas)))
+            del tanda
+            if ultima:
+                logger.info(f"Registro RUT: {len(tandas)} tandas ordenadas volcadas a disco.")
+                ordenados = heapq.merge(*(_leer_tanda(r) for r in tandas), key=_clave_registro)
+                break
+
+        cantidad = 0
+        tmp = f"{ruta_salida}.tmp"
+        with open(tmp, "wb") as out:
+            # La cantidad se conoce al final: se reescribe la cabecera
+            out.write(_cabecera(0))
+            anterior = None
+            for registro in ordenados:
+                if anterior is not None and _clave_registro(registro) != _clave_registro(anterior):
+                    out.write(anterior)
+                    cantidad += 1
+                anterior = registro
+            if anterior is not None:
+                out.write(anterior)
+                cantidad += 1
+            out.seek(0)
+            out.write(_cabecera(cantidad))
+    os.replace(tmp, ruta_salida)
+    logger.info(f"Registro RUT compilado: {cantidad} RUTs en {ruta_salida}")
+    return cantidad
+
+
+class RegistroRUT:
+    """Consulta de un registro compilado por búsqueda binaria sobre mmap."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._f = open(ruta, "rb")
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._f.close()
+            raise ValueError(f"Registro RUT vacío o inválido: {ruta}")
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self.cerrar()
+            raise ValueError(f"Registro RUT con formato desconocido: {ruta}")
+        self._ancho_rut, self._ancho_nombre, self._ancho_actividad, self.cantidad = _CABECERA.unpack_from(
+            self._mm, len(MAGIC),
+        )
+        self._ancho = self._ancho_rut + self._ancho_nombre + self._ancho_actividad + 1
+
+    def cerrar(self):
+        self._mm.close()
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def _clave(self, i):
+        off = TAM_CABECERA + i * self._ancho
+        return self._mm[off:off + self._ancho_rut]
+
+    def _posicion(self, clave, lo=0):
+        """Primer índice >= lo cuya clave es >= clave (bisect_left)."""
+        hi = self.cantidad
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._clave(mid) < clave:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _leer(self, i):
+        off = TAM_CABECERA + i * self._ancho + self._ancho_rut
+        nombre = self._mm[off:off + self._ancho_nombre].decode("utf-8", errors="replace").rstrip()
+        off += self._ancho_nombre
+        actividad = self._mm[off:off + self._ancho_actividad].decode("utf-8", errors="replace").rstrip()
+        return {"nombre": nombre, "actividad": actividad}
+
+    def buscar(self, rut):
+        """Retorna {nombre, actividad} o None si el RUT no está."""
+        return self.buscar_lote([rut]).get(rut)
+
+    def buscar_lote(self, ruts):
+        """
+        Resuelve varios RUTs en una pasada: se ordenan y cada búsqueda arranca
+        donde terminó la anterior. Retorna {rut: {nombre, actividad}} de los encontrados.
+        """
+        encontrados = {}
+        lo = 0
+        for rut in sorted(set(ruts)):
+            clave = rut.encode("ascii", errors="ignore").ljust(self._ancho_rut, b" ")
+            if len(clave) > self._ancho_rut:
+                continue
+            lo = self._posicion(clave, lo)
+            if lo < self.cantidad and self._clave(lo) == clave:
+                encontrados[rut] = self._leer(lo)
+        return encontrados
+
+
+def sugerir_cuenta(actividad, actividad_cuentas):
+    """
+    Cuenta sugerida según el código de actividad, usando el prefijo más largo
+    presente en actividad_cuentas. Retorna None si no hay coincidencia.
+    """
+    for largo in range(len(actividad), 0, -1):
+        cuenta = actividad_cuentas.get(actividad[:largo])
+        if cuenta is not None:
+            return cuenta
+    return None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Uso: python registro_rut.py <entrada.csv> <salida.rut>")
+        sys.exit(2)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    compilar_registro(sys.argv[1], sys.argv[2])
@@ -1,40 +1,41 @@
 # rules.py — Reglas contables para generación de asientos desde CFE
 
 import logging
-from config import (
-    PROVEEDORES, CUENTA_DEFAULT, TIPO_CFE_PREFIJOS,
-    IVA_22_CUENTA, IVA_10_CUENTA, IVA_OTRO_CUENTA, IVA_TOLERANCIA,
-)
+from clasificacion import PREFIJOS, clasificar_tipo, clasificar_moneda
+from cotizaciones import cotizacion_para
+from motor_reglas import PROVEEDOR, IVA
+from perfiles import obtener_perfil
 
 logger = logging.getLogger(__name__)
 
 
 def _codigo_moneda(moneda_texto):
     """Convierte moneda texto a código numérico. Retorna None si no reconocida."""
-    m = moneda_texto.upper().strip()
-    if m in ("UYU", "$U", "PESOS", "PESO URUGUAYO"):
-        return 0
-    if m in ("USD", "US$", "DÓLAR", "DOLAR"):
-        return 1
-    return None
+    return clasificar_moneda(moneda_texto)[1]
 
 
 def _prefijo_tipo(tipo_cfe):
     """Retorna el prefijo para el concepto según tipo CFE."""
-    tipo_lower = tipo_cfe.lower().strip()
-    return TIPO_CFE_PREFIJOS.get(tipo_lower)
+    cod_tipo = clasificar_tipo(tipo_cfe)[1]
+    return PREFIJOS[cod_tipo] if cod_tipo is not None else None
 
 
-def _cuenta_proveedor(rut, fila_num=None):
-    """Busca la cuenta Debe del proveedor por RUT."""
-    info = PROVEEDORES.get(rut)
+def _cuenta_proveedor(rut, fila_num=None, perfil=None, desconocidos=None):
+    """
+    Busca la cuenta Debe del proveedor por RUT.
+    Si se pasa `desconocidos` (dict rut -> cantidad), acumula allí los RUTs no encontrados.
+    """
+    perfil = obtener_perfil(perfil)
+    info = perfil.proveedores.get(rut)
     if info is None:
+        if desconocidos is not None:
+            desconocidos[rut] = desconocidos.get(rut, 0) + 1
         logger.warning(
             f"RUT {rut} no encontrado en tabla de proveedores"
             + (f" (fila {fila_num})" if fila_num else "")
-            + f". Se usa cuenta por defecto {CUENTA_DEFAULT}."
+            + f". Se usa cuenta por defecto {perfil.cuenta_default}."
         )
-        return CUENTA_DEFAULT
+        return perfil.cuenta_default
     return info["debe"]
 
 
@@ -48,41 +49,17 @@ def _libro(cuenta):
     return "C"
 
 
-def _cuenta_iva(monto_neto, iva):
+def _cuenta_iva(monto_neto, iva, perfil=None):
     """Calcula la cuenta IVA según el porcentaje IVA/Neto."""
+    perfil = obtener_perfil(perfil)
     if monto_neto == 0:
-        return IVA_OTRO_CUENTA
+        return perfil.iva_otro_cuenta
     porcentaje = abs(iva / monto_neto)
-    if abs(porcentaje - 0.22) <= IVA_TOLERANCIA:
-        return IVA_22_CUENTA
-    if abs(porcentaje - 0.10) <= IVA_TOLERANCIA:
-        return IVA_10_CUENTA
-    return IVA_OTRO_CUENTA
-
-
-def _cuenta_cierre_debe(cod_moneda):
-    """Cuenta Debe para cierre: 21111 (UYU) o 21112 (USD)."""
-    return 21111 if cod_moneda == 0 else 21112
-
-
-def _cuenta_cierre_haber(cod_moneda):
-    """Cuenta Haber para cierre: 21111 (UYU) o 21112 (USD)."""
-    return 21111 if cod_moneda == 0 else 21112
-
-
-def _cuenta_banco_debe(cod_moneda):
-    """Cuenta para caso Monto Neto = 0, Debe: 21111/21112."""
-    return 21111 if cod_moneda == 0 else 21112
-
-
-def _cuenta_banco_haber(cod_moneda):
-    """Cuenta para caso Monto Neto = 0, Haber: 11121/11122."""
-    return 11121 if cod_moneda == 0 else 11122
-
-
-def _cuenta_resguardo_haber(cod_moneda):
-    """Cuenta Haber para e-Resguardo: 11111/11112."""
-    return 11111 if cod_moneda == 0 else 11112
+    if abs(porcentaje - 0.22) <= perfil.iva_tolerancia:
+        return perfil.iva_22_cuenta
+    if abs(porcentaje - 0.10) <= perfil.iva_tolerancia:
+        return perfil.iva_10_cuenta
+    return perfil.iva_otro_cuenta
 
 
 def _formato_monto(valor):
@@ -90,9 +67,21 @@ def _formato_monto(valor):
     return f"{valor:.2f}"
 
 
-def _crear_asiento(dia, debe, haber, concepto, ruc, moneda, total, iva, libro):
-    """Crea un dict representando un asiento contable."""
+def _cotizacion(cod_moneda, fecha):
+    """Cotización para CFEs en dólares según el historial; 0 para pesos o sin historial."""
+    if cod_moneda != 1:
+        return 0
+    valor = cotizacion_para(fecha)
+    return f"{valor:.3f}" if valor is not None else 0
+
+
+def _crear_asiento(dia, debe, haber, concepto, ruc, moneda, total, iva, libro, periodo="", cotizacion=0):
+    """
+    Crea un dict representando un asiento contable.
+    `periodo` (YYYY-MM) no se escribe en el TXT; sirve para separar meses.
+    """
     return {
+        "periodo": periodo,
         "dia": dia,
         "debe": debe,
         "haber": haber,
@@ -102,7 +91,7 @@ def _crear_asiento(dia, debe, haber, concepto, ruc, moneda, total, iva, libro):
         "total": _formato_monto(total),
         "codigo_iva": 0,
         "iva": _formato_monto(iva),
-        "cotizacion": 0,
+        "cotizacion": cotizacion,
         "libro": libro,
         "regimen": "",
         "sdocumento": "",
@@ -110,14 +99,18 @@ def _crear_asiento(dia, debe, haber, concepto, ruc, moneda, total, iva, libro):
     }
 
 
-def generar_asientos(registro, fila_num=None):
+def generar_asientos(registro, fila_num=None, perfil=None, desconocidos=None):
     """
     Genera los asientos contables para un registro CFE.
+    `perfil` es un nombre de perfil de cliente o un Perfil; None usa config.py.
+    `desconocidos` (dict opcional) acumula los RUTs sin cuenta de proveedor.
     Retorna una lista de dicts (asientos) o lista vacía si hay error.
     """
+    perfil = obtener_perfil(perfil)
     tipo_cfe = registro["tipo_cfe"]
-    prefijo = _prefijo_tipo(tipo_cfe)
-    if prefijo is None:
+    # reader ya deja los códigos resueltos; los registros armados a mano se clasifican acá
+    cod_tipo = registro["cod_tipo"] if "cod_tipo" in registro else clasificar_tipo(tipo_cfe)[1]
+    if cod_tipo is None:
         logger.error(
             f"Tipo CFE no reconocido: '{tipo_cfe}'"
             + (f" (fila {fila_num})" if fila_num else "")
@@ -125,7 +118,9 @@ def generar_asientos(registro, fila_num=None):
         )
         return []
 
-    cod_moneda = _codigo_moneda(registro["moneda"])
+    prefijo = PREFIJOS[cod_tipo]
+
+    cod_moneda = registro["cod_moneda"] if "cod_moneda" in registro else _codigo_moneda(registro["moneda"])
     if cod_moneda is None:
         logger.error(
             f"Moneda no reconocida: '{registro['moneda']}'"
@@ -134,100 +129,61 @@ def generar_asientos(registro, fila_num=None):
         )
         return []
 
+    regla = perfil.motor.regla(prefijo, cod_moneda, registro)
+    if regla is None:
+        logger.error(
+            f"Sin regla contable para '{tipo_cfe}' en moneda {cod_moneda}"
+            + (f" (fila {fila_num})" if fila_num else "")
+            + ". Se omite."
+        )
+        return []
+
     dia = registro["fecha"].day
     serie = registro["serie"]
     numero = registro["numero"]
     rut = registro["rut_emisor"]
     concepto = f" {prefijo} {serie} {numero}"
 
-    # Determinar tipo de procesamiento
-    tipo_lower = tipo_cfe.lower().strip()
+    return _aplicar_regla(regla, dia, concepto, rut, cod_moneda, registro, fila_num, perfil, desconocidos)
 
-    if tipo_lower == "e-resguardo":
-        return _asientos_resguardo(dia, concepto, rut, cod_moneda, registro, fila_num)
-    else:
-        # e-Factura o Nota de Crédito de e-Factura
-        return _asientos_factura(dia, concepto, rut, cod_moneda, registro, fila_num)
 
+def _aplicar_regla(regla, dia, concepto, rut, cod_moneda, registro, fila_num, perfil, desconocidos=None):
+    """Completa las plantillas de la regla compilada con los datos del registro."""
+    cuenta_prov = libro_prov = None
+    if regla.usa_proveedor:
+        cuenta_prov = _cuenta_proveedor(rut, fila_num, perfil, desconocidos)
+        libro_prov = _libro(cuenta_prov)
+    fecha = registro["fecha"]
+    periodo = f"{fecha.year:04d}-{fecha.month:02d}"
+    cotizacion = _cotizacion(cod_moneda, fecha)
 
-def _asientos_factura(dia, concepto, rut, cod_moneda, registro, fila_num):
-    """Genera asientos para e-Factura o Nota de Crédito."""
-    monto_neto = registro["monto_neto"]
-    iva = registro["iva_ventas"]
-    monto_total = registro["monto_total"]
     asientos = []
+    for debe, haber, campo_total, campo_iva, libro, campo_si in regla.plantillas:
+        if campo_si is not None and not registro[campo_si] > 0:
+            continue
+        iva = registro[campo_iva] if campo_iva is not None else 0.0
+
+        if debe == PROVEEDOR:
+            debe = cuenta_prov
+        elif debe == IVA:
+            debe = _cuenta_iva(registro["monto_neto"], iva, perfil)
+        if haber == PROVEEDOR:
+            haber = cuenta_prov
+        elif haber == IVA:
+            haber = _cuenta_iva(registro["monto_neto"], iva, perfil)
+        if libro == PROVEEDOR:
+            libro = libro_prov
 
-    if monto_neto == 0:
-        # CASO 1C: Monto Neto = 0 (caso especial) → 2 asientos
-        cuenta_debe = _cuenta_banco_debe(cod_moneda)
-        cuenta_haber = _cuenta_banco_haber(cod_moneda)
-
-        asientos.append(_crear_asiento(
-            dia=dia, debe=cuenta_debe, haber="",
-            concepto=concepto, ruc=rut, moneda=cod_moneda,
-            total=monto_total, iva=0.0, libro="C",
-        ))
-        asientos.append(_crear_asiento(
-            dia=dia, debe="", haber=cuenta_haber,
-            concepto=concepto, ruc=rut, moneda=cod_moneda,
-            total=monto_total, iva=0.0, libro="C",
-        ))
-    else:
-        # CASO 1A o 1B
-        cuenta_debe_prov = _cuenta_proveedor(rut, fila_num)
-        libro_prov = _libro(cuenta_debe_prov)
-
-        # Asiento 1: Cuenta del proveedor
-        asientos.append(_crear_asiento(
-            dia=dia, debe=cuenta_debe_prov, haber="",
-            concepto=concepto, ruc=rut, moneda=cod_moneda,
-            total=monto_neto, iva=0.0, libro=libro_prov,
-        ))
-
-        if iva != 0:
-            # CASO 1A: Con IVA → Asiento 2: IVA
-            cuenta_iva = _cuenta_iva(monto_neto, iva)
-            asientos.append(_crear_asiento(
-                dia=dia, debe=cuenta_iva, haber="",
-                concepto=concepto, ruc=rut, moneda=cod_moneda,
-                total=0.0, iva=iva, libro=libro_prov,
-            ))
-
-        # Asiento 3 (o 2 si sin IVA): Cierre contrapartida
-        cuenta_haber_cierre = _cuenta_cierre_haber(cod_moneda)
-        asientos.append(_crear_asiento(
-            dia=dia, debe="", haber=cuenta_haber_cierre,
-            concepto=concepto, ruc=rut, moneda=cod_moneda,
-            total=monto_total, iva=0.0, libro=libro_prov,
-        ))
-
-    return asientos
-
-
-def _asientos_resguardo(dia, concepto, rut, cod_moneda, registro, fila_num):
-    """Genera asientos para e-Resguardo."""
-    monto_ret = registro["monto_ret_per"]
-    monto_cred = registro["monto_cred_fiscal"]
-    cuenta_haber = _cuenta_resguardo_haber(cod_moneda)
-    asientos = []
-
-    if monto_ret > 0:
-        asientos.append(_crear_asiento(
-            dia=dia, debe=11337, haber=cuenta_haber,
-            concepto=concepto, ruc=rut, moneda=cod_moneda,
-            total=monto_ret, iva=0.0, libro="C",
-        ))
-
-    if monto_cred > 0:
         asientos.append(_crear_asiento(
-            dia=dia, debe=11336, haber=cuenta_haber,
+            dia=dia, debe=debe, haber=haber,
             concepto=concepto, ruc=rut, moneda=cod_moneda,
-            total=monto_cred, iva=0.0, libro="C",
+            total=registro[campo_total] if campo_total is not None else 0.0,
+            iva=iva, libro=libro, periodo=periodo, cotizacion=cotizacion,
         ))
 
-    if not asientos:
+    if not asientos and regla.aviso_sin_asientos:
         logger.warning(
-            f"e-Resguardo sin montos Ret/Per ni Cred. Fiscal"
+            regla.aviso_sin_asientos
             + (f" (fila {fila_num})" if fila_num else "")
         )
 
@@ -1,13 +1,36 @@
 # test_cases.py — Verificación contra los TXT de ejemplo
 
+import copy
+import hashlib
+import json
+import threading
 import sys
 import os
+import sqlite3
+import tempfile
 from datetime import datetime
 
 sys.path.insert(0, os.path.dirname(__file__))
 
+import perfiles
+import proveedores
+from config import REGLAS_ASIENTOS
+from motor_reglas import compilar_reglas
+import almacen
+import columnar
+import conciliar
+import conversor
+import lote
+import cotizaciones
+from clasificacion import PREFIJOS, clasificar_moneda, clasificar_tipo
+from consolidacion import consolidar_asientos
+from estadisticas import Estadisticas
+from validacion import validar_registros
+import registro_rut
+from registro_rut import RegistroRUT, compilar_registro, sugerir_cuenta
 from rules import generar_asientos
-from writer import HEADER
+import writer
+from writer import HEADER, escribir_txt
 
 def _asiento_a_linea(a):
     return (
@@ -185,6 +208,802 @@ def test_txt4():
     return ok
 
 
+def test_proveedores_csv():
+    """Tabla de proveedores externa en CSV: búsqueda y recarga por mtime"""
+    registro = {
+        "fecha": datetime(2026, 1, 14),
+        "tipo_cfe": "e-Factura",
+        "serie": "A",
+        "numero": "1",
+        "rut_emisor": "999999999999",
+        "moneda": "UYU",
+        "monto_neto": 100.0,
+        "iva_ventas": 0.0,
+        "monto_total": 100.0,
+        "monto_ret_per": 0.0,
+        "monto_cred_fiscal": 0.0,
+    }
+    intervalo = proveedores.INTERVALO_REVISION
+    proveedores.INTERVALO_REVISION = 0
+    print("=== Proveedores desde CSV ===")
+    try:
+        with tempfile.TemporaryDirectory() as carpeta:
+            ruta = os.path.join(carpeta, "proveedores.csv")
+            with open(ruta, "w", encoding="utf-8") as f:
+                f.write("rut;nombre;debe\n999999999999;PRUEBA SA;5109\n")
+            proveedores.configurar(ruta)
+            assert generar_asientos(registro)[0]["debe"] == 5109
+
+            with open(ruta, "w", encoding="utf-8") as f:
+                f.write("rut;nombre;debe\n999999999999;PRUEBA SA;11411\n")
+            os.utime(ruta, ns=(0, 10**18))
+            assert generar_asientos(registro)[0]["debe"] == 11411
+            # La caché es JSON y se usa al volver a cargar la misma versión
+            with open(ruta + ".cache", "r", encoding="utf-8") as f:
+                assert json.load(f)["tabla"]["999999999999"]["debe"] == 11411
+            proveedores.configurar(ruta)
+            assert generar_asientos(registro)[0]["debe"] == 11411
+
+            # Rutas con caracteres especiales de URI
+            ruta_db = os.path.join(carpeta, "prov #1 100%.db")
+            con = sqlite3.connect(ruta_db)
+            con.execute("CREATE TABLE proveedores (rut TEXT, nombre TEXT, debe INTEGER)")
+            con.execute("INSERT INTO proveedores VALUES ('999999999999', 'PRUEBA SA', 5110)")
+            con.commit()
+            con.close()
+            proveedores.configurar(ruta_db)
+            assert generar_asientos(registro)[0]["debe"] == 5110
+    finally:
+        proveedores.configurar(None)
+        proveedores.INTERVALO_REVISION = intervalo
+    print("  Carga y recarga: OK")
+    return True
+
+
+def test_perfil_cliente():
+    """Perfil de cliente: tabla, cuenta por defecto e IVA propios, y caché LRU"""
+    registro = {
+        "fecha": datetime(2026, 1, 14),
+        "tipo_cfe": "e-Factura",
+        "serie": "A",
+        "numero": "1",
+        "rut_emisor": "999999999999",
+        "moneda": "UYU",
+        "monto_neto": 100.0,
+        "iva_ventas": 22.0,
+        "monto_total": 122.0,
+        "monto_ret_per": 0.0,
+        "monto_cred_fiscal": 0.0,
+    }
+    print("=== Perfil de cliente ===")
+    anterior = os.environ.get("CFE_PERFILES")
+    try:
+        with tempfile.TemporaryDirectory() as carpeta:
+            os.environ["CFE_PERFILES"] = carpeta
+            with open(os.path.join(carpeta, "cliente_x.json"), "w", encoding="utf-8") as f:
+                f.write('{"proveedores": {"999999999999": {"nombre": "X", "debe": 5105}},'
+                        ' "cuenta_default": 88888, "iva_22_cuenta": 11300}')
+            asientos = generar_asientos(registro, perfil="cliente_x")
+            assert asientos[0]["debe"] == 5105
+            assert asientos[1]["debe"] == 11300
+            assert perfiles.cargar_perfil("cliente_x") is perfiles.cargar_perfil("cliente_x")
+
+            otro = dict(registro, rut_emisor="000000000000")
+            assert generar_asientos(otro, perfil="cliente_x")[0]["debe"] == 88888
+            assert generar_asientos(registro)[0]["debe"] == 99999
+    finally:
+        if anterior is None:
+            os.environ.pop("CFE_PERFILES", None)
+        else:
+            os.environ["CFE_PERFILES"] = anterior
+    print("  Cuentas del perfil: OK")
+    return True
+
+
+def test_registro_rut():
+    """Registro nacional de RUT compilado: búsqueda binaria por lote sobre mmap"""
+    print("=== Registro RUT ===")
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta_csv = os.path.join(carpeta, "registro.csv")
+        with open(ruta_csv, "w", encoding="utf-8") as f:
+            f.write("rut,nombre,actividad\n")
+            for i in range(1000, 0, -1):
+                f.write(f"{i:012d},EMPRESA {i},{4500 + i % 3}\n")
+        ruta_rut = os.path.join(carpeta, "registro.rut")
+        assert compilar_registro(ruta_csv, ruta_rut) == 1000
+
+        with RegistroRUT(ruta_rut) as registro:
+            encontrados = registro.buscar_lote(["000000000001", "000000000500", "000000001000", "999999999999"])
+            assert set(encontrados) == {"000000000001", "000000000500", "000000001000"}
+            assert encontrados["000000000500"] == {"nombre": "EMPRESA 500", "actividad": "4502"}
+            assert registro.buscar("000000001001") is None
+
+        # Varias tandas en disco y RUT repetido en tandas distintas: gana la última fila
+        with open(ruta_csv, "a", encoding="utf-8") as f:
+            f.write("000000000500,EMPRESA NUEVA,4700\n")
+        tanda = registro_rut.TANDA_COMPILACION
+        registro_rut.TANDA_COMPILACION = 64
+        try:
+            assert compilar_registro(ruta_csv, ruta_rut) == 1000
+        finally:
+            registro_rut.TANDA_COMPILACION = tanda
+        with RegistroRUT(ruta_rut) as registro:
+            assert registro.buscar("000000000500") == {"nombre": "EMPRESA NUEVA", "actividad": "4700"}
+            assert registro.buscar("000000000501") == {"nombre": "EMPRESA 501", "actividad": "4500"}
+            assert registro.buscar_lote(["000000000001", "000000001000"]).keys() == {"000000000001", "000000001000"}
+
+    assert sugerir_cuenta("4502", {"45": 5107, "4502": 5117}) == 5117
+    assert sugerir_cuenta("4700", {"45": 5107}) is None
+    print("  Búsqueda por lote: OK")
+    return True
+
+
+def test_reglas_declarativas():
+    """Reglas declarativas: un plan de cuentas distinto sin tocar rules.py"""
+    print("=== Reglas declarativas ===")
+    reglas = copy.deepcopy(REGLAS_ASIENTOS)
+    neto_cero = reglas[0]["casos"][0]
+    neto_cero["asientos"][1]["haber"] = [11190, 11191]
+    perfil = perfiles.Perfil(nombre="plan_b", reglas=reglas)
+
+    registro = {
+        "fecha": datetime(2026, 1, 15),
+        "tipo_cfe": "e-Factura",
+        "serie": "A",
+        "numero": "41836",
+        "rut_emisor": "150282390017",
+        "moneda": "USD",
+        "monto_neto": 0.0,
+        "iva_ventas": 0.0,
+        "monto_total": 36255.0,
+        "monto_ret_per": 0.0,
+        "monto_cred_fiscal": 0.0,
+    }
+    asientos = generar_asientos(registro, perfil=perfil)
+    assert [(a["debe"], a["haber"]) for a in asientos] == [(21112, ""), ("", 11191)]
+
+    neto_cero["cuando"] = {"monto_neto": "negativo"}
+    try:
+        compilar_reglas(reglas)
+        assert False, "Debió rechazar la condición desconocida"
+    except ValueError:
+        pass
+    print("  Plan de cuentas alternativo: OK")
+    return True
+
+
+def test_validacion():
+    """Validación en bloque: total inconsistente, IVA fuera de rango y duplicados"""
+    print("=== Validación ===")
+    base = {
+        "fecha": datetime(2026, 1, 14),
+        "tipo_cfe": "e-Factura",
+        "serie": "A",
+        "numero": "1",
+        "rut_emisor": "080128330013",
+        "moneda": "UYU",
+        "monto_neto": 100.0,
+        "iva_ventas": 22.0,
+        "monto_total": 122.0,
+        "monto_ret_per": 0.0,
+        "monto_cred_fiscal": 0.0,
+    }
+    registros = [
+        base,
+        dict(base, numero="2", monto_total=130.0),
+        dict(base, numero="3", iva_ventas=5.0, monto_total=105.0),
+        dict(base),
+        dict(base, numero="5", monto_neto=0.0, iva_ventas=0.0, monto_total=500.0),
+    ]
+    problemas = validar_registros(registros)
+    assert [(p["fila"], p["tipo"]) for p in problemas] == [
+        (2, "total_inconsistente"), (3, "iva_fuera_de_rango"), (4, "cfe_duplicado"),
+    ]
+    print("  Problemas detectados: OK")
+    return True
+
+
+def test_consolidacion():
+    """Modo consolidado: mismas cuentas/día/RUC se suman en una línea"""
+    print("=== Consolidación ===")
+    registro = {
+        "fecha": datetime(2026, 1, 9),
+        "tipo_cfe": "e-Factura",
+        "serie": "A",
+        "numero": "1",
+        "rut_emisor": "150015190016",
+        "moneda": "UYU",
+        "monto_neto": 0.1,
+        "iva_ventas": 0.0,
+        "monto_total": 0.1,
+        "monto_ret_per": 0.0,
+        "monto_cred_fiscal": 0.0,
+    }
+    asientos = []
+    for numero in range(1, 4):
+        asientos.extend(generar_asientos(dict(registro, numero=str(numero))))
+    asientos.extend(generar_asientos(dict(registro, numero="4", fecha=datetime(2026, 1, 10))))
+
+    lineas = [_asiento_a_linea(a) for a in consolidar_asientos(asientos)]
+    assert lineas == [
+        "9,5105,, CONS 1 x3,150015190016,0,0.30,0,0.00,0,E,,,0",
+        "9,,21111, CONS 2 x3,150015190016,0,0.30,0,0.00,0,E,,,0",
+        "10,5105,, CONS 3 x1,150015190016,0,0.10,0,0.00,0,E,,,0",
+        "10,,21111, CONS 4 x1,150015190016,0,0.10,0,0.00,0,E,,,0",
+    ], lineas
+    print("  Agregación: OK")
+    return True
+
+
+def test_cotizacion_usd():
+    """Cotización para CFEs en USD: mismo día o último día hábil anterior"""
+    print("=== Cotización USD ===")
+    registro = {
+        "fecha": datetime(2026, 1, 10),
+        "tipo_cfe": "e-Factura",
+        "serie": "A",
+        "numero": "1",
+        "rut_emisor": "080128330013",
+        "moneda": "USD",
+        "monto_neto": 100.0,
+        "iva_ventas": 0.0,
+        "monto_total": 100.0,
+        "monto_ret_per": 0.0,
+        "monto_cred_fiscal": 0.0,
+    }
+    try:
+        with tempfile.TemporaryDirectory() as carpeta:
+            ruta = os.path.join(carpeta, "cotizaciones.csv")
+            with open(ruta, "w", encoding="utf-8") as f:
+                f.write("fecha;cotizacion\n08/01/2026;39,1\n09/01/2026;39,25\n12/01/2026;39,4\n")
+            cotizaciones.configurar(ruta)
+
+            # Sábado 10/01 -> viernes 09/01
+            assert {a["cotizacion"] for a in generar_asientos(registro)} == {"39.250"}
+            assert generar_asientos(dict(registro, fecha=datetime(2026, 1, 12)))[0]["cotizacion"] == "39.400"
+            assert generar_asientos(dict(registro, moneda="UYU"))[0]["cotizacion"] == 0
+            assert generar_asientos(dict(registro, fecha=datetime(2025, 12, 1)))[0]["cotizacion"] == 0
+    finally:
+        cotizaciones.configurar(None)
+    print("  Búsqueda por fecha: OK")
+    return True
+
+
+def test_conciliacion():
+    """Conciliación TXT vs CFE: faltantes, sobrantes y diferencias de importe"""
+    print("=== Conciliación ===")
+    base = {
+        "fecha": datetime(2026, 1, 14),
+        "tipo_cfe": "e-Factura",
+        "serie": "A",
+        "numero": "1",
+        "rut_emisor": "080128330013",
+        "moneda": "UYU",
+        "monto_neto": 100.0,
+        "iva_ventas": 22.0,
+        "monto_total": 122.0,
+        "monto_ret_per": 0.0,
+        "monto_cred_fiscal": 0.0,
+    }
+    registros = [base, dict(base, numero="2"), dict(base, numero="3")]
+    asientos = generar_asientos(registros[0]) + generar_asientos(dict(registros[1], monto_total=120.0))
+    asientos += generar_asientos(dict(base, numero="9"))
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta_txt = os.path.join(carpeta, "salida.txt")
+        escribir_txt(asientos, ruta_txt)
+        diferencias = conciliar.conciliar(registros, [ruta_txt])
+
+    resultado = sorted((d["problema"], d["clave"][2]) for d in diferencias)
+    assert resultado == [
+        (conciliar.DIFERENCIA, "2"), (conciliar.FALTANTE, "3"), (conciliar.SOBRANTE, "9"),
+    ], resultado
+    print("  Hash-join: OK")
+    return True
+
+
+def test_columnar():
+    """Formato columnar .cfecol: ida y vuelta sin pérdida y lectura desde stream"""
+    print("=== Columnar ===")
+    from clasificacion import clasificar_moneda, clasificar_tipo
+
+    registros = []
+    for i, (tipo, moneda) in enumerate([("e-Factura", "UYU"), ("e-Ticket", "US$"), ("Nota de Crédito de e-Factura", "EUR")]):
+        tipo_cfe, cod_tipo = clasificar_tipo(tipo)
+        moneda, cod_moneda = clasificar_moneda(moneda)
+        registros.append({
+            "fecha": datetime(2026, 1, 14 + i),
+            "tipo_cfe": tipo_cfe,
+            "cod_tipo": cod_tipo,
+            "serie": "A",
+            "numero": str(100 + i),
+            "rut_emisor": "080128330013",
+            "moneda": moneda,
+            "cod_moneda": cod_moneda,
+            "monto_neto": 100.1 * i,
+            "iva_ventas": 22.02,
+            "monto_total": -0.5,
+            "monto_ret_per": 0.0,
+            "monto_cred_fiscal": 1e-3,
+        })
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, "datos.cfecol")
+        assert columnar.escribir_columnar(registros, ruta) == 3
+        assert columnar.leer_columnar(ruta) == registros
+        with open(ruta, "rb") as f:
+            assert columnar.leer_columnar(f) == registros
+        with columnar.ArchivoColumnar(ruta) as archivo:
+            assert archivo.columna("monto_total").tolist() == [-0.5] * 3
+            assert archivo.textos().count("A") == 1
+
+        # Un CFECOL1 trae códigos de una tabla vieja: se ignoran y se recalculan
+        with open(ruta, "rb") as f:
+            datos = f.read()
+        fin_columnas = columnar.TAM_CABECERA + 3 * (5 * 8 + 4 + 5 * 4)
+        codigos_viejos = bytes([2, 2, 2, 1, 1, 1])
+        ruta_v1 = os.path.join(carpeta, "viejo.cfecol")
+        with open(ruta_v1, "wb") as f:
+            f.write(columnar.MAGIC_V1 + datos[len(columnar.MAGIC):fin_columnas] + codigos_viejos + datos[fin_columnas:])
+        assert columnar.leer_columnar(ruta_v1) == registros
+    print("  Ida y vuelta: OK")
+    return True
+
+
+def test_lote_reanudable():
+    """Lote reanudable: omite lo convertido, rehace lo modificado y recupera el journal"""
+    print("=== Lote reanudable ===")
+    registro = {
+        "fecha": datetime(2026, 1, 14), "tipo_cfe": "e-Factura", "serie": "A", "numero": "1",
+        "rut_emisor": "080128330013", "moneda": "UYU", "monto_neto": 100.0, "iva_ventas": 22.0,
+        "monto_total": 122.0, "monto_ret_per": 0.0, "monto_cred_fiscal": 0.0,
+    }
+    with tempfile.TemporaryDirectory() as carpeta:
+        entrada = os.path.join(carpeta, "entrada")
+        salida = os.path.join(carpeta, "salida")
+        os.makedirs(entrada)
+        for nombre in ("enero", "febrero"):
+            columnar.escribir_columnar([registro], os.path.join(entrada, f"{nombre}.cfecol"))
+        rutas = lote.listar_entradas(entrada)
+
+        assert lote.convertir_lote(rutas, salida)["convertidos"] == 2
+        assert lote.convertir_lote(rutas, salida, reanudar=True)["omitidos"] == 2
+
+        columnar.escribir_columnar([registro, dict(registro, numero="2")], rutas[0])
+        r = lote.convertir_lote(rutas, salida, reanudar=True)
+        assert (r["convertidos"], r["omitidos"]) == (1, 1), r
+
+        # Corte antes de guardar el manifiesto: la entrada sobrevive en el journal
+        estado = lote.Lote(salida, reanudar=True)
+        estado.registrar(rutas[1], {"estado": lote.ERROR, "error": "corte"})
+        assert lote.Lote(salida, reanudar=True).entradas[rutas[1]]["estado"] == lote.ERROR
+        assert lote.convertir_lote(rutas, salida, reanudar=True)["convertidos"] == 1
+
+        # Mismo nombre con distinta extensión: cada uno con su TXT
+        mezcla = os.path.join(carpeta, "mezcla")
+        os.makedirs(mezcla)
+        columnar.escribir_columnar([registro], os.path.join(mezcla, "marzo.cfecol"))
+        with open(os.path.join(mezcla, "marzo.csv"), "w", encoding="utf-8") as f:
+            f.write("Fecha;Tipo CFE;Serie;Número;RUT Emisor;Moneda;Monto Neto;IVA Ventas;Monto Total\n")
+            f.write("14/01/2026;e-Factura;A;2;080128330013;UYU;100,00;22,00;122,00\n")
+        rutas = lote.listar_entradas(mezcla)
+        salida = os.path.join(carpeta, "salida_mezcla")
+        assert lote.convertir_lote(rutas, salida)["convertidos"] == 2
+        assert os.path.isfile(os.path.join(salida, "marzo_cfecol.txt"))
+        assert os.path.isfile(os.path.join(salida, "marzo_csv.txt"))
+        assert lote.convertir_lote(rutas, salida, reanudar=True)["omitidos"] == 2
+        # Salida en la misma carpeta: los reportes .csv generados no son entradas
+        assert lote.convertir_lote(rutas, mezcla)["convertidos"] == 2
+        assert any(f.endswith("_estadisticas.csv") for f in os.listdir(mezcla))
+        assert lote.listar_entradas(mezcla) == rutas
+        r = lote.convertir_lote(lote.listar_entradas(mezcla), mezcla, reanudar=True)
+        assert (r["omitidos"], r["errores"]) == (2, 0), r
+        nombres = lote.nombres_salida(["/x/Abril.xlsx", "/x/abril.csv", "/x/abril_csv.cfecol"])
+        assert list(nombres.values()) == ["Abril_xlsx", "abril_csv", None], nombres
+    print("  Reanudación: OK")
+    return True
+
+
+def test_sondeo_hojas():
+    """Sondeo de hojas: gana la hoja con más columnas reconocidas, sin leerlas completas"""
+    print("=== Sondeo de hojas ===")
+    from reader import _iterar_hojas, _sondear_hojas
+
+    encabezado = ["Fecha Comprobante", "Tipo CFE", "Serie", "Número", "RUT Emisor", "Moneda"]
+    hojas = {
+        "Resumen": [["Total", 100]] * 1000,
+        "Parcial": [["CFEs recibidos"], encabezado],
+        "CFE": [["CFEs recibidos"], encabezado + ["Monto Neto", "Monto Total"]],
+        "Profunda": [["nota"]] * 100 + [encabezado],
+    }
+    leidas = {}
+
+    def filas_de(nombre):
+        for i, fila in enumerate(hojas[nombre]):
+            leidas[nombre] = i + 1
+            yield fila
+
+    candidatas, resto = _sondear_hojas(list(hojas), filas_de)
+    assert candidatas == ["CFE", "Parcial"], candidatas
+    assert resto == ["Resumen", "Profunda"], resto
+    assert leidas["Resumen"] <= 30 and leidas["Profunda"] <= 30, leidas
+
+    # Las hojas que pierden el sondeo se liberan (xlrd: unload_sheet)
+    descartadas = []
+    list(_iterar_hojas(list(hojas), filas_de, str, descartar=descartadas.extend))
+    assert descartadas == ["Resumen", "Profunda"], descartadas
+    print("  Ranking: OK")
+    return True
+
+
+def test_vista_previa_limite():
+    """Vista previa: el parseo corta a los N registros aun con filas infinitas"""
+    print("=== Vista previa ===")
+    from itertools import count
+    from reader import _procesar_filas
+
+    def filas():
+        yield ["Fecha", "Tipo CFE", "Serie", "Número", "RUT Emisor", "Moneda", "Monto Total"]
+        for i in count(1):
+            yield ["14/01/2026", "e-Factura", "A", i, "080128330013", "UYU", 122.0]
+
+    encabezado = {}
+    registros = _procesar_filas(filas(), limite=3, encabezado=encabezado)
+    assert [r["numero"] for r in registros] == ["1", "2", "3"]
+    assert encabezado["fila"] == 1 and encabezado["columnas"]["numero"] == 3, encabezado
+
+    # CSV: sin hoja, el texto no muestra una línea de hoja vacía
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, "portal.csv")
+        with open(ruta, "w", encoding="utf-8") as f:
+            f.write("Fecha;Tipo CFE;Serie;Número;RUT Emisor;Moneda;Monto Total\n")
+            f.write("14/01/2026;e-Factura;A;1;080128330013;UYU;122,00\n")
+        texto = conversor.formatear_vista_previa(conversor.previsualizar(ruta, 5))
+    assert texto.startswith("Encabezado en fila 1:") and "Hoja" not in texto, texto
+    print("  Corte en N filas: OK")
+    return True
+
+
+def test_lectura_csv():
+    """CSV del portal: separador ';', coma decimal y cp1252 detectados solos"""
+    print("=== Lectura CSV ===")
+    from reader import leer_excel
+
+    contenido = (
+        "Listado de CFEs recibidos\r\n"
+        "Fecha;Tipo CFE;Serie;Número;RUT Emisor;Moneda;Monto Neto;IVA Ventas;Monto Total\r\n"
+        "14/01/2026;Nota de Crédito de e-Factura;A;10779;080128330013;UYU;57373,61;4616,39;61990,00\r\n"
+        ";;;;;;;;\r\n"
+        "15/01/2026;e-Factura;B;10780;213596650013;USD;100,5;22,11;122,61\r\n"
+    ).encode("cp1252")
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, "portal.csv")
+        with open(ruta, "wb") as f:
+            f.write(contenido)
+        registros = leer_excel(ruta)
+        with open(ruta, "rb") as f:
+            assert leer_excel(f) == registros
+
+    assert len(registros) == 2, registros
+    assert registros[0]["tipo_cfe"] == "Nota de Crédito de e-Factura"
+    assert registros[0]["numero"] == "10779" and registros[0]["monto_neto"] == 57373.61
+    assert registros[1]["fecha"] == datetime(2026, 1, 15) and registros[1]["monto_total"] == 122.61
+
+    # Separador de miles del portal y montos ilegibles (la fila se omite, no se toma como 0)
+    from reader import _parse_monto
+
+    assert _parse_monto("1.234,56") == 1234.56 and _parse_monto("1.234.567,8") == 1234567.8
+    assert _parse_monto("1,234.56") == 1234.56 and _parse_monto("-57373,61") == -57373.61
+    assert _parse_monto("") == 0.0 and _parse_monto(" - ") == 0.0
+    # Punto solo con tres dígitos: de miles si el archivo usa coma decimal
+    assert _parse_monto("1.234", ",") == 1234.0 and _parse_monto("-1.234", ",") == -1234.0
+    assert _parse_monto("1.234") == 1.234 and _parse_monto("1.5", ",") == 1.5
+    contenido = (
+        "Fecha;Tipo CFE;Serie;Número;RUT Emisor;Moneda;Monto Neto;IVA Ventas;Monto Total\r\n"
+        "14/01/2026;e-Factura;A;1;080128330013;UYU;1.234,56;271,60;1.506,16\r\n"
+        "14/01/2026;e-Factura;A;2;080128330013;UYU;12x;0;12\r\n"
+        "14/01/2026;e-Factura;A;3;080128330013;UYU;1.000;220;1.220\r\n"
+    ).encode("cp1252")
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta = os.path.join(carpeta, "miles.csv")
+        with open(ruta, "wb") as f:
+            f.write(contenido)
+        registros = leer_excel(ruta)
+    assert [(r["numero"], r["monto_neto"], r["monto_total"]) for r in registros] == [
+        ("1", 1234.56, 1506.16), ("3", 1000.0, 1220.0),
+    ], registros
+    print("  Separador y codificación: OK")
+    return True
+
+
+def test_estadisticas():
+    """Estadísticas en una pasada: debe = haber por moneda e IVA separado por cuenta"""
+    print("=== Estadísticas ===")
+    base = {
+        "fecha": datetime(2026, 1, 14), "tipo_cfe": "e-Factura", "serie": "A", "numero": "1",
+        "rut_emisor": "080128330013", "moneda": "UYU", "monto_neto": 100.0, "iva_ventas": 22.0,
+        "monto_total": 122.0, "monto_ret_per": 0.0, "monto_cred_fiscal": 0.0,
+    }
+    registros = [
+        base,
+        dict(base, numero="2", monto_neto=200.0, iva_ventas=20.0, monto_total=220.0),
+        dict(base, numero="3", moneda="USD", fecha=datetime(2026, 1, 15)),
+    ]
+    estadisticas = Estadisticas(perfiles.obtener_perfil())
+    asientos = list(estadisticas.contabilizar(a for r in registros for a in generar_asientos(r)))
+    resumen = estadisticas.resumen()
+
+    assert resumen["asientos"] == len(asientos) == 9
+    for g in resumen["por_moneda"]:
+        assert g["debe"] == g["haber"], g
+    iva = {(g["clave"], g["moneda"]): g["iva"] for g in resumen["iva"]}
+    assert iva == {("iva_22", "UYU"): 22.0, ("iva_10", "UYU"): 20.0, ("iva_22", "USD"): 22.0}, iva
+    dias = [(g["clave"], g["moneda"]) for g in resumen["por_dia"]]
+    assert dias == [("2026-01-14", "UYU"), ("2026-01-15", "USD")], dias
+    print("  Totales: OK")
+    return True
+
+
+def test_memoria_acotada():
+    """Memoria acotada: mismo TXT por ventanas y misma consolidación con tandas en disco"""
+    print("=== Memoria acotada ===")
+    base = {
+        "fecha": datetime(2026, 1, 14), "tipo_cfe": "e-Factura", "serie": "A", "numero": "1",
+        "rut_emisor": "080128330013", "moneda": "UYU", "monto_neto": 100.0, "iva_ventas": 22.0,
+        "monto_total": 122.0, "monto_ret_per": 0.0, "monto_cred_fiscal": 0.0,
+    }
+    # 2500 CFEs: más de dos ventanas mínimas, con un duplicado entre ventanas
+    registros = [
+        dict(base, numero=str(i), fecha=datetime(2026, 1, 1 + i % 28), monto_neto=float(i), monto_total=i + 22.0)
+        for i in range(2500)
+    ]
+    registros.append(dict(registros[3]))
+
+    def convertir(carpeta, **opciones):
+        ruta = os.path.join(carpeta, "x.txt")
+        resumen = conversor.convertir_archivo(entrada, ruta, **opciones)
+        with open(ruta, "r", encoding="utf-8") as f:
+            return resumen, f.read().split("\n")
+
+    def sin_numero_grupo(lineas):
+        return sorted(l.split(" CONS ")[0] + l.split(" x")[-1] for l in lineas)
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        entrada = os.path.join(carpeta, "cfe.cfecol")
+        columnar.escribir_columnar(registros, entrada)
+        # Carpetas de salida sin crear: la conversión las crea antes del primer reporte
+        r1, txt1 = convertir(os.path.join(carpeta, "normal"))
+        r2, txt2 = convertir(os.path.join(carpeta, "acotado"), max_memoria=1)
+        assert txt1 == txt2
+        assert r1["problemas"] == r2["problemas"] >= 1, (r1, r2)
+        assert (r1["cfes"], r1["asientos"]) == (r2["cfes"], r2["asientos"])
+
+        r3, txt3 = convertir(os.path.join(carpeta, "normal_cons"), consolidar=True)
+        r4, txt4 = convertir(os.path.join(carpeta, "acotado_cons"), consolidar=True, max_memoria=1)
+        assert r3["lineas"] == r4["lineas"] < r4["asientos"]
+        # El orden y la numeración de grupos cambian; el contenido no
+        assert sin_numero_grupo(txt3) == sin_numero_grupo(txt4)
+    print("  Ventanas y tandas: OK")
+    return True
+
+
+def test_almacen():
+    """Almacén: objetos deduplicados por contenido y conversión restaurada por (cliente, período, nombre)"""
+    print("=== Almacén ===")
+    with tempfile.TemporaryDirectory() as carpeta:
+        entrada = os.path.join(carpeta, "enero.xlsx")
+        copia = os.path.join(carpeta, "enero_reenviado.xlsx")
+        txt = os.path.join(carpeta, "enero.txt")
+        for ruta, contenido in ((entrada, b"CFE" * 1000), (copia, b"CFE" * 1000), (txt, HEADER.encode("utf-8"))):
+            with open(ruta, "wb") as f:
+                f.write(contenido)
+
+        def objetos():
+            return sum(len(archivos) for _, _, archivos in os.walk(os.path.join(carpeta, "almacen", almacen.OBJETOS)))
+
+        with almacen.Almacen(os.path.join(carpeta, "almacen")) as a:
+            conversion = a.archivar_conversion(entrada, [txt], "acme", "2026-01")
+            a.archivar_conversion(entrada, [txt], "acme", "2026-01")
+            assert objetos() == 2 and len(a.buscar("acme")) == 2
+            # Reenvío idéntico con otro nombre: solo filas nuevas en el índice
+            assert a.archivar_conversion(copia, [txt], "acme", "2026-01") != conversion
+            assert objetos() == 2 and len(a.buscar("acme", "2026-01")) == 4
+
+            restaurados = a.restaurar_conversion("acme", "2026-01", "enero.txt", os.path.join(carpeta, "restaurado"))
+            assert sorted(os.path.basename(r) for r in restaurados) == ["enero.txt", "enero_reenviado.xlsx"]
+            with open(os.path.join(carpeta, "restaurado", "enero_reenviado.xlsx"), "rb") as f:
+                assert f.read() == b"CFE" * 1000
+        assert almacen.periodo_de(["2026-01", "2026-03"]) == "2026-01_2026-03"
+
+        # Lote con un fallo al archivar: cuenta como error y al reanudar solo se archiva
+        registro = {
+            "fecha": datetime(2026, 1, 14), "tipo_cfe": "e-Factura", "serie": "A", "numero": "1",
+            "rut_emisor": "080128330013", "moneda": "UYU", "monto_neto": 100.0, "iva_ventas": 22.0,
+            "monto_total": 122.0, "monto_ret_per": 0.0, "monto_cred_fiscal": 0.0,
+        }
+        lote_entrada = os.path.join(carpeta, "lote")
+        os.makedirs(lote_entrada)
+        columnar.escribir_columnar([registro], os.path.join(lote_entrada, "enero.cfecol"))
+        rutas = lote.listar_entradas(lote_entrada)
+        salida = os.path.join(carpeta, "lote_salida")
+        with almacen.Almacen(os.path.join(carpeta, "almacen_lote")) as a:
+            archivar = a.archivar_conversion
+
+            def falla(*args, **kwargs):
+                raise OSError("disco lleno")
+
+            a.archivar_conversion = falla
+            r = lote.convertir_lote(rutas, salida, almacen=a, cliente="acme")
+            assert (r["convertidos"], r["errores"]) == (1, 1), r
+            assert lote.Lote(salida, reanudar=True).entradas[rutas[0]]["archivado"] is False
+
+            a.archivar_conversion = archivar
+            r = lote.convertir_lote(rutas, salida, reanudar=True, almacen=a, cliente="acme")
+            assert (r["convertidos"], r["omitidos"], r["errores"]) == (0, 1, 0), r
+            assert lote.Lote(salida, reanudar=True).entradas[rutas[0]]["archivado"] is True
+            assert [f["rol"] for f in a.buscar("acme", "2026-01", "enero.cfecol")] == ["entrada"]
+            r = lote.convertir_lote(rutas, salida, reanudar=True, almacen=a, cliente="acme")
+            assert (r["omitidos"], r["errores"]) == (1, 0), r
+            assert len(a.buscar("acme")) == 2
+    print("  Deduplicación y restauración: OK")
+    return True
+
+
+def test_clasificacion():
+    """Clasificación: tildes, mayúsculas y espacios; valores desconocidos; caché por valor"""
+    print("=== Clasificación ===")
+    texto, codigo = clasificar_tipo("Nota de Credito de e-Factura")
+    assert PREFIJOS[codigo] == "NC"
+    assert clasificar_tipo("  NOTA DE CRÉDITO DE E-FACTURA ")[1] == codigo
+    assert PREFIJOS[clasificar_tipo("e-Factura")[1]] == "e-F"
+    assert clasificar_moneda(" usd ") == ("usd", 1)
+    assert clasificar_moneda("US$")[1] == 1
+    assert clasificar_moneda("Dólar")[1] == clasificar_moneda("DOLAR")[1] == 1
+    assert clasificar_moneda("$U")[1] == 0
+
+    # Desconocidos: texto limpio y sin código
+    assert clasificar_tipo(" e-Ticket ") == ("e-Ticket", None)
+    assert clasificar_moneda("EUR") == ("EUR", None)
+    assert clasificar_tipo(None) == ("", None)
+
+    # Mismo valor crudo: mismo resultado cacheado y texto internado
+    valor = "".join(["e-Fac", "tura "])
+    primero = clasificar_tipo(valor)
+    assert clasificar_tipo(valor) is primero
+    assert clasificar_tipo("".join(["e-Fac", "tura "]))[0] is primero[0]
+    print("  Normalización y caché: OK")
+    return True
+
+
+def test_txt_particionado():
+    """TXT particionado: cada asiento en su (mes, libro), manifiesto exacto e hilos acotados"""
+    print("=== TXT particionado ===")
+    base = {
+        "tipo_cfe": "e-Factura", "serie": "A", "rut_emisor": "080128330013", "moneda": "UYU",
+        "monto_neto": 100.0, "iva_ventas": 22.0, "monto_total": 122.0, "monto_ret_per": 0.0, "monto_cred_fiscal": 0.0,
+    }
+    # 36 meses: más particiones que hilos escritores
+    registros = [
+        dict(base, numero=str(i), fecha=datetime(2024 + i % 36 // 12, 1 + i % 12, 1 + i % 28))
+        for i in range(720)
+    ]
+    asientos = [a for r in registros for a in generar_asientos(r)]
+    esperado = {}
+    for a in asientos:
+        esperado.setdefault(f"x_{a['periodo']}_{a['libro']}.txt", []).append(writer._asiento_a_linea(a))
+
+    hilos = [threading.active_count()]
+
+    def contando():
+        for a in asientos:
+            hilos.append(threading.active_count())
+            yield a
+
+    lineas_por_bloque = writer.LINEAS_POR_BLOQUE
+    writer.LINEAS_POR_BLOQUE = 7  # varios bloques por partición
+    try:
+        with tempfile.TemporaryDirectory() as carpeta:
+            ruta_manifiesto = writer.escribir_txt_particionado(contando(), carpeta, "x")
+            with open(ruta_manifiesto, "r", encoding="utf-8") as f:
+                manifiesto = json.load(f)
+
+            assert len(manifiesto["particiones"]) == len(esperado) > writer.HILOS_ESCRITURA
+            assert manifiesto["total_lineas"] == len(asientos)
+            for p in manifiesto["particiones"]:
+                with open(os.path.join(carpeta, p["archivo"]), "rb") as f:
+                    datos = f.read()
+                assert datos.decode("utf-8").split("\n") == [HEADER] + esperado[p["archivo"]], p["archivo"]
+                assert p["lineas"] == len(esperado[p["archivo"]])
+                assert (p["bytes"], p["sha256"]) == (len(datos), hashlib.sha256(datos).hexdigest())
+    finally:
+        writer.LINEAS_POR_BLOQUE = lineas_por_bloque
+    assert max(hilos) - hilos[0] <= writer.HILOS_ESCRITURA, max(hilos)
+    print("  Particiones y manifiesto: OK")
+    return True
+
+
+def test_stdin_stdout():
+    """Pipeline stdin -> stdout: formato detectado en un pipe, mismo TXT que escribir_txt y stdout abierto"""
+    print("=== stdin -> stdout ===")
+    import io
+    import openpyxl
+    import main as cli
+
+    encabezado = ["Fecha", "Tipo CFE", "Serie", "Número", "RUT Emisor", "Moneda", "Monto Neto", "IVA Ventas", "Monto Total"]
+    filas = [
+        [datetime(2026, 1, 14), "e-Factura", "A", 10779, "080128330013", "UYU", 100.0, 22.0, 122.0],
+        [datetime(2026, 1, 15), "Nota de Crédito de e-Factura", "B", 10780, "213596650013", "USD", 50.5, 11.11, 61.61],
+    ]
+
+    def por_pipe(ruta):
+        """Corre main con `ruta` entrando por un pipe (sin seek) y retorna los bytes de stdout."""
+        lectura, escritura = os.pipe()
+
+        def alimentar():
+            with open(ruta, "rb") as origen, os.fdopen(escritura, "wb") as destino:
+                destino.write(origen.read())
+
+        hilo = threading.Thread(target=alimentar)
+        hilo.start()
+        salida = io.BytesIO()
+        stdin, stdout, argv = sys.stdin, sys.stdout, sys.argv
+        sys.stdin = io.TextIOWrapper(os.fdopen(lectura, "rb"))
+        sys.stdout = io.TextIOWrapper(salida, encoding="utf-8")
+        sys.argv = ["main.py", "-i", "-", "-o", "-"]
+        try:
+            cli.main()
+            # El wrapper del TXT se suelta sin cerrar el stdout real
+            assert not sys.stdout.closed
+            sys.stdout.write("")
+            sys.stdout.flush()
+            return salida.getvalue()
+        finally:
+            hilo.join()
+            sys.stdin.close()
+            sys.stdin, sys.stdout, sys.argv = stdin, stdout, argv
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta_xlsx = os.path.join(carpeta, "cfe.xlsx")
+        wb = openpyxl.Workbook()
+        wb.active.append(encabezado)
+        for fila in filas:
+            wb.active.append(fila)
+        wb.save(ruta_xlsx)
+
+        ruta_csv = os.path.join(carpeta, "cfe.csv")
+        with open(ruta_csv, "w", encoding="cp1252", newline="") as f:
+            f.write(";".join(encabezado) + "\r\n")
+            for fila in filas:
+                celdas = [f"{fila[0]:%d/%m/%Y}"] + [str(v) for v in fila[1:6]] + [f"{v:.2f}".replace(".", ",") for v in fila[6:]]
+                f.write(";".join(celdas) + "\r\n")
+
+        ruta_txt = os.path.join(carpeta, "referencia.txt")
+        conversor.convertir_archivo(ruta_xlsx, ruta_txt)
+        with open(ruta_txt, "rb") as f:
+            referencia = f.read()
+
+        assert referencia.count(b"\n") >= len(filas)
+        assert por_pipe(ruta_xlsx) == referencia
+        assert por_pipe(ruta_csv) == referencia
+
+        # Sin asientos: error antes de que llegue el encabezado al stream
+        ruta_sin_asientos = os.path.join(carpeta, "tickets.csv")
+        with open(ruta_sin_asientos, "w", encoding="utf-8") as f:
+            f.write(";".join(encabezado) + "\n")
+            f.write("14/01/2026;e-Ticket;A;1;080128330013;UYU;100,00;22,00;122,00\n")
+        for max_memoria in (None, 64 * 1024 * 1024):
+            stream = io.StringIO()
+            try:
+                conversor.convertir_archivo(ruta_sin_asientos, stream, max_memoria=max_memoria)
+                assert False, "debió fallar sin asientos"
+            except ValueError:
+                pass
+            assert stream.getvalue() == ""
+    print("  Detección y TXT: OK")
+    return True
+
+
 if __name__ == "__main__":
     results = []
     results.append(("TXT 1", test_txt1()))
@@ -195,6 +1014,44 @@ if __name__ == "__main__":
     print()
     results.append(("TXT 4", test_txt4()))
     print()
+    results.append(("Proveedores CSV", test_proveedores_csv()))
+    print()
+    results.append(("Perfil cliente", test_perfil_cliente()))
+    print()
+    results.append(("Registro RUT", test_registro_rut()))
+    print()
+    results.append(("Reglas declarativas", test_reglas_declarativas()))
+    print()
+    results.append(("Validación", test_validacion()))
+    print()
+    results.append(("Consolidación", test_consolidacion()))
+    print()
+    results.append(("Cotización USD", test_cotizacion_usd()))
+    print()
+    results.append(("Conciliación", test_conciliacion()))
+    print()
+    results.append(("Columnar", test_columnar()))
+    print()
+    results.append(("Lote reanudable", test_lote_reanudable()))
+    print()
+    results.append(("Sondeo de hojas", test_sondeo_hojas()))
+    print()
+    results.append(("Vista previa", test_vista_previa_limite()))
+    print()
+    results.append(("Lectura CSV", test_lectura_csv()))
+    print()
+    results.append(("Estadísticas", test_estadisticas()))
+    print()
+    results.append(("Memoria acotada", test_memoria_acotada()))
+    print()
+    results.append(("Almacén", test_almacen()))
+    print()
+    results.append(("Clasificación", test_clasificacion()))
+    print()
+    results.append(("TXT particionado", test_txt_particionado()))
+    print()
+    results.append(("stdin -> stdout", test_stdin_stdout()))
+    print()
     print("=== RESUMEN ===")
     for name, ok in results:
         print(f"  {name}: {'PASS' if ok else 'REVISAR (discrepancia con ejemplo)'}")
@@ -0,0 +1,96 @@
+# validacion.py — Validación por columnas de montos y claves de los registros CFE
+#
+# Los chequeos se hacen sobre columnas completas (listas por campo recorridas
+# con zip), no registro por registro, para que el costo sea una pasada
+# adicional de bajo orden frente a la lectura del Excel.
+
+import logging
+
+from clasificacion import PREFIJOS, clasificar_tipo
+from config import VALIDACION_TOLERANCIA_TOTAL
+from perfiles import obtener_perfil
+
+logger = logging.getLogger(__name__)
+
+TOTAL_INCONSISTENTE = "total_inconsistente"
+IVA_FUERA_DE_RANGO = "iva_fuera_de_rango"
+CFE_DUPLICADO = "cfe_duplicado"
+
+# Códigos de tipo cuyos montos deben cerrar neto + IVA (+ ret/per) = total
+_TIPOS_FACTURA = {PREFIJOS.index(p) for p in ("e-F", "NC") if p in PREFIJOS}
+
+# Separa los campos de la clave de duplicados entre ventanas; no aparece en los datos
+_SEPARADOR = "\x1f"
+
+
+def _columna(registros, campo):
+    return [r[campo] for r in registros]
+
+
+def validar_registros(registros, perfil=None, fila_inicial=1, vistos=None):
+    """
+    Valida en bloque los registros leídos.
+    Retorna una lista de problemas {fila, tipo, detalle} ordenada por fila
+    (fila = posición 1-based del registro, como en generar_asientos).
+    Para validar por ventanas (modo de memoria acotada), `fila_inicial` es la
+    fila del primer registro y `vistos` un dict que se comparte entre llamadas
+    para detectar duplicados entre ventanas. Ese dict guarda la clave completa
+    (tipo, serie, número y RUT unidos en un solo texto) y la primera fila de
+    cada CFE distinto: crece con el archivo, unos 100-150 bytes por CFE, y es
+    lo único de la validación que no queda acotado a la ventana.
+    """
+    perfil = obtener_perfil(perfil)
+    tol_total = VALIDACION_TOLERANCIA_TOTAL
+    tol_iva = perfil.iva_tolerancia
+
+    netos = _columna(registros, "monto_neto")
+    ivas = _columna(registros, "iva_ventas")
+    totales = _columna(registros, "monto_total")
+    ret_per = _columna(registros, "monto_ret_per")
+    tipos = [r["cod_tipo"] if "cod_tipo" in r else clasificar_tipo(r["tipo_cfe"])[1] for r in registros]
+    problemas = []
+
+    # Neto + IVA (+ Ret/Per) = Total. Neto = 0 es el caso especial 1C y no se evalúa.
+    for i, (tipo, n, iv, t, rp) in enumerate(zip(tipos, netos, ivas, totales, ret_per), start=fila_inicial):
+        if n != 0 and tipo in _TIPOS_FACTURA and abs(n + iv - t) > tol_total and abs(n + iv + rp - t) > tol_total:
+            problemas.append({
+                "fila": i, "tipo": TOTAL_INCONSISTENTE,
+                "detalle": f"neto {n:.2f} + iva {iv:.2f} + ret/per {rp:.2f} != total {t:.2f}",
+            })
+
+    # IVA/Neto debería estar cerca de 22% o 10%
+    for i, (n, iv) in enumerate(zip(netos, ivas), start=fila_inicial):
+        if n != 0 and iv != 0:
+            p = abs(iv / n)
+            if abs(p - 0.22) > tol_iva and abs(p - 0.10) > tol_iva:
+                problemas.append({
+                    "fila": i, "tipo": IVA_FUERA_DE_RANGO,
+                    "detalle": f"IVA/Neto = {p:.2%}",
+                })
+
+    # Clave del comprobante: (tipo, serie, número, RUT emisor)
+    compartido = vistos is not None
+    if not compartido:
+        vistos = {}
+    claves = zip(tipos, _columna(registros, "serie"), _columna(registros, "numero"), _columna(registros, "rut_emisor"))
+    for i, clave in enumerate(claves, start=fila_inicial):
+        if compartido:
+            # Un solo str por CFE en lugar de la tupla con sus cuatro textos
+            clave = _SEPARADOR.join(map(str, clave))
+        primera = vistos.setdefault(clave, i)
+        if primera != i:
+            problemas.append({
+                "fila": i, "tipo": CFE_DUPLICADO,
+                "detalle": f"duplicado de la fila {primera}",
+            })
+
+    problemas.sort(key=lambda p: p["fila"])
+    if problemas:
+        por_tipo = {}
+        for p in problemas:
+            por_tipo[p["tipo"]] = por_tipo.get(p["tipo"], 0) + 1
+        logger.warning(
+            f"Validación: {len(problemas)} problemas en {len(registros)} CFEs "
+            + ", ".join(f"{k}={v}" for k, v in sorted(por_tipo.items()))
+        )
+    return problemas
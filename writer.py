@@ -1,7 +1,11 @@
 # writer.py — Escritura de archivos TXT en formato CSV para Memory
 
+import hashlib
+import json
 import os
 import logging
+import queue
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -48,3 +52,230 @@ def escribir_txt(asientos, ruta_salida):
 
     logger.info(f"Archivo generado: {ruta_salida}")
     logger.info(f"  {len(asientos)} asientos escritos.")
+
+
+def escribir_txt_stream(asientos, salida):
+    """
+    Escribe los asientos a un stream de texto abierto (p. ej. stdout) a medida
+    que llegan, sin armar el contenido completo en memoria.
+    Retorna la cantidad de asientos escritos.
+    """
+    salida.write(HEADER)
+    cantidad = 0
+    for a in asientos:
+        salida.write("\n" + _asiento_a_linea(a))
+        cantidad += 1
+    salida.flush()
+    return cantidad
+
+
+# Líneas por bloque, bloques en espera por hilo escritor e hilos escritores
+# como máximo (memoria e hilos acotados aunque haya cientos de particiones)
+LINEAS_POR_BLOQUE = 5000
+BLOQUES_EN_ESPERA = 8
+HILOS_ESCRITURA = 4
+
+
+class _Escritores:
+    """
+    Hilos escritores fijos, cada uno con su cola acotada. Cada partición se
+    asigna a un único hilo, así sus bloques se escriben en orden.
+    """
+
+    def __init__(self, hilos=HILOS_ESCRITURA):
+        self._maximo = hilos
+        self._colas = []
+        self._hilos = []
+        self._siguiente = 0
+        self.error = None
+
+    def asignar(self):
+        """Cola del hilo que escribirá la próxima partición (reparto circular)."""
+        if len(self._colas) < self._maximo:
+            cola = queue.Queue(maxsize=BLOQUES_EN_ESPERA)
+            hilo = threading.Thread(
+                target=self._trabajar, args=(cola,), name=f"escritor-txt-{len(self._hilos)}", daemon=True,
+            )
+            hilo.start()
+            self._colas.append(cola)
+            self._hilos.append(hilo)
+            return cola
+        cola = self._colas[self._siguiente % self._maximo]
+        self._siguiente += 1
+        return cola
+
+    def _trabajar(self, cola):
+        while True:
+            trabajo = cola.get()
+            if trabajo is None:
+                return
+            particion, bloque = trabajo
+            # Tras un error se sigue vaciando la cola para no bloquear al productor
+            if self.error is None:
+                try:
+                    particion.escribir_bloque(bloque)
+                except OSError as e:
+                    self.error = e
+
+    def cerrar(self):
+        for cola in self._colas:
+            cola.put(None)
+        for hilo in self._hilos:
+            hilo.join()
+        if self.error is not None:
+            raise self.error
+
+
+class _Particion:
+    """Archivo de salida de una partición; sus bloques los escribe un hilo de _Escritores."""
+
+    def __init__(self, ruta, escritores):
+        self.ruta = ruta
+        self.lineas = 0
+        self.bytes = 0
+        self.sha256 = hashlib.sha256()
+        self._pendientes = []
+        self._iniciada = False
+        self._cola = escritores.asignar()
+
+    def agregar(self, linea):
+        self._pendientes.append(linea)
+        self.lineas += 1
+        if len(self._pendientes) >= LINEAS_POR_BLOQUE:
+            self.enviar()
+
+    def enviar(self):
+        if self._pendientes:
+            self._cola.put((self, self._pendientes))
+            self._pendientes = []
+
+    def escribir_bloque(self, bloque):
+        """En el hilo escritor: el primer bloque crea el archivo con el encabezado."""
+        datos = ("\n" + "\n".join(bloque)).encode("utf-8")
+        if self._iniciada:
+            modo = "ab"
+        else:
+            modo = "wb"
+            datos = HEADER.encode("utf-8") + datos
+            self._iniciada = True
+        # Se reabre por bloque: con muchas particiones no quedan cientos de archivos abiertos
+        with open(self.ruta, modo) as f:
+            f.write(datos)
+        self.sha256.update(datos)
+        self.bytes += len(datos)
+
+
+def escribir_txt_particionado(asientos, carpeta, nombre):
+    """
+    Escribe un TXT por (mes, libro): <nombre>_<YYYY-MM>_<libro>.txt, en paralelo
+    con a lo sumo HILOS_ESCRITURA hilos y buffers acotados, más
+    <nombre>_manifest.json con líneas, bytes y SHA-256 de cada archivo.
+    Retorna la ruta del manifiesto.
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    particiones = {}
+    escritores = _Escritores()
+    try:
+        for a in asientos:
+            clave = (a.get("periodo") or "sin-fecha", a["libro"])
+            particion = particiones.get(clave)
+            if particion is None:
+                ruta = os.path.join(carpeta, f"{nombre}_{clave[0]}_{clave[1]}.txt")
+                particion = particiones[clave] = _Particion(ruta, escritores)
+            particion.agregar(_asiento_a_linea(a))
+        for particion in particiones.values():
+            particion.enviar()
+    finally:
+        # Terminar los hilos aunque la generación falle, para no dejarlos esperando
+        escritores.cerrar()
+
+    manifiesto = {
+        "nombre": nombre,
+        "total_lineas": sum(p.lineas for p in particiones.values()),
+        "particiones": [
+            {
+                "archivo": os.path.basename(p.ruta),
+                "periodo": periodo,
+                "libro": libro,
+                "lineas": p.lineas,
+                "bytes": p.bytes,
+                "sha256": p.sha256.hexdigest(),
+            }
+            for (periodo, libro), p in sorted(particiones.items())
+        ],
+    }
+    ruta_manifiesto = os.path.join(carpeta, f"{nombre}_manifest.json")
+    with open(ruta_manifiesto, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+
+    for p in manifiesto["particiones"]:
+        logger.info(f"Archivo generado: {p['archivo']} ({p['lineas']} asientos)")
+    logger.info(f"Manifiesto de particiones: {ruta_manifiesto}")
+    return ruta_manifiesto
+
+
+def escribir_reporte_desconocidos(desconocidos, ruta_salida):
+    """
+    Escribe el reporte de RUTs sin cuenta de proveedor.
+    `desconocidos` es una lista de dicts {rut, cantidad, nombre, actividad, cuenta_sugerida}.
+    """
+    lineas = ["RUT,Cantidad,Nombre,Actividad,CuentaSugerida"]
+    for d in desconocidos:
+        nombre = d.get("nombre", "").replace('"', '""')
+        lineas.append(
+            f"{d['rut']},{d['cantidad']},\"{nombre}\",{d.get('actividad', '')},{d.get('cuenta_sugerida') or ''}"
+        )
+
+    with open(ruta_salida, "w", encoding="utf-8", newline="") as f:
+        f.write("\n".join(lineas))
+
+    logger.info(f"Reporte de RUTs desconocidos: {ruta_salida} ({len(desconocidos)} RUTs)")
+
+
+VALIDACION_HEADER = "Fila,TipoCFE,Serie,Numero,RUT,Problema,Detalle"
+
+
+def _lineas_validacion(problemas, registros, fila_inicial=1):
+    for p in problemas:
+        r = registros[p["fila"] - fila_inicial]
+        yield f"{p['fila']},{r['tipo_cfe']},{r['serie']},{r['numero']},{r['rut_emisor']},{p['tipo']},\"{p['detalle']}\""
+
+
+def escribir_reporte_validacion(problemas, registros, ruta_salida):
+    """Escribe el reporte de validación: una línea por problema con el CFE afectado."""
+    lineas = [VALIDACION_HEADER]
+    lineas.extend(_lineas_validacion(problemas, registros))
+
+    with open(ruta_salida, "w", encoding="utf-8", newline="") as f:
+        f.write("\n".join(lineas))
+
+    logger.info(f"Reporte de validación: {ruta_salida} ({len(problemas)} problemas)")
+
+
+class ReporteValidacion:
+    """
+    Reporte de validación escrito por ventanas de registros (modo de memoria
+    acotada). Mismo formato que escribir_reporte_validacion; el archivo se
+    crea recién con el primer problema.
+    """
+
+    def __init__(self, ruta_salida):
+        self.ruta_salida = ruta_salida
+        self.problemas = 0
+        self._f = None
+
+    def agregar(self, problemas, registros, fila_inicial):
+        if not problemas:
+            return
+        if self._f is None:
+            self._f = open(self.ruta_salida, "w", encoding="utf-8", newline="")
+            self._f.write(VALIDACION_HEADER)
+        for linea in _lineas_validacion(problemas, registros, fila_inicial):
+            self._f.write("\n" + linea)
+        self.problemas += len(problemas)
+
+    def cerrar(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+            logger.info(f"Reporte de validación: {self.ruta_salida} ({self.problemas} problemas)")